@@ -0,0 +1,8 @@
+"""
+Benchmarks reprodutíveis do serviço de detecção de danos.
+
+    python -m benchmarks run --stub --output base.json
+    python -m benchmarks compare base.json novo.json
+
+Veja benchmarks/run.py para as opções.
+"""
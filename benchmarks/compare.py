@@ -0,0 +1,78 @@
+"""
+Compara dois resultados de python -m benchmarks run.
+
+Um caso regride quando a latência (p50/p95/p99), o tempo p50 de alguma
+etapa ou o pico de RSS sobem, ou a vazão cai, mais que o limiar relativo,
+desde que a diferença absoluta passe de um piso que filtra ruído.
+"""
+import json
+
+LATENCY_FLOOR_MS = 0.5
+RSS_FLOOR_MB = 20
+
+
+def _change(baseline, candidate):
+    if not baseline:
+        return None
+    return (candidate - baseline) / baseline
+
+
+def compare_reports(baseline, candidate, threshold=0.10):
+    """Retorna (linhas da comparação, regressões)"""
+    base_cases = {case['name']: case for case in baseline['cases']}
+    rows = []
+    regressions = []
+
+    def check(name, metric, before, after, higher_is_worse=True, floor=0.0):
+        if before is None or after is None:
+            return
+        change = _change(before, after)
+        worse = change is not None and abs(after - before) > floor and (
+            change > threshold if higher_is_worse else change < -threshold
+        )
+        row = {'case': name, 'metric': metric, 'baseline': before, 'candidate': after,
+               'change': None if change is None else round(change, 4), 'regression': worse}
+        rows.append(row)
+        if worse:
+            regressions.append(row)
+
+    for case in candidate['cases']:
+        before = base_cases.get(case['name'])
+        if before is None:
+            continue
+        name = case['name']
+        for percentile in ('p50', 'p95', 'p99'):
+            check(name, f'latency_{percentile}_ms', before['latency_ms'].get(percentile),
+                  case['latency_ms'].get(percentile), floor=LATENCY_FLOOR_MS)
+        check(name, 'throughput_images_per_s', before['throughput_images_per_s'],
+              case['throughput_images_per_s'], higher_is_worse=False)
+        check(name, 'peak_rss_mb', before.get('peak_rss_mb'), case.get('peak_rss_mb'), floor=RSS_FLOOR_MB)
+        for stage, stats in case['stages'].items():
+            if stage in before['stages']:
+                check(name, f'stage_{stage}_p50_ms', before['stages'][stage].get('p50'), stats.get('p50'),
+                      floor=LATENCY_FLOOR_MS)
+
+    return rows, regressions
+
+
+def compare_files(baseline_path, candidate_path, threshold=0.10):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare_reports(baseline, candidate, threshold)
+    for row in rows:
+        # Etapas só aparecem quando regridem
+        if row['metric'].startswith('stage_') and not row['regression']:
+            continue
+        change = '' if row['change'] is None else f"{row['change']:+.1%}"
+        flag = '  REGRESSÃO' if row['regression'] else ''
+        print(f"{row['case']:<48} {row['metric']:<28} {row['baseline']:>10} -> {row['candidate']:>10} "
+              f"{change:>8}{flag}")
+
+    missing = {case['name'] for case in baseline['cases']} - {case['name'] for case in candidate['cases']}
+    if missing:
+        print(f"Casos ausentes na execução nova: {', '.join(sorted(missing))}")
+    print(f"{len(regressions)} regressão(ões) acima de {threshold:.0%}")
+    return regressions
@@ -0,0 +1,316 @@
+"""
+Executa os benchmarks e compara execuções.
+
+    python -m benchmarks run --stub --output base.json
+    python -m benchmarks run --resolutions 1280x960 --batch-sizes 1,4,8 --torch-threads 2
+    python -m benchmarks compare base.json novo.json --threshold 0.1
+
+Casos medidos, para cada resolução e densidade de danos:
+- service: YOLODamageService.process_image (decodificação, inferência, anotação)
+- detect / detect_base64: POST /api/damage/detect pelo test client do Flask
+- batch: POST /api/damage/analyze-batch com --batch-sizes imagens
+
+Com --stub, o modelo é substituído por benchmarks.stub_model.StubModel e o
+benchmark roda sem pesos, torch ou rede. O cache de resultados fica
+desligado (as imagens se repetem), a menos que se use --cache.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+
+import numpy as np
+
+from benchmarks.synthetic import DENSITIES, RESOLUTIONS, synthetic_image
+
+DISTINCT_IMAGES = 4
+
+
+def _parse_list(text, cast=int):
+    return [cast(item) for item in text.split(',') if item.strip()]
+
+
+def _parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def summarize(values_seconds):
+    """p50/p95/p99/média em milissegundos"""
+    values = np.asarray(values_seconds, dtype=np.float64) * 1000
+    if len(values) == 0:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'mean': round(float(values.mean()), 3),
+        'min': round(float(values.min()), 3),
+        'max': round(float(values.max()), 3)
+    }
+
+
+def _reset_peak_rss():
+    """Zera o pico de RSS do processo (Linux), para medir o pico de cada caso"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class StageRecorder:
+    """Guarda cada tempo observado em metrics.STAGE_SECONDS enquanto ativo"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.samples = defaultdict(list)
+
+    def __enter__(self):
+        original = self.histogram.observe
+
+        def observe(value, *labels):
+            self.samples[labels[0] if labels else ''].append(value)
+            original(value, *labels)
+
+        self.histogram.observe = observe
+        return self
+
+    def __exit__(self, *exc_info):
+        del self.histogram.observe
+
+
+def _configure_environment(args, workdir):
+    """Ajusta o ambiente antes de importar o app (que cria o serviço ao ser importado)"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['PROFILING_DIR'] = os.path.join(workdir, 'profiles')
+    os.environ.pop('PROFILING_TOKEN', None)
+    # Os lotes repetem DISTINCT_IMAGES imagens: com a deduplicação, só elas iriam ao modelo
+    os.environ['QUALITY_DUPLICATE_DISTANCE'] = '-1'
+    if not args.cache:
+        os.environ['RESULT_CACHE_ENABLED'] = '0'
+        os.environ.pop('RESULT_CACHE_DISK_PATH', None)
+    if args.stub:
+        # O serviço global do app falha rápido, sem rede, e é trocado pelo do stub
+        os.environ['MODEL_OFFLINE'] = '1'
+        os.environ['MODEL_PATH'] = os.path.join(workdir, 'sem-pesos.pt')
+        os.environ['INFERENCE_WORKERS'] = '0'
+        os.environ['WARMUP_RUNS'] = '0'
+
+
+def _load(args):
+    from src.main import app
+    from src.routes import damage_detection
+
+    stub = None
+    if args.stub:
+        from benchmarks.stub_model import StubModel
+        from src.services.yolo_service import YOLODamageService
+
+        stub = StubModel(latency_ms=args.stub_latency_ms)
+        damage_detection.yolo_service = YOLODamageService(model=stub)
+
+    service = damage_detection.yolo_service
+    if service.model is None:
+        raise SystemExit("Modelo não carregado; use --stub para rodar sem pesos")
+    return app, service, stub
+
+
+def _run_case(name, kind, call, iterations, warmup, concurrency, images_per_call, **labels):
+    from src.services import metrics
+
+    for i in range(warmup):
+        call(i)
+
+    _reset_peak_rss()
+    latencies = [None] * iterations
+
+    def timed(i):
+        started = time.perf_counter()
+        call(i)
+        latencies[i] = time.perf_counter() - started
+
+    with StageRecorder(metrics.STAGE_SECONDS) as recorder:
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(timed, range(iterations)))
+        else:
+            for i in range(iterations):
+                timed(i)
+        wall = time.perf_counter() - started
+
+    case = {
+        'name': name,
+        'kind': kind,
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'images': iterations * images_per_call,
+        'wall_seconds': round(wall, 4),
+        'throughput_images_per_s': round(iterations * images_per_call / wall, 3),
+        'latency_ms': summarize(latencies),
+        'stages': {stage: summarize(values) for stage, values in sorted(recorder.samples.items())},
+        'peak_rss_mb': _peak_rss_mb()
+    }
+    case.update(labels)
+    print(f"{name:<48} p50 {case['latency_ms']['p50']:>9.2f} ms   "
+          f"p95 {case['latency_ms']['p95']:>9.2f} ms   {case['throughput_images_per_s']:>8.2f} img/s")
+    return case
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+
+def run_benchmarks(args):
+    workdir = tempfile.mkdtemp(prefix='damage-bench-')
+    _configure_environment(args, workdir)
+    app, service, stub = _load(args)
+
+    if args.torch_threads:
+        import torch
+        torch.set_num_threads(args.torch_threads)
+
+    cases = []
+    for width, height in args.resolutions:
+        for density in args.densities:
+            if stub is not None:
+                stub.detections_per_image = density
+            images = [synthetic_image(width, height, density, seed=args.seed + i) for i in range(DISTINCT_IMAGES)]
+            encoded = [base64.b64encode(image).decode('ascii') for image in images]
+            labels = {'resolution': f'{width}x{height}', 'density': density}
+            suffix = f'{width}x{height}/d{density}'
+
+            cases.append(_run_case(
+                f'service/{suffix}', 'service',
+                lambda i: service.process_image(images[i % DISTINCT_IMAGES], annotate=True),
+                args.iterations, args.warmup, 1, 1, **labels
+            ))
+
+            for concurrency in args.concurrency:
+                client = app.test_client()
+                cases.append(_run_case(
+                    f'detect/{suffix}/c{concurrency}', 'detect',
+                    lambda i: _check(client.post(
+                        '/api/damage/detect', data=images[i % DISTINCT_IMAGES], content_type='image/jpeg'
+                    )),
+                    args.iterations, args.warmup, concurrency, 1, **labels
+                ))
+                cases.append(_run_case(
+                    f'detect_base64/{suffix}/c{concurrency}', 'detect_base64',
+                    lambda i: _check(client.post(
+                        '/api/damage/detect', json={'image_base64': encoded[i % DISTINCT_IMAGES]}
+                    )),
+                    args.iterations, args.warmup, concurrency, 1, **labels
+                ))
+
+            for batch_size in args.batch_sizes:
+                client = app.test_client()
+                batch = [encoded[i % DISTINCT_IMAGES] for i in range(batch_size)]
+                cases.append(_run_case(
+                    f'batch/{suffix}/b{batch_size}', 'batch',
+                    lambda i: _check(client.post('/api/damage/analyze-batch', json={'images': batch})),
+                    max(1, args.iterations // batch_size), args.warmup, 1, batch_size,
+                    batch_size=batch_size, **labels
+                ))
+
+    return {
+        'meta': _environment(args, service),
+        'cases': cases
+    }
+
+
+def _version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _environment(args, service):
+    from src import config
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': {name: _version(name) for name in ('numpy', 'pillow', 'flask', 'torch', 'ultralytics')},
+        'stub': args.stub,
+        'stub_latency_ms': args.stub_latency_ms if args.stub else None,
+        'seed': args.seed,
+        'iterations': args.iterations,
+        'torch_threads': args.torch_threads,
+        'result_cache': args.cache,
+        'model_version': service.model_version,
+        'config': {
+            name: getattr(config, name)
+            for name in ('INFERENCE_BACKEND', 'MODEL_PRECISION', 'DECODE_TARGET_SIZE', 'MAX_INFERENCE_BATCH_SIZE',
+                         'INFERENCE_BATCH_WINDOW_MS', 'INFERENCE_WORKERS', 'INFERENCE_WORKER_THREADS')
+        }
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='executa os benchmarks')
+    run.add_argument('--stub', action='store_true', help='usa o modelo sintético (sem pesos)')
+    run.add_argument('--stub-latency-ms', type=float, default=0.0,
+                     help='latência simulada do modelo sintético por imagem')
+    run.add_argument('--resolutions', type=lambda text: _parse_list(text, _parse_resolution),
+                     default=list(RESOLUTIONS))
+    run.add_argument('--densities', type=_parse_list, default=list(DENSITIES))
+    run.add_argument('--batch-sizes', type=_parse_list, default=[4])
+    run.add_argument('--concurrency', type=_parse_list, default=[1])
+    run.add_argument('--iterations', type=int, default=20)
+    run.add_argument('--warmup', type=int, default=3)
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--torch-threads', type=int, default=None)
+    run.add_argument('--cache', action='store_true', help='mantém o cache de resultados ligado')
+    run.add_argument('--output', help='arquivo JSON de saída (padrão: stdout)')
+
+    compare = commands.add_parser('compare', help='compara duas execuções')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help='piora relativa a partir da qual um caso é marcado como regressão')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        from benchmarks.compare import compare_files
+        regressions = compare_files(args.baseline, args.candidate, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    report = run_benchmarks(args)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Resultados salvos em {args.output}")
+    else:
+        print(output)
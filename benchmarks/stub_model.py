@@ -0,0 +1,77 @@
+"""
+Modelo sintético com a mesma interface de resultado da ultralytics, para
+medir o custo do pipeline (decodificação, anotação, serialização) sem pesos,
+torch ou GPU.
+"""
+import time
+
+import numpy as np
+
+STUB_NAMES = {0: 'dent', 1: 'scratch', 2: 'crack', 3: 'shattered_glass', 4: 'broken_lamp', 5: 'flat_tire'}
+
+
+class _Tensor:
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = _Tensor(xyxy)
+        self.conf = _Tensor(conf)
+        self.cls = _Tensor(cls)
+
+    def __len__(self):
+        return len(self.conf.numpy())
+
+
+class _Result:
+    def __init__(self, boxes, speed):
+        self.boxes = boxes
+        self.speed = speed
+
+
+class StubModel:
+    """
+    Devolve detections_per_image caixas determinísticas por imagem, depois
+    de esperar latency_ms por imagem (0 mede só o pipeline).
+
+    Como na ultralytics, conf e max_det filtram as caixas; a latência cresce
+    com o quadrado de imgsz (latency_ms vale para 640).
+    """
+
+    names = STUB_NAMES
+
+    def __init__(self, detections_per_image=3, latency_ms=0.0):
+        self.detections_per_image = detections_per_image
+        self.latency_ms = latency_ms
+
+    def _boxes(self, width, height, conf_threshold=0.25, max_det=300):
+        count = self.detections_per_image
+        rng = np.random.RandomState(width * 31 + height * 17 + count)
+        corners = rng.uniform(0, 0.8, size=(count, 2))
+        sizes = rng.uniform(0.05, 0.2, size=(count, 2))
+        xyxy = np.concatenate([corners, corners + sizes], axis=1) * [width, height, width, height]
+        conf = rng.uniform(0.3, 0.95, size=count)
+        cls = rng.randint(0, len(STUB_NAMES), size=count)
+        keep = np.flatnonzero(conf >= conf_threshold)[:max_det]
+        return _Boxes(xyxy[keep].astype(np.float32), conf[keep].astype(np.float32), cls[keep].astype(np.float32))
+
+    def __call__(self, source, imgsz=640, conf=0.25, max_det=300, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        started = time.perf_counter()
+        if self.latency_ms:
+            time.sleep(self.latency_ms * (imgsz / 640) ** 2 * len(images) / 1000)
+        boxes = [self._boxes(image.shape[1], image.shape[0], conf, max_det) for image in images]
+        per_image_ms = (time.perf_counter() - started) * 1000 / len(images)
+        speed = {'preprocess': 0.0, 'inference': per_image_ms, 'postprocess': 0.0}
+        return [_Result(image_boxes, speed) for image_boxes in boxes]
+
+    def predict(self, source, **kwargs):
+        return self(source, **kwargs)
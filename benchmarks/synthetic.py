@@ -0,0 +1,36 @@
+"""
+Imagens sintéticas determinísticas: o mesmo (largura, altura, densidade,
+semente) gera sempre os mesmos bytes JPEG.
+"""
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+RESOLUTIONS = ((640, 480), (1280, 960), (1920, 1080), (4032, 3024))
+DENSITIES = (0, 3, 12)
+
+
+def synthetic_image(width, height, density=3, seed=0, quality=90):
+    """JPEG com fundo em gradiente, ruído e density retângulos simulando danos"""
+    rng = np.random.RandomState(seed * 7919 + width * 31 + height * 17 + density)
+
+    x = np.broadcast_to(np.linspace(0, 1, width, dtype=np.float32)[None, :], (height, width))
+    y = np.broadcast_to(np.linspace(0, 1, height, dtype=np.float32)[:, None], (height, width))
+    base = np.stack([120 + 80 * x, 110 + 60 * y, 100 + 20 * (x + y)], axis=-1)
+    noise = rng.normal(0, 12, size=(height, width, 1)).astype(np.float32)
+    image = Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(density):
+        w = int(width * rng.uniform(0.05, 0.25))
+        h = int(height * rng.uniform(0.05, 0.25))
+        x1 = int(rng.uniform(0, width - w))
+        y1 = int(rng.uniform(0, height - h))
+        color = tuple(int(c) for c in rng.randint(0, 255, size=3))
+        draw.rectangle([x1, y1, x1 + w, y1 + h], outline=color, width=max(2, width // 200))
+        draw.line([x1, y1, x1 + w, y1 + h], fill=color, width=max(1, width // 400))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
@@ -0,0 +1,38 @@
+"""
+Configuração do gunicorn: gunicorn -c gunicorn.conf.py src.main:app
+
+Com preload_app, o processo mestre importa o app e carrega os pesos uma
+única vez; os workers criados por fork compartilham essa memória
+(copy-on-write). O que não sobrevive ao fork (threads, processos de
+inferência, conexões SQLite) e o warm-up são iniciados em cada worker,
+numa thread, enquanto /api/damage/ready responde 503.
+"""
+import os
+import tempfile
+import threading
+
+os.environ.setdefault('MODEL_PRELOAD', '1')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+# Mais threads que ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE, para que o
+# excesso chegue ao app e seja recusado na hora em vez de esperar no socket
+threads = int(os.environ.get('GUNICORN_THREADS', '24'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+# Com mais de um worker, /annotated/<id> pode cair num worker diferente do que
+# fez a análise: as anotações adiadas passam a ficar num SQLite da máquina
+if workers > 1:
+    os.environ.setdefault(
+        'ANNOTATION_STORE_DISK_PATH', os.path.join(tempfile.gettempdir(), 'damage-annotations.db')
+    )
+preload_app = os.environ['MODEL_PRELOAD'].strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from src.main import app, start_services
+    from src.models.user import dispose_connections
+    # Conexões SQLite abertas no mestre (ou herdadas) nunca são usadas no worker
+    dispose_connections(app, close=False)
+    threading.Thread(target=start_services, name='startup', daemon=True).start()
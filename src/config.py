@@ -0,0 +1,250 @@
+import os
+import tempfile
+
+
+def env_str(name, default):
+    value = os.environ.get(name)
+    return value if value not in (None, '') else default
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Arquivo de pesos: caminho, origem do download, sha256 esperado e modo offline (nunca baixa)
+MODEL_PATH = env_str('MODEL_PATH', 'car_damage_best.pt')
+MODEL_URL = env_str('MODEL_URL', 'https://github.com/Vamap91/YOLOProject/releases/download/v2.0.0/car_damage_best.pt')
+MODEL_SHA256 = env_str('MODEL_SHA256', None)
+MODEL_OFFLINE = env_bool('MODEL_OFFLINE', False)
+MODEL_DOWNLOAD_TIMEOUT = env_int('MODEL_DOWNLOAD_TIMEOUT', 60)
+
+# Com MODEL_PRELOAD o processo mestre do gunicorn só carrega os pesos; threads,
+# processos de inferência e warm-up são iniciados em cada worker após o fork
+MODEL_PRELOAD = env_bool('MODEL_PRELOAD', False)
+
+# Inferências de aquecimento antes de /ready responder 200 (formas LxA separadas por vírgula)
+WARMUP_RUNS = env_int('WARMUP_RUNS', 2)
+WARMUP_SHAPES = env_str('WARMUP_SHAPES', '640x480,480x640')
+
+# Backend de inferência: torch, torchscript, onnxruntime ou openvino
+INFERENCE_BACKEND = env_str('INFERENCE_BACKEND', 'torch')
+INFERENCE_IMGSZ = env_int('INFERENCE_IMGSZ', 640)
+
+# Lado mínimo (px) ao decodificar JPEG em resolução reduzida; 0 decodifica a imagem inteira
+DECODE_TARGET_SIZE = env_int('DECODE_TARGET_SIZE', INFERENCE_IMGSZ)
+
+# Perfis de inferência: fast, standard ou accurate (resolução de entrada; a
+# decodificação acompanha na mesma proporção) ou auto, que usa
+# INFERENCE_AUTO_PROFILE e cai para INFERENCE_DEGRADED_PROFILE quando a fila
+# chega a INFERENCE_AUTO_MAX_QUEUE ou o p95 das chamadas ao modelo nos últimos
+# INFERENCE_AUTO_WINDOW_SECONDS passa de INFERENCE_AUTO_P95_MS (0 desativa cada
+# critério). Parâmetros por requisição ficam dentro de INFERENCE_ALLOWED_IMGSZ,
+# conf >= INFERENCE_MIN_CONF e max_det <= INFERENCE_MAX_DET
+INFERENCE_PROFILE = env_str('INFERENCE_PROFILE', 'standard')
+INFERENCE_CONF = env_float('INFERENCE_CONF', 0.25)
+INFERENCE_IOU = env_float('INFERENCE_IOU', 0.7)
+INFERENCE_MAX_DET = env_int('INFERENCE_MAX_DET', 300)
+INFERENCE_FAST_IMGSZ = env_int('INFERENCE_FAST_IMGSZ', 320)
+INFERENCE_ACCURATE_IMGSZ = env_int('INFERENCE_ACCURATE_IMGSZ', 960)
+INFERENCE_ACCURATE_CONF = env_float('INFERENCE_ACCURATE_CONF', 0.15)
+INFERENCE_ALLOWED_IMGSZ = env_str('INFERENCE_ALLOWED_IMGSZ', '320,480,640,960')
+INFERENCE_MIN_CONF = env_float('INFERENCE_MIN_CONF', 0.05)
+INFERENCE_AUTO_PROFILE = env_str('INFERENCE_AUTO_PROFILE', 'standard')
+INFERENCE_DEGRADED_PROFILE = env_str('INFERENCE_DEGRADED_PROFILE', 'fast')
+INFERENCE_AUTO_MAX_QUEUE = env_int('INFERENCE_AUTO_MAX_QUEUE', 8)
+INFERENCE_AUTO_P95_MS = env_float('INFERENCE_AUTO_P95_MS', 1500)
+INFERENCE_AUTO_WINDOW_SECONDS = env_float('INFERENCE_AUTO_WINDOW_SECONDS', 30)
+
+# Inferência em tiles para fotos de alta resolução: off, on ou auto (só acima de
+# TILING_AUTO_MIN_MEGAPIXELS). Tiles de TILE_SIZE px com sobreposição TILE_OVERLAP
+# (fração), no máximo TILE_MAX_IN_FLIGHT recortes em memória por vez, e a imagem
+# decodificada limitada a TILING_MAX_MEGAPIXELS
+TILING_MODE = env_str('TILING_MODE', 'off')
+TILE_SIZE = env_int('TILE_SIZE', INFERENCE_IMGSZ)
+TILE_OVERLAP = env_float('TILE_OVERLAP', 0.2)
+TILE_MAX_IN_FLIGHT = env_int('TILE_MAX_IN_FLIGHT', 8)
+TILING_MAX_MEGAPIXELS = env_float('TILING_MAX_MEGAPIXELS', 48)
+TILING_AUTO_MIN_MEGAPIXELS = env_float('TILING_AUTO_MIN_MEGAPIXELS', 12)
+# Junção das caixas entre tiles: nmm (união), nms ou wbf; sobreposição medida por
+# ios (interseção sobre a menor caixa) ou iou; e se a imagem inteira reduzida
+# também passa pelo modelo (para danos maiores que um tile)
+TILE_MERGE = env_str('TILE_MERGE', 'nmm')
+TILE_MATCH_METRIC = env_str('TILE_MATCH_METRIC', 'ios')
+TILE_MATCH_THRESHOLD = env_float('TILE_MATCH_THRESHOLD', 0.5)
+TILE_FULL_FRAME = env_bool('TILE_FULL_FRAME', True)
+
+# Precisão do modelo (fp32, fp16 ou int8) e imagens de calibração para INT8
+MODEL_PRECISION = env_str('MODEL_PRECISION', 'fp32')
+QUANT_CALIBRATION_DIR = env_str('QUANT_CALIBRATION_DIR', None)
+
+# Inferência em lote
+MAX_INFERENCE_BATCH_SIZE = env_int('MAX_INFERENCE_BATCH_SIZE', 4)
+
+# Micro-lotes entre requisições concorrentes (0 desativa o agendador)
+INFERENCE_BATCH_WINDOW_MS = env_float('INFERENCE_BATCH_WINDOW_MS', 0)
+
+# Pipeline dos lotes: threads de decodificação e de finalização (anotação e
+# codificação) que rodam enquanto o modelo infere, em pools do processo
+# compartilhados pelos lotes simultâneos (0 roda a etapa na própria thread), e
+# máximo de imagens em andamento por lote (0: três lotes de inferência)
+PIPELINE_DECODE_WORKERS = env_int('PIPELINE_DECODE_WORKERS', 2)
+PIPELINE_FINISH_WORKERS = env_int('PIPELINE_FINISH_WORKERS', 2)
+PIPELINE_MAX_IN_FLIGHT = env_int('PIPELINE_MAX_IN_FLIGHT', 0)
+
+# Triagem de qualidade antes da inferência: off desliga, report (o padrão) só
+# mede, e enforce recusa imagens escuras, estouradas ou borradas e, num lote,
+# reaproveita o resultado de imagens quase idênticas a uma anterior. Medida
+# numa cópia de QUALITY_SIZE px: brilho médio (0–255) e variância do
+# laplaciano; duplicatas têm dHash a até QUALITY_DUPLICATE_DISTANCE bits
+# (-1 desativa) e miniaturas 32x32 que não diferem mais que
+# QUALITY_DUPLICATE_MAX_DIFF níveis em nenhum ponto
+QUALITY_MODE = env_str('QUALITY_MODE', 'report')
+QUALITY_SIZE = env_int('QUALITY_SIZE', 256)
+QUALITY_MIN_BRIGHTNESS = env_float('QUALITY_MIN_BRIGHTNESS', 30)
+QUALITY_MAX_BRIGHTNESS = env_float('QUALITY_MAX_BRIGHTNESS', 235)
+QUALITY_MIN_SHARPNESS = env_float('QUALITY_MIN_SHARPNESS', 20)
+QUALITY_DUPLICATE_DISTANCE = env_int('QUALITY_DUPLICATE_DISTANCE', 4)
+QUALITY_DUPLICATE_MAX_DIFF = env_float('QUALITY_DUPLICATE_MAX_DIFF', 14)
+
+# Processos de inferência com modelo próprio (0 mantém o modelo no processo web)
+# e threads do torch por processo (0 divide os núcleos entre os workers)
+INFERENCE_WORKERS = env_int('INFERENCE_WORKERS', 0)
+INFERENCE_WORKER_THREADS = env_int('INFERENCE_WORKER_THREADS', 0)
+
+# Cache de resultados por conteúdo da imagem
+RESULT_CACHE_ENABLED = env_bool('RESULT_CACHE_ENABLED', True)
+RESULT_CACHE_MAX_ENTRIES = env_int('RESULT_CACHE_MAX_ENTRIES', 512)
+RESULT_CACHE_TTL_SECONDS = env_int('RESULT_CACHE_TTL_SECONDS', 3600)
+RESULT_CACHE_DISK_PATH = env_str('RESULT_CACHE_DISK_PATH', None)
+
+# Tamanho máximo de cada imagem enviada em binário
+MAX_UPLOAD_BYTES = env_int('MAX_UPLOAD_BYTES', 25 * 1024 * 1024)
+
+# Imagens por URL (image_url): hosts permitidos separados por vírgula
+# (".exemplo.com" inclui os subdomínios, "*" libera todos; vazio desativa),
+# downloads simultâneos por lote e por host, e limites de tempo em segundos
+# (conexão, entre blocos e total); o tamanho segue MAX_UPLOAD_BYTES
+IMAGE_URL_ALLOWED_HOSTS = env_str('IMAGE_URL_ALLOWED_HOSTS', '')
+IMAGE_URL_MAX_CONCURRENCY = env_int('IMAGE_URL_MAX_CONCURRENCY', 8)
+IMAGE_URL_MAX_PER_HOST = env_int('IMAGE_URL_MAX_PER_HOST', 4)
+IMAGE_URL_CONNECT_TIMEOUT = env_float('IMAGE_URL_CONNECT_TIMEOUT', 5.0)
+IMAGE_URL_READ_TIMEOUT = env_float('IMAGE_URL_READ_TIMEOUT', 15.0)
+IMAGE_URL_TOTAL_TIMEOUT = env_float('IMAGE_URL_TOTAL_TIMEOUT', 30.0)
+
+# Vídeos de vistoria (/analyze-video): tamanho máximo, quadros amostrados por
+# segundo, diferença mínima (0–1) para um quadro amostrado virar keyframe e teto
+# de keyframes; o rastreamento compensa o movimento da câmera entre keyframes,
+# junta detecções da mesma classe com IoU acima de VIDEO_TRACK_IOU, tolera
+# VIDEO_TRACK_MAX_AGE keyframes sem o dano e só conta danos vistos em
+# VIDEO_TRACK_MIN_HITS keyframes (1: um dano visto uma única vez também conta)
+VIDEO_MAX_UPLOAD_BYTES = env_int('VIDEO_MAX_UPLOAD_BYTES', 200 * 1024 * 1024)
+VIDEO_SAMPLE_FPS = env_float('VIDEO_SAMPLE_FPS', 2.0)
+VIDEO_MIN_CHANGE = env_float('VIDEO_MIN_CHANGE', 0.03)
+VIDEO_MAX_KEYFRAMES = env_int('VIDEO_MAX_KEYFRAMES', 120)
+VIDEO_TRACK_IOU = env_float('VIDEO_TRACK_IOU', 0.3)
+VIDEO_TRACK_MAX_AGE = env_int('VIDEO_TRACK_MAX_AGE', 3)
+VIDEO_TRACK_MIN_HITS = env_int('VIDEO_TRACK_MIN_HITS', 1)
+
+# Imagens anotadas sob demanda (annotate=deferred): na memória, no máximo
+# MAX_ENTRIES análises e MAX_BYTES somando os uploads guardados; com DISK_PATH
+# (por padrão o arquivo do cache de resultados) as entradas valem para todos
+# os workers
+ANNOTATION_STORE_MAX_ENTRIES = env_int('ANNOTATION_STORE_MAX_ENTRIES', 256)
+ANNOTATION_STORE_MAX_BYTES = env_int('ANNOTATION_STORE_MAX_BYTES', 128 * 1024 * 1024)
+ANNOTATION_STORE_TTL_SECONDS = env_int('ANNOTATION_STORE_TTL_SECONDS', 600)
+ANNOTATION_STORE_DISK_PATH = env_str('ANNOTATION_STORE_DISK_PATH', RESULT_CACHE_DISK_PATH)
+
+# Jobs assíncronos: threads por processo, prazo (s) da posse de um job em
+# execução, renovado enquanto ele roda, e hosts aceitos em webhook_url, no
+# formato de IMAGE_URL_ALLOWED_HOSTS (vazio desativa os webhooks)
+JOB_WORKERS = env_int('JOB_WORKERS', 2)
+JOB_LEASE_SECONDS = env_int('JOB_LEASE_SECONDS', 60)
+JOB_WEBHOOK_TIMEOUT = env_int('JOB_WEBHOOK_TIMEOUT', 10)
+JOB_WEBHOOK_ALLOWED_HOSTS = env_str('JOB_WEBHOOK_ALLOWED_HOSTS', '')
+
+# Histórico de inspeções: gravação em lote numa thread (até BATCH_SIZE inspeções
+# ou FLUSH_SECONDS de espera), fila limitada (além dela a inspeção é descartada)
+# e limite de itens por página nas consultas
+INSPECTION_HISTORY_ENABLED = env_bool('INSPECTION_HISTORY_ENABLED', True)
+INSPECTION_WRITER_BATCH_SIZE = env_int('INSPECTION_WRITER_BATCH_SIZE', 200)
+INSPECTION_WRITER_FLUSH_SECONDS = env_float('INSPECTION_WRITER_FLUSH_SECONDS', 1.0)
+INSPECTION_WRITER_MAX_QUEUE = env_int('INSPECTION_WRITER_MAX_QUEUE', 10000)
+INSPECTION_QUERY_MAX_LIMIT = env_int('INSPECTION_QUERY_MAX_LIMIT', 200)
+INSPECTION_STATS_MAX_DAYS = env_int('INSPECTION_STATS_MAX_DAYS', 366)
+
+# Profiling sob demanda (desativado sem token): fração das requisições com token
+# que é perfilada, pasta e quantidade de profiles guardados para download
+PROFILING_TOKEN = env_str('PROFILING_TOKEN', None)
+PROFILING_SAMPLE_RATE = env_float('PROFILING_SAMPLE_RATE', 1.0)
+PROFILING_DIR = env_str('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'damage-profiles'))
+PROFILING_MAX_STORED = env_int('PROFILING_MAX_STORED', 50)
+
+# Controle de admissão: análises simultâneas, fila de espera (além dela, 503 com
+# Retry-After), espera máxima na fila e, por chave de API (X-API-Key ou IP),
+# análises simultâneas e requisições por segundo com rajada (0 desativa). Só
+# as chaves de ADMISSION_API_KEYS (separadas por vírgula) têm limite próprio;
+# as demais requisições são limitadas pelo IP
+ADMISSION_ENABLED = env_bool('ADMISSION_ENABLED', True)
+ADMISSION_MAX_CONCURRENT = env_int('ADMISSION_MAX_CONCURRENT', 4)
+ADMISSION_MAX_QUEUE = env_int('ADMISSION_MAX_QUEUE', 16)
+ADMISSION_MAX_WAIT_SECONDS = env_float('ADMISSION_MAX_WAIT_SECONDS', 30)
+ADMISSION_KEY_CONCURRENCY = env_int('ADMISSION_KEY_CONCURRENCY', 0)
+ADMISSION_KEY_RATE = env_float('ADMISSION_KEY_RATE', 0)
+ADMISSION_KEY_BURST = env_int('ADMISSION_KEY_BURST', 0)
+ADMISSION_API_KEYS = env_str('ADMISSION_API_KEYS', '')
+
+# Proxies reversos na frente do app (load balancer, nginx): o IP do cliente é
+# lido de X-Forwarded-For só até essa quantidade de saltos (0: o IP da conexão)
+TRUSTED_PROXY_HOPS = env_int('TRUSTED_PROXY_HOPS', 0)
+
+# Serialização das respostas: auto (orjson se instalado), orjson ou stdlib
+JSON_ENCODER = env_str('JSON_ENCODER', 'auto')
+
+# Limite de imagens por requisição em /analyze-batch
+MAX_BATCH_IMAGES = env_int('MAX_BATCH_IMAGES', 10)
+BATCH_MEMORY_PER_IMAGE_MB = env_int('BATCH_MEMORY_PER_IMAGE_MB', 150)
+BATCH_MEMORY_FRACTION = env_float('BATCH_MEMORY_FRACTION', 0.5)
+
+# Teto de imagens em /analyze-batch com ?stream= (a memória não cresce com o lote)
+MAX_STREAM_BATCH_IMAGES = env_int('MAX_STREAM_BATCH_IMAGES', 500)
+
+
+def _available_memory_mb():
+    """Memória disponível no container/instância, em MB (None se desconhecida)"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_max_batch_images():
+    """Limite efetivo de imagens por lote, considerando a memória disponível"""
+    available_mb = _available_memory_mb()
+    if available_mb is None or BATCH_MEMORY_PER_IMAGE_MB <= 0:
+        return MAX_BATCH_IMAGES
+    by_memory = int(available_mb * BATCH_MEMORY_FRACTION) // BATCH_MEMORY_PER_IMAGE_MB
+    return max(1, min(MAX_BATCH_IMAGES, by_memory))
@@ -8,25 +8,32 @@ os.environ['QT_QPA_PLATFORM'] = 'offscreen'
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory, jsonify
-from src.models.user import db
+from werkzeug.middleware.proxy_fix import ProxyFix
+from src import config
+from src.models.user import db, dispose_connections
+from src.models.job import Job, add_missing_columns
+from src.models.inspection import Inspection
 from src.routes.user import user_bp
+from src.services.serialization import install_json_provider
+from src.services.worker_pool import is_inference_worker
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-@app.route('/api/damage/health', methods=['GET'])
-def health_check():
-    return jsonify({
-        'status': 'healthy',
-        'service': 'YOLO Damage Detection API',
-        'version': '1.0.0',
-        'model_loaded': False
-    })
+install_json_provider(app, config.JSON_ENCODER)
+if config.TRUSTED_PROXY_HOPS > 0:
+    # remote_addr passa a ser o IP que o proxy mais externo recebeu, e não o que o cliente escreveu no cabeçalho
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.TRUSTED_PROXY_HOPS, x_proto=config.TRUSTED_PROXY_HOPS)
 
 try:
-    from src.routes.damage_detection import damage_bp
+    from src.routes.damage_detection import damage_bp, yolo_service
     app.register_blueprint(damage_bp, url_prefix='/api/damage')
     print("Blueprint damage_detection carregado com sucesso!")
+    
+    from src.routes.jobs import jobs_bp, init_job_queue
+    app.register_blueprint(jobs_bp, url_prefix='/api/damage')
+    
+    from src.routes.inspections import inspections_bp, init_inspection_store
+    app.register_blueprint(inspections_bp, url_prefix='/api/damage')
 except Exception as e:
     print(f"Erro ao carregar damage_detection: {e}")
     
@@ -39,7 +46,10 @@ except Exception as e:
 
 app.register_blueprint(user_bp, url_prefix='/api')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL',
+    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
@@ -47,8 +57,37 @@ try:
     with app.app_context():
         os.makedirs(os.path.join(os.path.dirname(__file__), 'database'), exist_ok=True)
         db.create_all()
+        add_missing_columns(db.engine)
 except Exception as e:
     print(f"Erro ao criar banco de dados: {e}")
+# Com preload_app o mestre faz fork depois daqui: cada worker abre as suas conexões
+dispose_connections(app)
+
+def start_services():
+    """
+    Inicia modelo (processos, threads e warm-up), fila de jobs e gravação
+    do histórico de inspeções.
+    
+    Com MODEL_PRELOAD, o gunicorn.conf.py chama esta função em cada worker
+    após o fork, já que threads e processos do mestre não são herdados.
+    """
+    if 'damage' in app.blueprints:
+        yolo_service.start()
+    
+    if 'jobs' in app.blueprints:
+        try:
+            init_job_queue(app)
+        except Exception as e:
+            print(f"Erro ao iniciar fila de jobs: {e}")
+    
+    if 'inspections' in app.blueprints:
+        try:
+            init_inspection_store(app)
+        except Exception as e:
+            print(f"Erro ao iniciar histórico de inspeções: {e}")
+
+if not config.MODEL_PRELOAD and not is_inference_worker():
+    start_services()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
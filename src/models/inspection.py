@@ -0,0 +1,87 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from src.models.user import db
+
+
+class Inspection(db.Model):
+    """Uma análise (/detect, lote ou vídeo) com o relatório completo"""
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    plate = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
+    source = db.Column(db.String(20), nullable=False)
+    images = db.Column(db.Integer, nullable=False, default=1)
+    total_damages = db.Column(db.Integer, nullable=False, default=0)
+    total_cost = db.Column(db.Float, nullable=False, default=0)
+    urgency = db.Column(db.String(20))
+    profile = db.Column(db.String(20))
+    model_version = db.Column(db.String(255))
+    model_sha256 = db.Column(db.String(64))
+    report = db.Column(db.Text)
+    detections = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('ix_inspection_plate_created_at', 'plate', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Inspection {self.id} {self.plate}>'
+
+    def to_dict(self, include_report=False):
+        data = {
+            'inspection_id': self.id,
+            'plate': self.plate,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'source': self.source,
+            'images': self.images,
+            'total_damages': self.total_damages,
+            'total_cost': self.total_cost,
+            'urgency': self.urgency,
+            'profile': self.profile,
+            'model_version': self.model_version,
+            'model_sha256': self.model_sha256
+        }
+        if include_report:
+            data['full_report'] = json.loads(self.report) if self.report else None
+            data['detections'] = json.loads(self.detections) if self.detections else None
+        return data
+
+
+class InspectionImage(db.Model):
+    """Danos e detecções de uma imagem de um lote, gravados assim que ela termina"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    inspection_id = db.Column(db.String(32), db.ForeignKey('inspection.id'), nullable=False, index=True)
+    image_index = db.Column(db.Integer, nullable=False)
+    damages = db.Column(db.Text)
+    detections = db.Column(db.Text)
+
+
+class InspectionDamage(db.Model):
+    """Um dano de uma inspeção, com placa e dia repetidos para consultas por índice"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    inspection_id = db.Column(db.String(32), db.ForeignKey('inspection.id'), nullable=False, index=True)
+    plate = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    damage_class = db.Column(db.String(50), nullable=False)
+    severity = db.Column(db.String(20))
+    confidence = db.Column(db.Float)
+    estimated_cost = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_inspection_damage_plate_day', 'plate', 'day', 'damage_class'),
+        db.Index('ix_inspection_damage_class_day', 'damage_class', 'day'),
+    )
+
+
+class DamageDailyStats(db.Model):
+    """Totais por dia e classe de dano, atualizados junto com cada lote de gravações"""
+
+    day = db.Column(db.Date, primary_key=True)
+    damage_class = db.Column(db.String(50), primary_key=True)
+    damages = db.Column(db.Integer, nullable=False, default=0)
+    total_cost = db.Column(db.Float, nullable=False, default=0)
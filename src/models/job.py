@@ -0,0 +1,70 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.models.user import db
+
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    payload = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    webhook_url = db.Column(db.String(2048))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Processo que está executando o job e até quando ele vale (renovado enquanto roda)
+    owner = db.Column(db.String(128))
+    lease_expires_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_created_at', 'status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.status}>'
+
+    def to_dict(self, include_result=True):
+        data = {
+            'job_id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.error:
+            data['error'] = self.error
+        if include_result and self.result:
+            data['result'] = json.loads(self.result)
+        return data
+
+
+def add_missing_columns(engine):
+    """
+    create_all não altera tabelas que já existem: acrescenta as colunas de
+    posse (owner, lease_expires_at) a uma tabela job de versões anteriores
+    """
+    columns = {column['name'] for column in db.inspect(engine).get_columns('job')}
+    with engine.begin() as connection:
+        if 'owner' not in columns:
+            connection.execute(db.text('ALTER TABLE job ADD COLUMN owner VARCHAR(128)'))
+        if 'lease_expires_at' not in columns:
+            connection.execute(db.text('ALTER TABLE job ADD COLUMN lease_expires_at TIMESTAMP'))
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL permite leituras (polling de jobs) concorrentes com as escritas dos workers"""
+    if type(dbapi_connection).__module__.startswith('sqlite3'):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
@@ -2,6 +2,16 @@ from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+def dispose_connections(app, close=True):
+    """
+    Esvazia o pool de conexões do engine. O mestre do gunicorn chama após
+    criar as tabelas, para não deixar conexões para os workers herdarem; no
+    worker recém-criado, close=False descarta as herdadas sem fechá-las (elas
+    ainda são do mestre).
+    """
+    with app.app_context():
+        db.engine.dispose(close=close)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -1,8 +1,24 @@
-from flask import Blueprint, request, jsonify
-from PIL import Image
+from flask import (
+    Blueprint, Response, current_app, g, has_request_context, request, jsonify, send_file, stream_with_context,
+    url_for
+)
+from werkzeug.datastructures import FileStorage
 import io
+import os
+import uuid
 import base64
+import time
 import numpy as np
+from src import config
+from src.services import (
+    admission, image_fetch, image_quality, inspection_store, metrics, profiling, serialization
+)
+from src.services.annotation_store import AnnotationStore
+from src.services.image_io import ImageTooLarge, encode_jpeg, open_stream, read_stream
+from src.services.inference_params import PARAM_NAMES, allowed_imgsz, load_monitor, profiles
+from src.services.pipeline import run_pipeline
+from src.services.tiling import TILING_MODES
+from src.services.video import save_upload
 from src.services.yolo_service import YOLODamageService
 
 damage_bp = Blueprint('damage', __name__)
@@ -10,6 +26,545 @@ damage_bp = Blueprint('damage', __name__)
 # Instância global do serviço YOLO
 yolo_service = YOLODamageService()
 
+# Detecções guardadas para renderizar a imagem anotada sob demanda
+annotation_store = AnnotationStore(
+    max_entries=config.ANNOTATION_STORE_MAX_ENTRIES,
+    max_bytes=config.ANNOTATION_STORE_MAX_BYTES,
+    ttl_seconds=config.ANNOTATION_STORE_TTL_SECONDS,
+    disk_path=config.ANNOTATION_STORE_DISK_PATH
+)
+
+ANNOTATE_MODES = ('none', 'inline', 'deferred')
+ANNOTATED_FORMATS = {'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp'), 'png': ('PNG', 'image/png')}
+
+BINARY_MIMETYPES = ('application/octet-stream',)
+
+# Respostas em stream de /analyze-batch (um registro por imagem)
+STREAM_MIMETYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+@damage_bp.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+
+@damage_bp.after_request
+def _record_request_metrics(response):
+    endpoint = request.endpoint or 'desconhecido'
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint)
+    metrics.REQUESTS_TOTAL.inc(1, endpoint, str(response.status_code))
+    return response
+
+@damage_bp.teardown_request
+def _finish_request_metrics(exc):
+    if 'request_started' in g:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+def _projection():
+    """Seções e formato pedidos em ?fields= e ?view= (ValueError se inválidos)"""
+    if not has_request_context():
+        return None, False
+    return serialization.parse_fields(request.args.get('fields'), request.args.get('view'))
+
+def _section_requested(section):
+    """Evita montar seções que a projeção vai descartar"""
+    sections, _ = _projection()
+    return sections is None or section in sections
+
+def _jsonify(payload):
+    with metrics.stage('serialize'):
+        return jsonify(serialization.project(payload, *_projection()))
+
+def _is_binary_request():
+    return request.mimetype in BINARY_MIMETYPES or request.mimetype.startswith('image/')
+
+def _vehicle_info_from_form(form):
+    """Informações do veículo vindas de form-data ou da query string"""
+    return {
+        'plate': form.get('plate', 'Não informado'),
+        'model': form.get('model', 'Não informado'),
+        'year': form.get('year', 'Não informado'),
+        'color': form.get('color', 'Não informado')
+    }
+
+def _wants_multipart():
+    """Cliente pediu a imagem anotada como parte binária em vez de base64"""
+    if request.args.get('response_format') == 'multipart':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'multipart/mixed']) == 'multipart/mixed'
+
+def _deferred_annotation(detections, source_bytes, size):
+    """Guarda as detecções e devolve os campos que apontam para a renderização"""
+    annotation_id = annotation_store.put(detections, source_bytes, size)
+    if has_request_context():
+        annotated_url = url_for('damage.get_annotated_image', annotation_id=annotation_id)
+    else:
+        # Jobs assíncronos rodam fora de uma requisição
+        annotated_url = f'/api/damage/annotated/{annotation_id}'
+    return {
+        'annotated_image_id': annotation_id,
+        'annotated_image_url': annotated_url
+    }
+
+def _tiling_error(tiling):
+    """Mensagem de erro se o modo de tiles pedido não existe"""
+    if tiling is not None and tiling not in TILING_MODES:
+        return f'tiling deve ser um de: {", ".join(TILING_MODES)}'
+    return None
+
+def _quality_error(quality):
+    """Mensagem de erro se o modo de triagem pedido não existe"""
+    if quality is not None and quality not in image_quality.QUALITY_MODES:
+        return f'quality deve ser um de: {", ".join(image_quality.QUALITY_MODES)}'
+    return None
+
+def _quality_rejection(error):
+    """Resposta 422 de uma imagem recusada pela triagem, com o motivo e as medidas"""
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'quality': error.quality.to_dict()
+    }), 422
+
+def _inference_fields(*sources):
+    """profile, imgsz, conf, iou e max_det do primeiro lugar em que aparecem (query, form ou JSON)"""
+    fields = {}
+    for name in ('profile',) + PARAM_NAMES:
+        for source in sources:
+            value = source.get(name)
+            if value not in (None, ''):
+                fields[name] = value
+                break
+    return fields
+
+def _inference_params(*sources):
+    """Parâmetros de inferência da requisição, com o perfil resolvido; ValueError se inválidos"""
+    fields = _inference_fields(*sources)
+    return yolo_service.resolve_params(fields.pop('profile', None), fields)
+
+def _vehicle_info_from_json(vehicle_info):
+    """Garante que todos os campos de vehicle_info existam"""
+    if not isinstance(vehicle_info, dict):
+        vehicle_info = {}
+    
+    return {
+        'plate': vehicle_info.get('plate', 'Não informado'),
+        'model': vehicle_info.get('model', 'Não informado'),
+        'year': str(vehicle_info.get('year', 'Não informado')),
+        'color': vehicle_info.get('color', 'Não informado')
+    }
+
+def _record_inspection(source, vehicle_info, result, inference, processing_info):
+    """Enfileira a análise no histórico e põe o inspection_id no processing_info"""
+    inspection_id = inspection_store.record(
+        source, vehicle_info, result['damage_analysis'], result['detections'], inference.profile
+    )
+    if inspection_id is not None:
+        processing_info['inspection_id'] = inspection_id
+
+def _close_inspection(recording, processing_info):
+    """Fecha a gravação de um lote no histórico e põe o inspection_id no processing_info"""
+    inspection_id = recording.close() if recording is not None else None
+    if inspection_id is not None:
+        processing_info['inspection_id'] = inspection_id
+
+def _analyze_single(image, vehicle_info, annotate, source_bytes=None, inference=None):
+    """
+    Processa uma imagem já decodificada e monta a resposta de /detect.
+    
+    Retorna (resposta, JPEG anotado ou None); cabe a quem chama decidir se
+    o JPEG vai em base64 ou como parte binária.
+    """
+    inference = inference or yolo_service.resolve_params()
+    # Processa a imagem (só desenha as anotações quando vão na resposta)
+    result = yolo_service.process_image(image, annotate=annotate == 'inline', params=inference)
+    
+    # Prepara a resposta
+    response = {
+        'success': True,
+        'detections': result['detections'],
+        'damage_analysis': result['damage_analysis'],
+        'summary': result['summary'],
+        'processing_info': {
+            'total_detections': len(result['detections']),
+            'model_version': 'YOLOv8 car_damage_best.pt',
+            'confidence_threshold': inference.conf,
+            'cache_hit': result.get('cache_hit', False)
+        }
+    }
+    response['processing_info'].update(inference.to_dict())
+    if 'tiling' in result:
+        response['processing_info']['tiling'] = result['tiling']
+    if image.quality is not None:
+        response['processing_info']['quality'] = image.quality.to_dict()
+    if admission.queue_wait_ms() is not None:
+        response['processing_info']['queue_wait_ms'] = admission.queue_wait_ms()
+    _record_inspection('detect', vehicle_info, result, inference, response['processing_info'])
+    
+    # Cria o relatório completo
+    if _section_requested('full_report'):
+        response['full_report'] = yolo_service.create_full_report(
+            result['damage_analysis'], vehicle_info, result['summary']
+        )
+    
+    annotated_jpeg = None
+    if annotate == 'deferred':
+        response.update(_deferred_annotation(result['detections'], source_bytes, image.original_size))
+    elif annotate == 'inline':
+        with metrics.stage('encode_jpeg'):
+            annotated_jpeg = encode_jpeg(result['annotated_image'])
+    
+    return response, annotated_jpeg
+
+def _entry_url(image_data):
+    """URL de uma entrada de lote ({'image_url': ...} ou a própria URL), ou None"""
+    if isinstance(image_data, dict):
+        return image_data.get('image_url')
+    return image_data if image_fetch.is_url(image_data) else None
+
+def _decode_workers(entries):
+    """Threads de decodificação do pipeline; lotes com URLs baixam com mais concorrência"""
+    if any(_entry_url(entry) is not None for entry in entries):
+        return max(config.PIPELINE_DECODE_WORKERS, config.IMAGE_URL_MAX_CONCURRENCY)
+    return config.PIPELINE_DECODE_WORKERS
+
+def _decode_batch_entry(image_data, annotate, tiling=None, inference=None):
+    """
+    Decodifica uma imagem de um lote (arquivo, base64 ou URL).
+    
+    Retorna (imagem, bytes originais); os bytes só são guardados com
+    annotate=deferred.
+    """
+    image_url = _entry_url(image_data)
+    if image_url is not None:
+        source, image_bytes = image_fetch.fetcher.fetch(image_url, keep_bytes=annotate == 'deferred')
+        return yolo_service.prepare_image(source, tiling, inference), image_bytes
+    
+    image_bytes = None
+    with metrics.stage('parse'):
+        if isinstance(image_data, FileStorage):
+            if annotate == 'deferred':
+                image_bytes = read_stream(image_data.stream)
+                source = io.BytesIO(image_bytes)
+            else:
+                source = open_stream(image_data.stream)
+        else:
+            if isinstance(image_data, dict) and 'image_base64' in image_data:
+                img_b64 = image_data['image_base64']
+            else:
+                img_b64 = image_data
+            
+            image_bytes = base64.b64decode(img_b64)
+            source = io.BytesIO(image_bytes)
+    
+    image = yolo_service.prepare_image(source, tiling, inference)
+    return image, image_bytes if annotate == 'deferred' else None
+
+class _ConsolidatedReport:
+    """
+    Totais do lote acumulados item a item, sem guardar os resultados; com
+    recording, cada imagem vai para o histórico assim que termina
+    """
+    
+    def __init__(self, vehicle_info, recording=None):
+        self.vehicle_info = vehicle_info
+        self.recording = recording
+        self.total_images = 0
+        self.failed_images = 0
+        self.rejected_images = 0
+        self.duplicate_images = 0
+        self.total_damages = 0
+        self.total_cost = 0
+        self.damage_types = set()
+    
+    def add(self, item):
+        self.total_images += 1
+        if 'error' in item:
+            self.failed_images += 1
+            if 'quality' in item:
+                self.rejected_images += 1
+            return
+        if 'duplicate_of' in item:
+            # Cópia do resultado da imagem original, que já foi contado
+            self.duplicate_images += 1
+            return
+        if self.recording is not None:
+            self.recording.add(item['image_index'], item['damage_analysis'], item['detections'], item['summary'])
+        self.total_damages += item['summary']['total_damages']
+        self.total_cost += item['summary']['total_cost']
+        self.damage_types.update(item['summary']['damage_types'])
+    
+    def to_dict(self):
+        return {
+            'total_images': self.total_images,
+            'processed_images': self.total_images - self.failed_images - self.duplicate_images,
+            'failed_images': self.failed_images,
+            'rejected_images': self.rejected_images,
+            'duplicate_images': self.duplicate_images,
+            'total_damages_found': self.total_damages,
+            'total_estimated_cost': round(self.total_cost, 2),
+            'unique_damage_types': sorted(self.damage_types),
+            'vehicle_info': self.vehicle_info
+        }
+
+def _batch_items(entries, annotate, tiling=None, multipart=False, decode_workers=None, inference=None,
+                 quality=None):
+    """
+    Decodifica (ou baixa), infere e finaliza as imagens de um lote em
+    pipeline (a decodificação da próxima e a codificação da anterior rodam
+    em threads enquanto o modelo processa a atual) e gera o item da resposta
+    de cada uma, na ordem da entrada.
+    
+    A triagem de qualidade roda junto com a decodificação; no modo enforce,
+    imagens recusadas viram itens de erro com o motivo em quality, e imagens
+    quase idênticas a uma anterior não vão ao modelo: o item traz uma cópia
+    do resultado dela (nas coordenadas da duplicata) e o índice em
+    duplicate_of.
+    
+    Gera (item, JPEG anotado ou None); com multipart=True o JPEG fica fora do
+    item, referenciado por annotated_image_part, senão vai em base64.
+    """
+    if decode_workers is None:
+        decode_workers = _decode_workers(entries)
+    if decode_workers > 0 or config.PIPELINE_FINISH_WORKERS > 0:
+        profiling.note_unprofiled('batch_pipeline')
+    quality = quality or config.QUALITY_MODE
+    duplicates = image_quality.DuplicateFinder() if quality != 'off' else None
+    # Saída da inferência e tamanho decodificado de cada imagem que pode ter
+    # duplicatas (só no modo enforce, que copia o resultado em vez de inferir)
+    references = {}
+    
+    def decode(entry):
+        index, image_data = entry
+        image, image_bytes = _decode_batch_entry(image_data, annotate, tiling, inference)
+        image_quality.triage(image, quality)
+        return index, image, image_bytes
+    
+    def infer(decoded):
+        # Roda na ordem da entrada, então a referência de uma duplicata é sempre anterior a ela
+        outputs = [None] * len(decoded)
+        pending, copies = [], []
+        for n, (index, image, _) in enumerate(decoded):
+            original = duplicates.match(index, image.quality) if duplicates is not None else None
+            if original is not None and quality == 'enforce':
+                image_quality.QUALITY_SKIPPED.inc(1, 'duplicate')
+                image.quality.duplicate_of = original
+                copies.append((n, original))
+                continue
+            if original is not None:
+                image.quality.duplicate_of = original
+            pending.append(n)
+        if pending:
+            detected = yolo_service.detect_prepared([decoded[n][1] for n in pending], inference)
+            for n, output in zip(pending, detected):
+                outputs[n] = output
+                index, image, _ = decoded[n]
+                if quality == 'enforce' and image.quality.duplicate_of is None:
+                    references[index] = (output, image.image.size)
+        for n, original in copies:
+            output, (width, height) = references[original]
+            if not isinstance(output, Exception):
+                # Mesmas caixas, levadas ao tamanho decodificado da duplicata
+                detections, cache_hit, tiling_info = output
+                image = decoded[n][1].image
+                output = (detections.scaled(image.width / width, image.height / height), cache_hit, tiling_info)
+            outputs[n] = image_quality.Duplicate(original, output)
+        return outputs
+    
+    def finish(i, decoded, detected):
+        duplicate_of = None
+        if isinstance(detected, image_quality.Duplicate):
+            duplicate_of, detected = detected.image_index, detected.output
+        # Prazo vencido derruba o lote inteiro, não só esta imagem
+        if isinstance(detected, admission.DeadlineExceeded):
+            raise detected
+        
+        annotated_jpeg = None
+        try:
+            if isinstance(decoded, Exception):
+                raise decoded
+            if isinstance(detected, Exception):
+                raise detected
+            
+            _, image, source_bytes = decoded
+            result = yolo_service.finish_result(image, detected, annotate=annotate == 'inline')
+            
+            item = {
+                'image_index': i,
+                'detections': result['detections'],
+                'damage_analysis': result['damage_analysis'],
+                'summary': result['summary'],
+                'cache_hit': result.get('cache_hit', False)
+            }
+            if duplicate_of is not None:
+                item['duplicate_of'] = duplicate_of
+            if 'tiling' in result:
+                item['tiling'] = result['tiling']
+            if image.quality is not None:
+                item['quality'] = image.quality.to_dict()
+            if annotate == 'deferred':
+                item.update(_deferred_annotation(result['detections'], source_bytes, image.original_size))
+            elif annotate == 'inline':
+                with metrics.stage('encode_jpeg'):
+                    annotated_jpeg = encode_jpeg(result['annotated_image'])
+                if multipart:
+                    item['annotated_image_part'] = f'annotated-{i}'
+                else:
+                    with metrics.stage('encode_base64'):
+                        item['annotated_image_base64'] = base64.b64encode(annotated_jpeg).decode('utf-8')
+                    annotated_jpeg = None
+            
+        except image_quality.ImageRejected as e:
+            item = {
+                'image_index': i,
+                'error': f'Erro ao processar imagem {i}: {str(e)}',
+                'quality': e.quality.to_dict()
+            }
+        except Exception as e:
+            item = {
+                'image_index': i,
+                'error': f'Erro ao processar imagem {i}: {str(e)}'
+            }
+        
+        return item, annotated_jpeg
+    
+    outputs = run_pipeline(
+        enumerate(entries), decode, infer, finish,
+        chunk_size=yolo_service.max_inference_batch_size,
+        decode_workers=decode_workers,
+        finish_workers=config.PIPELINE_FINISH_WORKERS,
+        max_in_flight=config.PIPELINE_MAX_IN_FLIGHT
+    )
+    for output in outputs:
+        if isinstance(output, Exception):
+            raise output
+        yield output
+
+def _analyze_batch(entries, vehicle_info, annotate, tiling=None, multipart=False, inference=None, quality=None):
+    """
+    Processa as imagens de um lote e monta a resposta de /analyze-batch.
+    
+    Retorna (resposta, partes binárias); as partes só são preenchidas com
+    multipart=True, caso contrário as imagens anotadas vão em base64.
+    """
+    inference = inference or yolo_service.resolve_params()
+    annotated_parts = {}
+    results = []
+    recording = inspection_store.open_recording('batch', _vehicle_info_from_json(vehicle_info), inference.profile)
+    report = _ConsolidatedReport(vehicle_info, recording)
+    
+    try:
+        for item, annotated_jpeg in _batch_items(entries, annotate, tiling, multipart, inference=inference,
+                                                 quality=quality):
+            report.add(item)
+            results.append(item)
+            if annotated_jpeg is not None:
+                annotated_parts[item['annotated_image_part']] = annotated_jpeg
+    except BaseException:
+        # O que já foi analisado fica no histórico
+        _close_inspection(recording, {})
+        raise
+    
+    response = {
+        'success': True,
+        'results': results,
+        'consolidated_report': report.to_dict(),
+        'processing_info': inference.to_dict()
+    }
+    if admission.queue_wait_ms() is not None:
+        response['processing_info']['queue_wait_ms'] = admission.queue_wait_ms()
+    _close_inspection(recording, response['processing_info'])
+    return response, annotated_parts
+
+def _stream_format():
+    """ndjson ou sse quando o cliente pediu os resultados em stream (?stream= ou Accept)"""
+    stream = request.args.get('stream')
+    if stream:
+        return stream
+    best = request.accept_mimetypes.best_match(['application/json', *STREAM_MIMETYPES.values()])
+    for name, mimetype in STREAM_MIMETYPES.items():
+        if best == mimetype:
+            return name
+    return None
+
+def _stream_record(stream_format, record_type, payload):
+    payload = serialization.project(payload, *_projection())
+    if stream_format == 'sse':
+        return f'event: {record_type}\ndata: {current_app.json.dumps(payload)}\n\n'
+    return current_app.json.dumps(dict(payload, type=record_type)) + '\n'
+
+def _stream_batch(entries, vehicle_info, annotate, tiling, stream_format, inference, quality=None):
+    """
+    Resposta em stream de /analyze-batch: um registro por imagem assim que
+    ela termina e, no fim, o consolidated_report.
+    
+    O pipeline mantém no máximo PIPELINE_MAX_IN_FLIGHT imagens em andamento
+    e cada entrada é descartada assim que entra nele, de modo que a memória
+    não cresce com o tamanho do lote.
+    """
+    decode_workers = _decode_workers(entries)
+    
+    def consume():
+        for i in range(len(entries)):
+            # Solta o base64 (ou o arquivo) já lido do corpo da requisição
+            entry, entries[i] = entries[i], None
+            yield entry
+    
+    def generate():
+        recording = inspection_store.open_recording('batch', _vehicle_info_from_json(vehicle_info), inference.profile)
+        report = _ConsolidatedReport(vehicle_info, recording)
+        try:
+            for item, _ in _batch_items(consume(), annotate, tiling, decode_workers=decode_workers,
+                                        inference=inference, quality=quality):
+                report.add(item)
+                yield _stream_record(stream_format, 'result', item)
+            summary = {
+                'success': True,
+                'consolidated_report': report.to_dict(),
+                'processing_info': inference.to_dict()
+            }
+            if admission.queue_wait_ms() is not None:
+                summary['processing_info']['queue_wait_ms'] = admission.queue_wait_ms()
+            _close_inspection(recording, summary['processing_info'])
+            yield _stream_record(stream_format, 'summary', summary)
+        except Exception as e:
+            yield _stream_record(stream_format, 'error', {
+                'success': False,
+                'error': f'Erro interno do servidor: {str(e)}'
+            })
+        finally:
+            # Cliente desconectado ou erro no meio do lote: o que já foi analisado fica no histórico
+            _close_inspection(recording, {})
+    
+    response = Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[stream_format])
+    # Sem buffer no proxy, para cada registro chegar assim que fica pronto
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _multipart_response(payload, images):
+    """
+    Resposta multipart/mixed: primeiro o JSON, depois cada JPEG anotado
+    como parte própria identificada por Content-ID.
+    """
+    boundary = uuid.uuid4().hex
+    with metrics.stage('serialize'):
+        payload_json = current_app.json.dumps(serialization.project(payload, *_projection())).encode('utf-8')
+    
+    def generate():
+        yield (
+            f'--{boundary}\r\nContent-Type: application/json\r\n\r\n'
+        ).encode()
+        yield payload_json
+        for part_id, jpeg_bytes in images.items():
+            yield (
+                f'\r\n--{boundary}\r\nContent-Type: image/jpeg\r\n'
+                f'Content-ID: <{part_id}>\r\nContent-Length: {len(jpeg_bytes)}\r\n\r\n'
+            ).encode()
+            yield jpeg_bytes
+        yield f'\r\n--{boundary}--\r\n'.encode()
+    
+    return Response(generate(), mimetype=f'multipart/mixed; boundary={boundary}')
+
 @damage_bp.route('/health', methods=['GET'])
 def health_check():
     """Endpoint para verificar se a API está funcionando"""
@@ -20,24 +575,58 @@ def health_check():
         'model_loaded': yolo_service.model is not None
     })
 
+@damage_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """Prontidão: 200 só com o modelo carregado e aquecido, com os tempos de inicialização"""
+    status = dict(yolo_service.startup)
+    status['ready'] = yolo_service.ready
+    status['model_sha256'] = yolo_service.model_sha256
+    return jsonify(status), 200 if yolo_service.ready else 503
+
 @damage_bp.route('/detect', methods=['POST'])
+@admission.admitted
+@profiling.profiled
 def detect_damage():
     """
     Endpoint principal para detecção de danos em imagens
     
     Aceita:
     - Arquivo de imagem via form-data (key: 'image')
+    - Imagem binária no corpo (application/octet-stream ou image/*)
     - Imagem em base64 via JSON (key: 'image_base64')
+    - URL da imagem via JSON (key: 'image_url'), baixada pelo servidor
+      (hosts em IMAGE_URL_ALLOWED_HOSTS)
     - Informações opcionais do veículo
+    - tiling (off, on ou auto): inferência em tiles para fotos de alta resolução
+    - profile (fast, standard, accurate ou auto) e imgsz, conf, iou, max_det,
+      dentro dos limites do servidor
+    - quality (off, report ou enforce): triagem de nitidez e exposição antes
+      do modelo; report (padrão) só mede, enforce devolve 422 para uma
+      imagem inutilizável
     
     Retorna:
     - Análise completa dos danos detectados
-    - Imagem anotada em base64
+    - Imagem anotada conforme annotate:
+      inline (padrão) em base64, ou como parte binária com
+      ?response_format=multipart / Accept: multipart/mixed;
+      deferred como URL renderizada sob demanda; none sem imagem
     - Relatório detalhado
+    
+    ?fields= escolhe as seções da resposta e ?view=compact devolve só
+    detecções, resumo e processing_info, em colunas (vale para todos os
+    endpoints de análise).
     """
     try:
         image = None
+        source_bytes = None
         vehicle_info = {}
+        annotate = request.args.get('annotate')
+        tiling = request.args.get('tiling')
+        quality = request.args.get('quality')
+        try:
+            _projection()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Verifica se é uma requisição com arquivo
         if 'image' in request.files:
@@ -45,81 +634,128 @@ def detect_damage():
             if file.filename == '':
                 return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
             
-            # Carrega a imagem
-            image = Image.open(file.stream).convert('RGB')
+            # Carrega a imagem (guardando os bytes se a anotação for adiada)
+            annotate = annotate or request.form.get('annotate')
+            tiling = tiling or request.form.get('tiling')
+            quality = quality or request.form.get('quality')
+            if _tiling_error(tiling):
+                return jsonify({'error': _tiling_error(tiling)}), 400
+            try:
+                inference = _inference_params(request.args, request.form)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if annotate == 'deferred':
+                with metrics.stage('parse'):
+                    source_bytes = file.read()
+                image = yolo_service.prepare_image(io.BytesIO(source_bytes), tiling, inference)
+            else:
+                image = yolo_service.prepare_image(file.stream, tiling, inference)
             
             # Pega informações do veículo do form-data
-            vehicle_info = {
-                'plate': request.form.get('plate', 'Não informado'),
-                'model': request.form.get('model', 'Não informado'),
-                'year': request.form.get('year', 'Não informado'),
-                'color': request.form.get('color', 'Não informado')
-            }
+            vehicle_info = _vehicle_info_from_form(request.form)
+        
+        # Imagem binária no corpo da requisição, decodificada enquanto é lida
+        elif _is_binary_request():
+            if _tiling_error(tiling):
+                return jsonify({'error': _tiling_error(tiling)}), 400
+            try:
+                inference = _inference_params(request.args)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            try:
+                with metrics.stage('parse'):
+                    if annotate == 'deferred':
+                        source_bytes = read_stream(request.stream)
+                        source = io.BytesIO(source_bytes)
+                    else:
+                        source = open_stream(request.stream)
+                image = yolo_service.prepare_image(source, tiling, inference)
+            except Exception as e:
+                return jsonify({'error': f'Erro ao decodificar imagem: {str(e)}'}), 400
+            
+            # Informações do veículo vêm da query string
+            vehicle_info = _vehicle_info_from_form(request.args)
         
         # Verifica se é uma requisição JSON com base64
         elif request.is_json:
-            data = request.get_json()
+            with metrics.stage('parse'):
+                data = request.get_json()
             
-            if 'image_base64' not in data:
-                return jsonify({'error': 'Campo image_base64 é obrigatório'}), 400
+            if 'image_base64' not in data and 'image_url' not in data:
+                return jsonify({'error': 'Campo image_base64 ou image_url é obrigatório'}), 400
             
+            annotate = annotate or data.get('annotate')
+            tiling = tiling or data.get('tiling')
+            quality = quality or data.get('quality')
+            if _tiling_error(tiling):
+                return jsonify({'error': _tiling_error(tiling)}), 400
             try:
-                # Decodifica a imagem base64
-                image_data = base64.b64decode(data['image_base64'])
-                image = Image.open(io.BytesIO(image_data)).convert('RGB')
-                
-                # Pega informações do veículo do JSON
-                vehicle_info = data.get('vehicle_info', {})
-                if not isinstance(vehicle_info, dict):
-                    vehicle_info = {}
-                
-                # Garante que todos os campos existam
-                vehicle_info = {
-                    'plate': vehicle_info.get('plate', 'Não informado'),
-                    'model': vehicle_info.get('model', 'Não informado'),
-                    'year': str(vehicle_info.get('year', 'Não informado')),
-                    'color': vehicle_info.get('color', 'Não informado')
-                }
-                
-            except Exception as e:
-                return jsonify({'error': f'Erro ao decodificar imagem base64: {str(e)}'}), 400
+                inference = _inference_params(request.args, data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            if 'image_url' in data:
+                try:
+                    source, source_bytes = image_fetch.fetcher.fetch(
+                        data['image_url'], keep_bytes=annotate == 'deferred'
+                    )
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                except ImageTooLarge as e:
+                    return jsonify({'error': str(e)}), 413
+                except image_fetch.ImageFetchError as e:
+                    return jsonify({'error': str(e)}), 502
+                try:
+                    image = yolo_service.prepare_image(source, tiling, inference)
+                except Exception as e:
+                    return jsonify({'error': f'Erro ao decodificar imagem: {str(e)}'}), 400
+                vehicle_info = _vehicle_info_from_json(data.get('vehicle_info', {}))
+            
+            else:
+                try:
+                    # Decodifica a imagem base64
+                    with metrics.stage('parse'):
+                        source_bytes = base64.b64decode(data['image_base64'])
+                    image = yolo_service.prepare_image(io.BytesIO(source_bytes), tiling, inference)
+                    
+                    # Pega informações do veículo do JSON
+                    vehicle_info = _vehicle_info_from_json(data.get('vehicle_info', {}))
+                    
+                except Exception as e:
+                    return jsonify({'error': f'Erro ao decodificar imagem base64: {str(e)}'}), 400
         
         else:
-            return jsonify({'error': 'Formato de requisição inválido. Use form-data com arquivo ou JSON com base64'}), 400
+            return jsonify({'error': 'Formato de requisição inválido. Use form-data com arquivo ou JSON com base64 ou image_url'}), 400
+        
+        annotate = annotate or 'inline'
+        if annotate not in ANNOTATE_MODES:
+            return jsonify({'error': f'annotate deve ser um de: {", ".join(ANNOTATE_MODES)}'}), 400
+        if _quality_error(quality):
+            return jsonify({'error': _quality_error(quality)}), 400
         
         # Verifica se o modelo está carregado
         if yolo_service.model is None:
             return jsonify({'error': 'Modelo YOLO não está carregado'}), 500
         
-        # Processa a imagem
-        result = yolo_service.process_image(image)
+        # Imagens borradas ou mal expostas não chegam ao modelo
+        try:
+            image_quality.triage(image, quality or config.QUALITY_MODE)
+        except image_quality.ImageRejected as e:
+            return _quality_rejection(e)
         
-        # Converte a imagem anotada para base64
-        annotated_img_pil = Image.fromarray(result['annotated_image'])
-        img_buffer = io.BytesIO()
-        annotated_img_pil.save(img_buffer, format='JPEG', quality=85)
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+        response, annotated_jpeg = _analyze_single(image, vehicle_info, annotate, source_bytes, inference)
         
-        # Cria o relatório completo
-        full_report = yolo_service.create_full_report(result['damage_analysis'], vehicle_info)
-        
-        # Prepara a resposta
-        response = {
-            'success': True,
-            'detections': result['detections'],
-            'damage_analysis': result['damage_analysis'],
-            'summary': result['summary'],
-            'annotated_image_base64': img_base64,
-            'full_report': full_report,
-            'processing_info': {
-                'total_detections': len(result['detections']),
-                'model_version': 'YOLOv8 car_damage_best.pt',
-                'confidence_threshold': 0.25
-            }
-        }
+        if annotated_jpeg is not None:
+            if _wants_multipart():
+                response['annotated_image_part'] = 'annotated-image'
+                return _multipart_response(response, {'annotated-image': annotated_jpeg})
+            with metrics.stage('encode_base64'):
+                response['annotated_image_base64'] = base64.b64encode(annotated_jpeg).decode('utf-8')
         
-        return jsonify(response)
+        return _jsonify(response)
         
+    except admission.DeadlineExceeded as e:
+        return admission.rejection_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -127,105 +763,304 @@ def detect_damage():
         }), 500
 
 @damage_bp.route('/analyze-batch', methods=['POST'])
+@admission.admitted
+@profiling.profiled
 def analyze_batch():
     """
     Endpoint para análise em lote de múltiplas imagens
     
     Aceita:
     - Lista de imagens em base64 via JSON
+      (ou URLs: {'image_url': ...}, baixadas em paralelo com a inferência)
+    - Arquivos via multipart/form-data (key: 'images', repetida)
+    - tiling (off, on ou auto), aplicado a todas as imagens
+    - profile e parâmetros de inferência, como em /detect
+    - quality, como em /detect; no modo enforce imagens quase idênticas a uma
+      anterior do lote recebem uma cópia do resultado dela (duplicate_of)
     
     Retorna:
     - Análise de cada imagem
     - Relatório consolidado
+    
+    Com ?stream=ndjson ou ?stream=sse (ou Accept: application/x-ndjson /
+    text/event-stream), cada imagem vira um registro enviado assim que fica
+    pronta, seguido de um registro final com o relatório consolidado.
     """
     try:
-        if not request.is_json:
-            return jsonify({'error': 'Requisição deve ser JSON'}), 400
+        try:
+            _projection()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if request.files:
+            entries = request.files.getlist('images')
+            if len(entries) == 0:
+                return jsonify({'error': 'Envie as imagens no campo images'}), 400
+            vehicle_info = _vehicle_info_from_form(request.form)
+            annotate = request.args.get('annotate') or request.form.get('annotate')
+            tiling = request.args.get('tiling') or request.form.get('tiling')
+            quality = request.args.get('quality') or request.form.get('quality')
+            fields = _inference_fields(request.args, request.form)
+        
+        elif request.is_json:
+            with metrics.stage('parse'):
+                data = request.get_json()
+            
+            if 'images' not in data or not isinstance(data['images'], list):
+                return jsonify({'error': 'Campo images deve ser uma lista'}), 400
+            
+            if len(data['images']) == 0:
+                return jsonify({'error': 'Lista de imagens não pode estar vazia'}), 400
+            
+            entries = data['images']
+            vehicle_info = data.get('vehicle_info', {})
+            annotate = request.args.get('annotate') or data.get('annotate')
+            tiling = request.args.get('tiling') or data.get('tiling')
+            quality = request.args.get('quality') or data.get('quality')
+            fields = _inference_fields(request.args, data)
         
-        data = request.get_json()
+        else:
+            return jsonify({'error': 'Requisição deve ser JSON ou multipart/form-data'}), 400
         
-        if 'images' not in data or not isinstance(data['images'], list):
-            return jsonify({'error': 'Campo images deve ser uma lista'}), 400
+        stream_format = _stream_format()
+        if stream_format is not None and stream_format not in STREAM_MIMETYPES:
+            return jsonify({'error': f'stream deve ser um de: {", ".join(STREAM_MIMETYPES)}'}), 400
         
-        if len(data['images']) == 0:
-            return jsonify({'error': 'Lista de imagens não pode estar vazia'}), 400
+        # Em stream a memória não cresce com o lote, e o teto é bem maior
+        max_images = config.MAX_STREAM_BATCH_IMAGES if stream_format else config.get_max_batch_images()
+        if len(entries) > max_images:
+            return jsonify({'error': f'Máximo de {max_images} imagens por requisição'}), 400
         
-        if len(data['images']) > 10:
-            return jsonify({'error': 'Máximo de 10 imagens por requisição'}), 400
+        annotate = annotate or 'inline'
+        if annotate not in ANNOTATE_MODES:
+            return jsonify({'error': f'annotate deve ser um de: {", ".join(ANNOTATE_MODES)}'}), 400
+        if _tiling_error(tiling):
+            return jsonify({'error': _tiling_error(tiling)}), 400
+        if _quality_error(quality):
+            return jsonify({'error': _quality_error(quality)}), 400
+        try:
+            inference = yolo_service.resolve_params(fields.pop('profile', None), fields)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Verifica se o modelo está carregado
         if yolo_service.model is None:
             return jsonify({'error': 'Modelo YOLO não está carregado'}), 500
         
-        results = []
-        total_damages = 0
-        total_cost = 0
-        all_damage_types = set()
+        if stream_format:
+            return _stream_batch(entries, vehicle_info, annotate, tiling, stream_format, inference, quality)
         
-        vehicle_info = data.get('vehicle_info', {})
+        multipart = annotate == 'inline' and _wants_multipart()
         
-        for i, image_data in enumerate(data['images']):
-            try:
-                # Decodifica a imagem
-                if isinstance(image_data, dict) and 'image_base64' in image_data:
-                    img_b64 = image_data['image_base64']
-                else:
-                    img_b64 = image_data
-                
-                image_bytes = base64.b64decode(img_b64)
-                image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-                
-                # Processa a imagem
-                result = yolo_service.process_image(image)
-                
-                # Converte imagem anotada para base64
-                annotated_img_pil = Image.fromarray(result['annotated_image'])
-                img_buffer = io.BytesIO()
-                annotated_img_pil.save(img_buffer, format='JPEG', quality=85)
-                img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-                
-                # Adiciona aos totais
-                total_damages += result['summary']['total_damages']
-                total_cost += result['summary']['total_cost']
-                all_damage_types.update(result['summary']['damage_types'])
-                
-                results.append({
-                    'image_index': i,
-                    'detections': result['detections'],
-                    'damage_analysis': result['damage_analysis'],
-                    'summary': result['summary'],
-                    'annotated_image_base64': img_base64
-                })
-                
-            except Exception as e:
-                results.append({
-                    'image_index': i,
-                    'error': f'Erro ao processar imagem {i}: {str(e)}'
-                })
-        
-        # Cria relatório consolidado
-        consolidated_report = {
-            'total_images': len(data['images']),
-            'processed_images': len([r for r in results if 'error' not in r]),
-            'failed_images': len([r for r in results if 'error' in r]),
-            'total_damages_found': total_damages,
-            'total_estimated_cost': round(total_cost, 2),
-            'unique_damage_types': sorted(list(all_damage_types)),
-            'vehicle_info': vehicle_info
-        }
+        # Decodificação, inferência em lotes e codificação sobrepostas
+        response, annotated_parts = _analyze_batch(
+            entries, vehicle_info, annotate, tiling, multipart, inference, quality
+        )
         
+        if multipart:
+            return _multipart_response(response, annotated_parts)
+        return _jsonify(response)
+        
+    except admission.DeadlineExceeded as e:
+        return admission.rejection_response(e)
+    except Exception as e:
         return jsonify({
+            'success': False,
+            'error': f'Erro interno do servidor: {str(e)}'
+        }), 500
+
+@damage_bp.route('/analyze-video', methods=['POST'])
+@admission.admitted
+@profiling.profiled
+def analyze_video():
+    """
+    Endpoint para análise de um vídeo de vistoria (volta ao redor do veículo)
+    
+    Aceita:
+    - Arquivo de vídeo via form-data (key: 'video')
+    - Vídeo binário no corpo (video/* ou application/octet-stream)
+    - sample_fps opcional (query ou form) e informações do veículo
+    
+    Retorna:
+    - Cada dano uma única vez, com o instante e o quadro da melhor vista
+    - Resumo e relatório completo, sem somar o mesmo dano em vários quadros
+    - video_info: quadros lidos, amostrados, keyframes e danos rastreados
+    """
+    try:
+        try:
+            _projection()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if 'video' in request.files:
+            stream = request.files['video'].stream
+            params = request.form
+        elif request.mimetype in BINARY_MIMETYPES or request.mimetype.startswith('video/'):
+            stream = request.stream
+            params = request.args
+        else:
+            return jsonify({'error': 'Envie o vídeo no campo video ou no corpo da requisição'}), 400
+        
+        sample_fps = request.args.get('sample_fps') or params.get('sample_fps')
+        if sample_fps is not None:
+            try:
+                sample_fps = float(sample_fps)
+            except ValueError:
+                sample_fps = 0
+            if sample_fps <= 0:
+                return jsonify({'error': 'sample_fps deve ser um número positivo'}), 400
+        try:
+            inference = _inference_params(request.args, params)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Verifica se o modelo está carregado
+        if yolo_service.model is None:
+            return jsonify({'error': 'Modelo YOLO não está carregado'}), 500
+        
+        try:
+            with metrics.stage('parse'):
+                path = save_upload(stream, config.VIDEO_MAX_UPLOAD_BYTES)
+        except ImageTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        
+        try:
+            result = yolo_service.process_video(path, sample_fps, inference)
+        except ValueError as e:
+            return jsonify({'error': f'Erro ao decodificar vídeo: {str(e)}'}), 400
+        finally:
+            os.remove(path)
+        
+        response = {
             'success': True,
-            'results': results,
-            'consolidated_report': consolidated_report
-        })
+            'detections': result['detections'],
+            'damage_analysis': result['damage_analysis'],
+            'summary': result['summary'],
+            'video_info': result['video_info'],
+            'processing_info': {
+                'total_detections': len(result['detections']),
+                'model_version': 'YOLOv8 car_damage_best.pt',
+                'confidence_threshold': inference.conf
+            }
+        }
+        response['processing_info'].update(inference.to_dict())
+        if admission.queue_wait_ms() is not None:
+            response['processing_info']['queue_wait_ms'] = admission.queue_wait_ms()
+        vehicle_info = _vehicle_info_from_form(params)
+        _record_inspection('video', vehicle_info, result, inference, response['processing_info'])
+        if _section_requested('full_report'):
+            response['full_report'] = yolo_service.create_full_report(
+                result['damage_analysis'], vehicle_info, result['summary']
+            )
+        return _jsonify(response)
         
+    except admission.DeadlineExceeded as e:
+        return admission.rejection_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': f'Erro interno do servidor: {str(e)}'
         }), 500
 
+@damage_bp.route('/annotated/<annotation_id>', methods=['GET'])
+def get_annotated_image(annotation_id):
+    """
+    Renderiza sob demanda a imagem anotada de uma análise feita com annotate=deferred
+    
+    Parâmetros opcionais:
+    - width: largura máxima (miniatura), mantendo a proporção
+    - format: jpeg (padrão), webp ou png
+    - quality: 1-95 para jpeg/webp (padrão 85)
+    - layer: image (padrão) ou overlay (apenas as caixas, PNG transparente)
+    """
+    entry = annotation_store.get(annotation_id)
+    if entry is None:
+        return jsonify({'error': 'Imagem anotada não encontrada ou expirada'}), 404
+    
+    image_format = request.args.get('format', 'jpeg').lower()
+    layer = request.args.get('layer', 'image')
+    if image_format not in ANNOTATED_FORMATS:
+        return jsonify({'error': f'format deve ser um de: {", ".join(ANNOTATED_FORMATS)}'}), 400
+    if layer not in ('image', 'overlay'):
+        return jsonify({'error': 'layer deve ser image ou overlay'}), 400
+    
+    try:
+        width = request.args.get('width', type=int)
+        quality = min(95, max(1, request.args.get('quality', 85, type=int)))
+        if layer == 'overlay':
+            image_format = 'png'
+        pil_format, mimetype = ANNOTATED_FORMATS[image_format]
+        
+        image_bytes = yolo_service.render_annotated(
+            entry['source'], entry['detections'], entry['size'],
+            width=width if width and width > 0 else None,
+            image_format=pil_format, quality=quality, layer=layer
+        )
+        response = Response(image_bytes, mimetype=mimetype)
+        response.headers['Cache-Control'] = f'private, max-age={config.ANNOTATION_STORE_TTL_SECONDS}'
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Erro ao renderizar imagem anotada: {str(e)}'}), 500
+
+@damage_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Estatísticas do cache de resultados (acertos, falhas, ocupação)"""
+    if yolo_service.result_cache is None:
+        return jsonify({'enabled': False})
+    
+    stats = yolo_service.result_cache.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@damage_bp.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    Baixa um profile gerado com X-Profile (exige o mesmo token)
+    
+    Parâmetros opcionais:
+    - format: prof (padrão, arquivo do cProfile para pstats/snakeviz),
+      text (listagem por tempo acumulado) ou json (resumo)
+    """
+    if not profiling.is_authorized(request.headers.get(profiling.PROFILE_HEADER) or request.args.get('token')):
+        return jsonify({'error': 'Token de profiling inválido'}), 403
+    
+    summary = profiling.load_summary(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Profile não encontrado'}), 404
+    
+    profile_format = request.args.get('format', 'prof')
+    if profile_format == 'json':
+        return jsonify(summary)
+    if profile_format == 'text':
+        return Response(profiling.stats_text(profile_id), mimetype='text/plain')
+    return send_file(profiling.profile_path(profile_id, 'prof'), mimetype='application/octet-stream',
+                     as_attachment=True, download_name=f'{profile_id}.prof')
+
+@damage_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas no formato texto do Prometheus (latência por etapa, filas, tamanhos)"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@damage_bp.route('/admission', methods=['GET'])
+def admission_status():
+    """Vagas em uso, fila de espera e limites do controle de admissão"""
+    if not config.ADMISSION_ENABLED:
+        return jsonify({'enabled': False})
+    
+    stats = admission.controller.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@damage_bp.route('/workers', methods=['GET'])
+def workers_status():
+    """Estado dos processos de inferência (vivo, reinícios, fila por worker)"""
+    if yolo_service.worker_pool is None:
+        return jsonify({'enabled': False})
+    
+    stats = yolo_service.worker_pool.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
 @damage_bp.route('/model-info', methods=['GET'])
 def model_info():
     """Retorna informações sobre o modelo carregado"""
@@ -244,7 +1079,28 @@ def model_info():
             'severity_levels': ['Leve', 'Moderado', 'Severo'],
             'model_version': 'YOLOv8',
             'input_formats': ['JPG', 'JPEG', 'PNG'],
-            'max_image_size': '4096x4096'
+            'max_image_size': '4096x4096',
+            'tiling': {
+                'mode': config.TILING_MODE,
+                'tile_size': config.TILE_SIZE,
+                'overlap': config.TILE_OVERLAP,
+                'max_megapixels': config.TILING_MAX_MEGAPIXELS
+            },
+            'image_url': dict(image_fetch.fetcher.stats(), max_concurrency=config.IMAGE_URL_MAX_CONCURRENCY),
+            'inference': {
+                'default_profile': config.INFERENCE_PROFILE,
+                'profiles': profiles(),
+                'allowed_imgsz': list(allowed_imgsz(yolo_service.backend)),
+                'auto': load_monitor.stats()
+            },
+            'quality': {
+                'mode': config.QUALITY_MODE,
+                'min_brightness': config.QUALITY_MIN_BRIGHTNESS,
+                'max_brightness': config.QUALITY_MAX_BRIGHTNESS,
+                'min_sharpness': config.QUALITY_MIN_SHARPNESS,
+                'duplicate_distance': config.QUALITY_DUPLICATE_DISTANCE,
+                'duplicate_max_diff': config.QUALITY_DUPLICATE_MAX_DIFF
+            }
         })
     except Exception as e:
         return jsonify({
@@ -0,0 +1,171 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from flask import Blueprint, jsonify, request
+from sqlalchemy import func
+
+from src import config
+from src.models.inspection import DamageDailyStats, Inspection, InspectionDamage, InspectionImage
+from src.models.user import db
+from src.routes.damage_detection import yolo_service
+from src.services import inspection_store, serialization
+
+inspections_bp = Blueprint('inspections', __name__)
+
+def init_inspection_store(app):
+    """Inicia a thread de gravação do histórico (se INSPECTION_HISTORY_ENABLED)"""
+    if not config.INSPECTION_HISTORY_ENABLED:
+        return None
+    return inspection_store.start(
+        app,
+        lambda damages, vehicle_info, summary=None: yolo_service.create_full_report(damages, vehicle_info, summary),
+        lambda: (yolo_service.model_version, yolo_service.model_sha256),
+        batch_size=config.INSPECTION_WRITER_BATCH_SIZE,
+        flush_interval=config.INSPECTION_WRITER_FLUSH_SECONDS,
+        max_queue=config.INSPECTION_WRITER_MAX_QUEUE
+    )
+
+def _limit():
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= config.INSPECTION_QUERY_MAX_LIMIT:
+        raise ValueError(f'limit deve estar entre 1 e {config.INSPECTION_QUERY_MAX_LIMIT}')
+    return limit
+
+def _date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} deve ser uma data AAAA-MM-DD')
+
+def _plate_arg():
+    """Placa normalizada de ?plate=; ValueError se ela não tem letras nem dígitos"""
+    plate = request.args.get('plate')
+    if not plate:
+        return None
+    normalized = inspection_store.normalize_plate(plate)
+    if normalized is None:
+        raise ValueError('plate deve ter letras ou dígitos')
+    return normalized
+
+@inspections_bp.route('/inspections', methods=['GET'])
+def list_inspections():
+    """
+    Histórico de inspeções, das mais recentes para as mais antigas
+
+    Parâmetros opcionais:
+    - plate: placa do veículo (sem distinção de maiúsculas, hífen ou espaços)
+    - before: cursor next_before da resposta anterior, para a próxima página
+      (um instante ISO 8601 sozinho também vale: só inspeções anteriores a ele)
+    - limit: itens por página (padrão 50)
+    """
+    try:
+        limit = _limit()
+        plate = _plate_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        before = request.args.get('before')
+        before = inspection_store.parse_cursor(before) if before else None
+    except ValueError:
+        return jsonify({'error': 'before deve ser o next_before de uma página ou uma data ISO 8601'}), 400
+
+    inspections = inspection_store.page(plate, before, limit)
+
+    return jsonify({
+        'plate': plate,
+        'count': len(inspections),
+        'inspections': [inspection.to_dict() for inspection in inspections],
+        'next_before': inspection_store.page_cursor(inspections[-1]) if len(inspections) == limit else None
+    })
+
+@inspections_bp.route('/inspections/stats', methods=['GET'])
+def inspection_stats():
+    """
+    Danos e custo estimado por classe e por dia
+
+    Parâmetros opcionais:
+    - from, to: intervalo de dias (AAAA-MM-DD, UTC; padrão os últimos 30 dias)
+    - damage_class: só uma classe de dano
+    - plate: só um veículo
+
+    Sem placa os totais vêm da tabela diária mantida pela gravação; com
+    placa, dos danos do veículo pelo índice (placa, dia, classe).
+    """
+    try:
+        end = _date_arg('to', datetime.now(timezone.utc).date())
+        start = _date_arg('from', end - timedelta(days=29))
+        plate = _plate_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start > end:
+        return jsonify({'error': 'from deve ser anterior a to'}), 400
+    if (end - start).days >= config.INSPECTION_STATS_MAX_DAYS:
+        return jsonify({'error': f'Intervalo máximo de {config.INSPECTION_STATS_MAX_DAYS} dias'}), 400
+
+    damage_class = request.args.get('damage_class')
+    if plate:
+        source = 'damage_index'
+        query = db.session.query(
+            InspectionDamage.day, InspectionDamage.damage_class,
+            func.count(InspectionDamage.id), func.sum(InspectionDamage.estimated_cost)
+        ).filter(InspectionDamage.plate == plate, InspectionDamage.day.between(start, end))
+        if damage_class:
+            query = query.filter(InspectionDamage.damage_class == damage_class)
+        query = query.group_by(InspectionDamage.day, InspectionDamage.damage_class)
+    else:
+        source = 'daily_rollup'
+        query = db.session.query(
+            DamageDailyStats.day, DamageDailyStats.damage_class,
+            DamageDailyStats.damages, DamageDailyStats.total_cost
+        ).filter(DamageDailyStats.day.between(start, end))
+        if damage_class:
+            query = query.filter(DamageDailyStats.damage_class == damage_class)
+
+    by_day = []
+    by_class = {}
+    for day, row_class, damages, cost in query.order_by('day', 'damage_class').all():
+        cost = round(cost or 0, 2)
+        by_day.append({'day': day.isoformat(), 'damage_class': row_class, 'damages': damages, 'total_cost': cost})
+        totals = by_class.setdefault(row_class, {'damage_class': row_class, 'damages': 0, 'total_cost': 0})
+        totals['damages'] += damages
+        totals['total_cost'] = round(totals['total_cost'] + cost, 2)
+
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'plate': plate,
+        'damage_class': damage_class,
+        'source': source,
+        'totals': {
+            'damages': sum(totals['damages'] for totals in by_class.values()),
+            'total_cost': round(sum(totals['total_cost'] for totals in by_class.values()), 2)
+        },
+        'by_class': sorted(by_class.values(), key=lambda totals: totals['damage_class']),
+        'by_day': by_day
+    })
+
+@inspections_bp.route('/inspections/<inspection_id>', methods=['GET'])
+def get_inspection(inspection_id):
+    """Inspeção gravada, com o relatório completo e as detecções em forma colunar"""
+    inspection = db.session.get(Inspection, inspection_id)
+    if inspection is None:
+        return jsonify({'error': 'Inspeção não encontrada'}), 404
+    data = inspection.to_dict(include_report=True)
+
+    # Lotes são gravados imagem a imagem: danos e detecções vêm das linhas de cada imagem
+    images = InspectionImage.query.filter_by(inspection_id=inspection_id).order_by(InspectionImage.image_index).all()
+    if images:
+        damages, detections = [], []
+        for image in images:
+            damages.extend(json.loads(image.damages))
+            detections.extend(json.loads(image.detections))
+        if data['full_report'] is not None:
+            data['full_report']['damages'] = damages
+        data['detections'] = serialization.columnar(detections)
+    return jsonify(data)
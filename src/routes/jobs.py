@@ -0,0 +1,147 @@
+from flask import Blueprint, jsonify, request, url_for
+import base64
+import io
+import json
+from urllib.parse import urlsplit
+from src import config
+from src.models.job import Job
+from src.models.user import db
+from src.routes.damage_detection import (
+    ANNOTATE_MODES, _analyze_batch, _analyze_single, _inference_fields, _inference_params, _quality_error,
+    _tiling_error, _vehicle_info_from_json, yolo_service
+)
+from src.services import image_fetch, image_quality, inference_params
+from src.services.job_queue import JobQueue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Fila de jobs, iniciada por init_job_queue depois que o banco existe
+job_queue = None
+
+def _run_detect_job(data):
+    annotate = data.get('annotate') or 'inline'
+    # Com profile=auto, o perfil é escolhido pela carga na hora da execução
+    inference = _inference_params(data)
+    if 'image_url' in data:
+        source, source_bytes = image_fetch.fetcher.fetch(data['image_url'], keep_bytes=annotate == 'deferred')
+    else:
+        source_bytes = base64.b64decode(data['image_base64'])
+        source = io.BytesIO(source_bytes)
+    image = yolo_service.prepare_image(source, data.get('tiling'), inference)
+    # Uma imagem recusada pela triagem encerra o job como failed, com o motivo
+    image_quality.triage(image, data.get('quality') or config.QUALITY_MODE)
+    vehicle_info = _vehicle_info_from_json(data.get('vehicle_info', {}))
+    
+    response, annotated_jpeg = _analyze_single(image, vehicle_info, annotate, source_bytes, inference)
+    if annotated_jpeg is not None:
+        response['annotated_image_base64'] = base64.b64encode(annotated_jpeg).decode('utf-8')
+    return response
+
+def _run_batch_job(data):
+    annotate = data.get('annotate') or 'inline'
+    response, _ = _analyze_batch(
+        data['images'], data.get('vehicle_info', {}), annotate, data.get('tiling'),
+        inference=_inference_params(data), quality=data.get('quality')
+    )
+    return response
+
+JOB_HANDLERS = {
+    'detect': _run_detect_job,
+    'batch': _run_batch_job
+}
+
+def init_job_queue(app):
+    """Inicia os workers e retoma jobs pendentes de execuções anteriores"""
+    global job_queue
+    job_queue = JobQueue(app, JOB_HANDLERS, workers=config.JOB_WORKERS, lease_seconds=config.JOB_LEASE_SECONDS)
+    resumed = job_queue.resume_pending()
+    if resumed:
+        app.logger.info('%d job(s) pendente(s) reenfileirado(s)', resumed)
+    return job_queue
+
+def _webhook_error(webhook_url):
+    """Mensagem de erro se webhook_url não pode ser chamada (host fora de JOB_WEBHOOK_ALLOWED_HOSTS)"""
+    allowed_hosts = image_fetch.parse_allowed_hosts(config.JOB_WEBHOOK_ALLOWED_HOSTS)
+    if not allowed_hosts:
+        return 'Webhooks estão desativados (configure JOB_WEBHOOK_ALLOWED_HOSTS)'
+    if not isinstance(webhook_url, str):
+        return 'webhook_url deve ser uma URL http(s)'
+    parts = urlsplit(webhook_url)
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in ('http', 'https') or not host:
+        return 'webhook_url deve ser uma URL http(s)'
+    if not image_fetch.host_allowed(host, allowed_hosts):
+        return f'Host não permitido para webhook_url: {host}'
+    return None
+
+@jobs_bp.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Enfileira uma análise e retorna imediatamente o ID do job
+    
+    Aceita o mesmo JSON de /detect (image_base64 ou image_url) ou de /analyze-batch (images),
+    mais os campos opcionais:
+    - type: 'detect' ou 'batch' (inferido pelo corpo se omitido)
+    - webhook_url: URL chamada via POST quando o job terminar (só hosts de
+      JOB_WEBHOOK_ALLOWED_HOSTS)
+    """
+    if job_queue is None:
+        return jsonify({'error': 'Fila de jobs indisponível'}), 503
+    
+    if not request.is_json:
+        return jsonify({'error': 'Requisição deve ser JSON'}), 400
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Corpo da requisição deve ser um objeto JSON'}), 400
+    kind = data.get('type') or ('batch' if 'images' in data else 'detect')
+    
+    if kind == 'detect':
+        if 'image_base64' not in data and 'image_url' not in data:
+            return jsonify({'error': 'Campo image_base64 ou image_url é obrigatório'}), 400
+        if 'image_url' in data:
+            try:
+                image_fetch.fetcher.check_url(data['image_url'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+    elif kind == 'batch':
+        if not isinstance(data.get('images'), list) or len(data['images']) == 0:
+            return jsonify({'error': 'Campo images deve ser uma lista não vazia'}), 400
+        max_images = config.get_max_batch_images()
+        if len(data['images']) > max_images:
+            return jsonify({'error': f'Máximo de {max_images} imagens por requisição'}), 400
+    else:
+        return jsonify({'error': "type deve ser 'detect' ou 'batch'"}), 400
+    
+    if (data.get('annotate') or 'inline') not in ANNOTATE_MODES:
+        return jsonify({'error': f'annotate deve ser um de: {", ".join(ANNOTATE_MODES)}'}), 400
+    if _tiling_error(data.get('tiling')):
+        return jsonify({'error': _tiling_error(data.get('tiling'))}), 400
+    if _quality_error(data.get('quality')):
+        return jsonify({'error': _quality_error(data.get('quality'))}), 400
+    fields = _inference_fields(data)
+    try:
+        inference_params.validate(fields.pop('profile', None), fields, yolo_service.backend)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    webhook_url = data.pop('webhook_url', None)
+    if webhook_url and _webhook_error(webhook_url):
+        return jsonify({'error': _webhook_error(webhook_url)}), 400
+    
+    job = Job(kind=kind, payload=json.dumps(data), webhook_url=webhook_url)
+    db.session.add(job)
+    db.session.commit()
+    job_queue.submit(job.id)
+    
+    response = job.to_dict(include_result=False)
+    response['status_url'] = url_for('jobs.get_job', job_id=job.id)
+    return jsonify(response), 202
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status do job e, quando concluído, o resultado da análise"""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job.to_dict())
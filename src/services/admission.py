@@ -0,0 +1,304 @@
+"""
+Controle de admissão na frente do YOLODamageService.
+
+No máximo max_concurrent análises rodam ao mesmo tempo e até max_queue
+esperam a vez; além disso a requisição é recusada na hora com 503 e
+Retry-After, antes de o corpo ser lido. Por chave de API (X-API-Key, se ela
+está em ADMISSION_API_KEYS, ou o IP do cliente) há limite de análises
+simultâneas e de taxa (token bucket), com 429. O IP é o da conexão; atrás de
+proxies, o ProxyFix configurado por TRUSTED_PROXY_HOPS o corrige. O cliente pode mandar um prazo (X-Deadline-Ms, em ms a partir da
+chegada): trabalho cujo prazo venceu na fila é descartado antes da
+inferência, com 504.
+"""
+import functools
+import math
+import threading
+import time
+
+from flask import g, has_request_context, jsonify, make_response, request
+
+from src import config
+from src.services import metrics
+
+API_KEY_HEADER = 'X-API-Key'
+DEADLINE_HEADER = 'X-Deadline-Ms'
+MAX_TRACKED_KEYS = 4096
+
+ADMISSION_WAIT_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    'damage_admission_wait_seconds', 'Espera na fila de admissão antes da análise'
+))
+ADMISSION_REJECTED = metrics.REGISTRY.register(metrics.Counter(
+    'damage_admission_rejected_total', 'Requisições recusadas pela admissão, por motivo', ('reason',)
+))
+ADMISSION_ACTIVE = metrics.REGISTRY.register(metrics.Gauge(
+    'damage_admission_active', 'Análises em andamento'
+))
+ADMISSION_WAITING = metrics.REGISTRY.register(metrics.Gauge(
+    'damage_admission_waiting', 'Análises esperando na fila de admissão'
+))
+
+
+class AdmissionRejected(Exception):
+    """Requisição recusada; status e retry_after (s) vão para a resposta"""
+
+    def __init__(self, message, status, reason, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(AdmissionRejected):
+    def __init__(self, message="Prazo da requisição expirou antes da inferência"):
+        super().__init__(message, 504, 'deadline')
+
+
+class Ticket:
+    """Vaga de uma análise admitida; release() libera para a próxima"""
+
+    def __init__(self, controller, key, queue_wait, deadline):
+        self.controller = controller
+        self.key = key
+        self.queue_wait = queue_wait
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """Vagas de análise, fila de espera e limites por chave de API"""
+
+    def __init__(self, max_concurrent=4, max_queue=16, max_wait=30.0,
+                 key_concurrency=0, key_rate=0.0, key_burst=0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.key_concurrency = key_concurrency
+        self.key_rate = key_rate
+        self.key_burst = max(1, key_burst or math.ceil(key_rate))
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+        self._per_key = {}
+        self._buckets = {}
+        # Média móvel da duração de uma análise, para estimar o Retry-After
+        self._service_time = 1.0
+
+    def _retry_after(self):
+        return max(1, math.ceil(self._service_time * (self.waiting + 1) / self.max_concurrent))
+
+    def _take_token(self, key, now):
+        """Token bucket por chave; recusa com o tempo até o próximo token"""
+        if self.key_rate <= 0:
+            return
+        tokens, last = self._buckets.get(key, (self.key_burst, now))
+        tokens = min(self.key_burst, tokens + (now - last) * self.key_rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            raise AdmissionRejected(
+                "Limite de requisições por segundo da chave excedido", 429, 'rate_limit',
+                retry_after=max(1, math.ceil((1 - tokens) / self.key_rate))
+            )
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > MAX_TRACKED_KEYS:
+            # Chaves paradas há tempo suficiente para encher o balde não mudam nada
+            idle = self.key_burst / self.key_rate
+            self._buckets = {
+                bucket_key: bucket for bucket_key, bucket in self._buckets.items() if now - bucket[1] < idle
+            }
+
+    def admit(self, key, deadline=None):
+        """
+        Espera uma vaga e devolve o Ticket; AdmissionRejected se a fila, o
+        limite da chave ou o prazo não permitem.
+        """
+        started = time.monotonic()
+        with self._condition:
+            if self.key_concurrency and self._per_key.get(key, 0) >= self.key_concurrency:
+                raise AdmissionRejected(
+                    "Limite de análises simultâneas da chave atingido", 429, 'key_concurrency',
+                    retry_after=self._retry_after()
+                )
+            if self.active >= self.max_concurrent and self.waiting >= self.max_queue:
+                raise AdmissionRejected(
+                    "Servidor ocupado, tente novamente", 503, 'queue_full', retry_after=self._retry_after()
+                )
+            self._take_token(key, started)
+
+            self._per_key[key] = self._per_key.get(key, 0) + 1
+            self.waiting += 1
+            try:
+                wait_until = started + self.max_wait if self.max_wait > 0 else None
+                if deadline is not None:
+                    wait_until = deadline if wait_until is None else min(wait_until, deadline)
+                while self.active >= self.max_concurrent:
+                    timeout = None if wait_until is None else wait_until - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        if deadline is not None and wait_until == deadline:
+                            raise DeadlineExceeded()
+                        raise AdmissionRejected(
+                            "Tempo de espera na fila esgotado", 503, 'queue_timeout',
+                            retry_after=self._retry_after()
+                        )
+                    self._condition.wait(timeout)
+            except AdmissionRejected:
+                self._forget_key(key)
+                # Um aviso de vaga livre recebido por quem desistiu passa adiante
+                if self.active < self.max_concurrent:
+                    self._condition.notify()
+                raise
+            finally:
+                self.waiting -= 1
+            self.active += 1
+
+        queue_wait = time.monotonic() - started
+        ADMISSION_WAIT_SECONDS.observe(queue_wait)
+        return Ticket(self, key, queue_wait, deadline)
+
+    def _forget_key(self, key):
+        self._per_key[key] -= 1
+        if not self._per_key[key]:
+            del self._per_key[key]
+
+    def _release(self, ticket):
+        with self._condition:
+            self.active -= 1
+            self._forget_key(ticket.key)
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - ticket.started)
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'keys_in_flight': len(self._per_key),
+                'estimated_service_seconds': round(self._service_time, 3)
+            }
+
+
+controller = AdmissionController(
+    max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    max_wait=config.ADMISSION_MAX_WAIT_SECONDS,
+    key_concurrency=config.ADMISSION_KEY_CONCURRENCY,
+    key_rate=config.ADMISSION_KEY_RATE,
+    key_burst=config.ADMISSION_KEY_BURST
+)
+ADMISSION_ACTIVE.set_function(lambda: controller.active)
+ADMISSION_WAITING.set_function(lambda: controller.waiting)
+
+
+def parse_api_keys(value):
+    return frozenset(key.strip() for key in (value or '').split(',') if key.strip())
+
+
+API_KEYS = parse_api_keys(config.ADMISSION_API_KEYS)
+
+
+def client_key():
+    """
+    Chave de API do cliente, se ela é uma das configuradas, ou o IP. Chaves
+    desconhecidas não valem: senão bastaria inventar uma a cada requisição
+    para escapar do limite.
+    """
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key and api_key in API_KEYS:
+        return f'key:{api_key}'
+    return f'ip:{request.remote_addr or "anônimo"}'
+
+
+def requested_deadline():
+    """Prazo (time.monotonic) a partir de X-Deadline-Ms; ValueError se inválido"""
+    value = request.headers.get(DEADLINE_HEADER)
+    if value is None:
+        return None
+    try:
+        budget_ms = float(value)
+    except ValueError:
+        budget_ms = 0
+    if not budget_ms > 0:
+        raise ValueError(f"{DEADLINE_HEADER} deve ser um número positivo de milissegundos")
+    return time.monotonic() + budget_ms / 1000
+
+
+def current_deadline():
+    """
+    Prazo da requisição em andamento (None fora de uma requisição ou sem
+    prazo). Vale também com o controle de admissão desligado: o cabeçalho é
+    lido uma vez por requisição, e um valor inválido fora das rotas
+    admitidas é ignorado.
+    """
+    if not has_request_context():
+        return None
+    if 'deadline' not in g:
+        try:
+            g.deadline = requested_deadline()
+        except ValueError:
+            g.deadline = None
+    return g.deadline
+
+
+def check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded()
+
+
+def queue_wait_ms():
+    """Espera na fila de admissão da requisição atual, para o processing_info"""
+    if not has_request_context() or g.get('admission') is None:
+        return None
+    return round(g.admission.queue_wait * 1000, 3)
+
+
+def rejection_response(error):
+    ADMISSION_REJECTED.inc(1, error.reason)
+    payload = {'success': False, 'error': str(error)}
+    if error.retry_after is not None:
+        payload['retry_after'] = error.retry_after
+    response = make_response(jsonify(payload), error.status)
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def admitted(view):
+    """
+    Passa a view pelo controle de admissão. Em respostas em stream, a vaga
+    só é liberada quando o stream termina. Com ADMISSION_ENABLED=0 só o
+    X-Deadline-Ms é validado e guardado para a inferência.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            deadline = requested_deadline()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        g.deadline = deadline
+        if not config.ADMISSION_ENABLED:
+            return view(*args, **kwargs)
+        try:
+            ticket = controller.admit(client_key(), deadline)
+        except AdmissionRejected as e:
+            return rejection_response(e)
+
+        g.admission = ticket
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            ticket.release()
+            raise
+        if response.is_streamed:
+            response.call_on_close(ticket.release)
+        else:
+            ticket.release()
+        return response
+
+    return wrapper
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class AnnotationStore:
+    """
+    Guarda, por pouco tempo, o necessário para renderizar uma imagem anotada
+    sob demanda: as detecções e os bytes comprimidos enviados pelo cliente
+    (nunca a imagem decodificada nem a anotada).
+
+    Com disk_path, as entradas também vão para um SQLite compartilhado pelos
+    workers do gunicorn da máquina, então /annotated/<id> funciona em
+    qualquer worker, e não só no que fez a análise. A conexão é aberta no
+    primeiro uso de cada processo, nunca herdada pelo fork.
+
+    Na memória valem dois limites: max_entries entradas e max_bytes somando
+    os bytes enviados (cada upload pode ter dezenas de MB). As mais antigas
+    saem primeiro; sem disco, a mais recente fica mesmo acima de max_bytes.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=600, disk_path=None, max_bytes=128 * 1024 * 1024):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = None
+        self._disk_pid = None
+        self._writes = 0
+
+    def _connection(self):
+        if self._disk is None or self._disk_pid != os.getpid():
+            directory = os.path.dirname(self.disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=5)
+            self._disk_pid = os.getpid()
+            self._disk.execute('PRAGMA journal_mode=WAL')
+            self._disk.execute(
+                'CREATE TABLE IF NOT EXISTS annotation ('
+                'id TEXT PRIMARY KEY, detections TEXT NOT NULL, source BLOB, '
+                'width INTEGER NOT NULL, height INTEGER NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._disk.execute('CREATE INDEX IF NOT EXISTS ix_annotation_created_at ON annotation (created_at)')
+            self._disk.commit()
+        return self._disk
+
+    def _expired(self, created_at, now):
+        return now - created_at > self.ttl_seconds
+
+    @staticmethod
+    def _entry_bytes(entry):
+        return len(entry['source'] or b'')
+
+    def _remember(self, annotation_id, entry):
+        size = self._entry_bytes(entry)
+        if self.disk_path and size > self.max_bytes:
+            # Maior que o orçamento inteiro: fica só no disco
+            return
+        self._entries[annotation_id] = entry
+        self._bytes += size
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._entry_bytes(evicted)
+
+    def memory_bytes(self):
+        """Bytes enviados guardados na memória deste processo"""
+        with self._lock:
+            return self._bytes
+
+    def put(self, detections, source_bytes, size):
+        annotation_id = uuid.uuid4().hex
+        entry = {
+            'detections': detections,
+            'source': source_bytes,
+            'size': size,
+            'created_at': time.time(),
+        }
+        with self._lock:
+            self._remember(annotation_id, entry)
+            if self.disk_path:
+                disk = self._connection()
+                disk.execute(
+                    'INSERT INTO annotation (id, detections, source, width, height, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (annotation_id, json.dumps(detections), source_bytes, size[0], size[1], entry['created_at'])
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    disk.execute(
+                        'DELETE FROM annotation WHERE created_at < ?', (entry['created_at'] - self.ttl_seconds,)
+                    )
+                disk.commit()
+        return annotation_id
+
+    def get(self, annotation_id):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(annotation_id)
+            if entry is not None:
+                if not self._expired(entry['created_at'], now):
+                    return entry
+                del self._entries[annotation_id]
+                self._bytes -= self._entry_bytes(entry)
+                return None
+
+            if not self.disk_path:
+                return None
+            # Análise feita por outro worker
+            row = self._connection().execute(
+                'SELECT detections, source, width, height, created_at FROM annotation WHERE id = ?',
+                (annotation_id,)
+            ).fetchone()
+            if row is None or self._expired(row[4], now):
+                return None
+            entry = {
+                'detections': json.loads(row[0]),
+                'source': row[1],
+                'size': (row[2], row[3]),
+                'created_at': row[4],
+            }
+            self._remember(annotation_id, entry)
+            return entry
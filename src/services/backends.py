@@ -0,0 +1,215 @@
+"""
+Backends de inferência para o modelo car_damage_best.pt.
+
+O backend é escolhido por INFERENCE_BACKEND (torch, torchscript, onnxruntime
+ou openvino). Para os backends exportados, o .pt é convertido uma única vez
+e o artefato fica em cache ao lado dele; todos são carregados pela própria
+ultralytics, então o contrato de detecção/pós-processamento é o mesmo.
+
+Verificação de paridade entre backends:
+
+    python -m src.services.backends --backend onnxruntime pasta/de/imagens
+"""
+import os
+import shutil
+import sys
+
+from src import config
+
+BACKEND_FORMATS = {
+    'torch': None,
+    'torchscript': 'torchscript',
+    'onnxruntime': 'onnx',
+    'openvino': 'openvino',
+}
+
+_ARTIFACT_SUFFIXES = {
+    'torchscript': '.torchscript',
+    'onnx': '.onnx',
+    'openvino': '_openvino_model',
+}
+
+# Precisões suportadas por backend (fp16/int8 apenas onde há ganho real em CPU)
+SUPPORTED_PRECISIONS = {
+    'torch': ('fp32',),
+    'torchscript': ('fp32',),
+    'onnxruntime': ('fp32', 'int8'),
+    'openvino': ('fp32', 'fp16', 'int8'),
+}
+
+
+def exported_artifact_path(model_path, backend, precision='fp32'):
+    """Caminho do artefato exportado em cache para o backend e a precisão"""
+    export_format = BACKEND_FORMATS[backend]
+    if export_format is None:
+        return model_path
+    tag = '' if precision == 'fp32' else f'_{precision}'
+    return os.path.splitext(model_path)[0] + tag + _ARTIFACT_SUFFIXES[export_format]
+
+
+def _is_stale(artifact_path, model_path):
+    if not os.path.exists(artifact_path):
+        return True
+    return os.path.getmtime(artifact_path) < os.path.getmtime(model_path)
+
+
+def resolve_model_artifact(model_path, backend, precision='fp32', imgsz=None, calibration_dir=None):
+    """Exporta o .pt para o formato do backend (se necessário) e devolve o caminho"""
+    if backend not in BACKEND_FORMATS:
+        raise ValueError(f"Backend de inferência desconhecido: {backend}")
+    if precision not in SUPPORTED_PRECISIONS[backend]:
+        raise ValueError(f"Precisão {precision} não suportada pelo backend {backend}")
+
+    artifact_path = exported_artifact_path(model_path, backend, precision)
+    if artifact_path == model_path or not _is_stale(artifact_path, model_path):
+        return artifact_path
+
+    imgsz = imgsz or config.INFERENCE_IMGSZ
+
+    if backend == 'onnxruntime' and precision == 'int8':
+        # Quantização feita pelo onnxruntime a partir do ONNX FP32
+        from src.services.quantization import quantize_onnx
+        fp32_path = resolve_model_artifact(model_path, backend, 'fp32', imgsz)
+        print("Quantizando modelo ONNX para INT8...")
+        quantize_onnx(fp32_path, artifact_path, calibration_dir, imgsz)
+        print(f"Modelo quantizado: {artifact_path}")
+        return artifact_path
+
+    from ultralytics import YOLO
+
+    export_format = BACKEND_FORMATS[backend]
+    print(f"Exportando modelo para {export_format} ({precision})...")
+    model = YOLO(model_path)
+    export_kwargs = {'format': export_format, 'imgsz': imgsz}
+    if export_format in ('onnx', 'openvino'):
+        # Eixo de lote dinâmico, necessário para a inferência em lotes
+        export_kwargs['dynamic'] = True
+    if precision == 'fp16':
+        export_kwargs['half'] = True
+    elif precision == 'int8':
+        from src.services.quantization import calibration_dataset_yaml
+        export_kwargs['int8'] = True
+        export_kwargs['data'] = calibration_dataset_yaml(calibration_dir, model.names)
+    exported_path = str(model.export(**export_kwargs))
+
+    if os.path.abspath(exported_path) != os.path.abspath(artifact_path):
+        if os.path.isdir(artifact_path):
+            shutil.rmtree(artifact_path)
+        os.replace(exported_path, artifact_path)
+    print(f"Modelo exportado: {artifact_path}")
+    return artifact_path
+
+
+def load_backend(model_path, backend, precision='fp32', calibration_dir=None):
+    """Carrega o modelo no backend escolhido com a mesma interface do YOLO"""
+    from ultralytics import YOLO
+
+    artifact_path = resolve_model_artifact(
+        model_path, backend, precision, calibration_dir=calibration_dir
+    )
+    return YOLO(artifact_path, task='detect')
+
+
+def _iou(box_a, box_b):
+    x1 = max(box_a[0], box_b[0])
+    y1 = max(box_a[1], box_b[1])
+    x2 = min(box_a[2], box_b[2])
+    y2 = min(box_a[3], box_b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Casa detecções da mesma classe por IoU (guloso, maior confiança primeiro).
+
+    Retorna (pares, não casadas da referência, não casadas do candidato),
+    onde cada par é (detecção_ref, detecção_cand, iou).
+    """
+    remaining = sorted(candidate, key=lambda d: d['confidence'], reverse=True)
+    pairs = []
+    unmatched_reference = []
+    for ref in sorted(reference, key=lambda d: d['confidence'], reverse=True):
+        best, best_iou = None, iou_threshold
+        for cand in remaining:
+            if cand['class'] != ref['class']:
+                continue
+            iou = _iou(ref['bbox'], cand['bbox'])
+            if iou >= best_iou:
+                best, best_iou = cand, iou
+        if best is None:
+            unmatched_reference.append(ref)
+        else:
+            remaining.remove(best)
+            pairs.append((ref, best, best_iou))
+    return pairs, unmatched_reference, remaining
+
+
+def compare_detections(reference, candidate, iou_threshold=0.9, conf_tolerance=0.05):
+    """Verifica se duas listas de detecções coincidem dentro da tolerância"""
+    pairs, missing, extra = match_detections(reference, candidate, iou_threshold)
+    conf_deltas = [abs(ref['confidence'] - cand['confidence']) for ref, cand, _ in pairs]
+    return {
+        'matched': len(pairs),
+        'missing': len(missing),
+        'extra': len(extra),
+        'min_iou': round(min((iou for _, _, iou in pairs), default=1.0), 4),
+        'max_conf_delta': round(max(conf_deltas, default=0.0), 4),
+        'ok': not missing and not extra and all(delta <= conf_tolerance for delta in conf_deltas)
+    }
+
+
+def check_parity(image_paths, backend, iou_threshold=0.9, conf_tolerance=0.05):
+    """Compara as detecções do backend com as do PyTorch para cada imagem"""
+    from src.services.yolo_service import YOLODamageService
+
+    reference = YOLODamageService(backend='torch', precision='fp32')
+    candidate = YOLODamageService(backend=backend, precision='fp32')
+    if reference.model is None or candidate.model is None:
+        raise Exception("Modelo não carregado")
+
+    report = []
+    for path in image_paths:
+        img_array = reference.prepare_image(path).array
+        comparison = compare_detections(
+            reference.class_table.to_dicts(reference._predict([img_array])[0]),
+            candidate.class_table.to_dicts(candidate._predict([img_array])[0]),
+            iou_threshold=iou_threshold,
+            conf_tolerance=conf_tolerance
+        )
+        comparison['image'] = path
+        report.append(comparison)
+    return report
+
+
+def _image_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Paridade de detecções entre backends')
+    parser.add_argument('--backend', required=True, choices=[b for b in BACKEND_FORMATS if b != 'torch'])
+    parser.add_argument('--iou', type=float, default=0.9)
+    parser.add_argument('--conf-tolerance', type=float, default=0.05)
+    parser.add_argument('images', nargs='+')
+    args = parser.parse_args(argv)
+
+    report = check_parity(list(_image_paths(args.images)), args.backend, args.iou, args.conf_tolerance)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if all(item['ok'] for item in report) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
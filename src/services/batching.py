@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.services.admission import DeadlineExceeded
+
+
+class InferenceScheduler:
+    """
+    Agrupa requisições concorrentes em micro-lotes executados por uma única
+    thread de inferência.
+
+    Cada chamada a submit() devolve um Future; a thread de inferência espera
+    até window_ms pelo próximo item (ou até completar max_batch_size) e então
+    executa predict_fn uma única vez para o lote inteiro. Itens cujo prazo
+    (deadline, em time.monotonic) venceu na fila são descartados antes da
+    inferência, e itens com parâmetros de inferência diferentes (params) vão
+    ao modelo em chamadas separadas.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=4, window_ms=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms / 1000.0)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, img_array, deadline=None, params=None):
+        future = Future()
+        self._queue.put((img_array, future, deadline, params))
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Reinsere o sinal de parada para depois deste lote
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            now = time.monotonic()
+            groups = {}
+            for img_array, future, deadline, params in self._collect_batch(item):
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if deadline is not None and now >= deadline:
+                    future.set_exception(DeadlineExceeded())
+                    continue
+                key = params.key() if params is not None else None
+                groups.setdefault(key, (params, []))[1].append((img_array, future))
+
+            for params, batch in groups.values():
+                self._predict_batch(batch, params)
+
+    def _predict_batch(self, batch, params):
+        try:
+            detections = self.predict_fn([img_array for img_array, _ in batch], params)
+            for (_, future), result in zip(batch, detections):
+                future.set_result(result)
+        except Exception:
+            # Refaz imagem a imagem para isolar a que causou a falha
+            for img_array, future in batch:
+                try:
+                    future.set_result(self.predict_fn([img_array], params)[0])
+                except Exception as e:
+                    future.set_exception(e)
@@ -0,0 +1,150 @@
+"""
+Download de imagens referenciadas por URL (image_url).
+
+Os downloads usam uma única requests.Session com pool de conexões por host
+(keep-alive reaproveitado entre requisições e imagens): no máximo
+max_per_host conexões simultâneas com o mesmo host, e quem passa disso
+espera uma conexão livre. O corpo é copiado em blocos para o mesmo arquivo
+temporário usado nos uploads binários, com limite de tamanho e de tempo, e
+a imagem sai aberta para o decodificador sem passar inteira pela memória.
+
+Só hosts da lista permitida são aceitos (o servidor não vira proxy para a
+rede interna), e redirecionamentos não são seguidos.
+"""
+import io
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import config
+from src.services import metrics
+from src.services.image_io import ImageTooLarge, open_stream, read_stream
+
+URL_SCHEMES = ('http', 'https')
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def is_url(value):
+    """Entrada de lote que é uma URL (base64 nunca tem ':')"""
+    return isinstance(value, str) and value.startswith(('http://', 'https://'))
+
+
+def parse_allowed_hosts(value):
+    return tuple(host.strip().lower() for host in (value or '').split(',') if host.strip())
+
+
+def host_allowed(host, allowed_hosts):
+    """Se host está na lista (".exemplo.com" inclui os subdomínios, "*" libera todos)"""
+    for allowed in allowed_hosts:
+        if allowed == '*' or host == allowed or (allowed.startswith('.') and host.endswith(allowed)):
+            return True
+    return False
+
+
+class _TimedReader:
+    """Stream da resposta que desiste quando o tempo total do download acaba"""
+
+    def __init__(self, raw, deadline, url):
+        self.raw = raw
+        self.deadline = deadline
+        self.url = url
+
+    def read(self, size=-1):
+        if time.monotonic() > self.deadline:
+            raise ImageFetchError(f"Tempo esgotado ao baixar {self.url}")
+        return self.raw.read(size)
+
+
+class ImageFetcher:
+    """Downloads de imagens com pool de conexões compartilhado"""
+
+    def __init__(self, allowed_hosts=(), max_per_host=4, pool_hosts=16, connect_timeout=5.0,
+                 read_timeout=15.0, total_timeout=30.0, max_bytes=None):
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.max_per_host = max(1, max_per_host)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.session = requests.Session()
+        # pool_block: acima de max_per_host conexões, espera uma ser devolvida
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=self.max_per_host, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def enabled(self):
+        return bool(self.allowed_hosts)
+
+    def check_url(self, url):
+        """ValueError se a URL não pode ser baixada"""
+        if not self.enabled:
+            raise ValueError("Imagens por URL estão desativadas (configure IMAGE_URL_ALLOWED_HOSTS)")
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        if parts.scheme not in URL_SCHEMES or not host:
+            raise ValueError(f"URL de imagem inválida: {url}")
+        if not host_allowed(host, self.allowed_hosts):
+            raise ValueError(f"Host não permitido para image_url: {host}")
+
+    def fetch(self, url, keep_bytes=False):
+        """
+        Baixa a imagem e devolve (origem para prepare_image, bytes ou None).
+
+        Com keep_bytes os bytes ficam em memória (anotação adiada); senão a
+        imagem é aberta direto do arquivo temporário.
+        """
+        self.check_url(url)
+        deadline = time.monotonic() + self.total_timeout
+        with metrics.stage('fetch'):
+            try:
+                response = self.session.get(
+                    url, stream=True, allow_redirects=False,
+                    timeout=(self.connect_timeout, self.read_timeout)
+                )
+            except requests.RequestException as e:
+                raise ImageFetchError(f"Falha ao baixar {url}: {e}")
+
+            with response:
+                if response.status_code != 200:
+                    raise ImageFetchError(f"{url} respondeu HTTP {response.status_code}")
+                max_bytes = self.max_bytes or config.MAX_UPLOAD_BYTES
+                length = response.headers.get('Content-Length', '')
+                if length.isdigit() and int(length) > max_bytes:
+                    raise ImageTooLarge(f"Imagem excede o limite de {max_bytes // (1024 * 1024)} MB")
+
+                response.raw.decode_content = True
+                stream = _TimedReader(response.raw, deadline, url)
+                try:
+                    if keep_bytes:
+                        image_bytes = read_stream(stream, max_bytes)
+                        return io.BytesIO(image_bytes), image_bytes
+                    return open_stream(stream, max_bytes), None
+                except (ImageTooLarge, ImageFetchError):
+                    raise
+                except Exception as e:
+                    raise ImageFetchError(f"Falha ao baixar {url}: {e}")
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'allowed_hosts': list(self.allowed_hosts),
+            'max_per_host': self.max_per_host,
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'total_timeout': self.total_timeout
+        }
+
+
+fetcher = ImageFetcher(
+    allowed_hosts=parse_allowed_hosts(config.IMAGE_URL_ALLOWED_HOSTS),
+    max_per_host=config.IMAGE_URL_MAX_PER_HOST,
+    connect_timeout=config.IMAGE_URL_CONNECT_TIMEOUT,
+    read_timeout=config.IMAGE_URL_READ_TIMEOUT,
+    total_timeout=config.IMAGE_URL_TOTAL_TIMEOUT
+)
@@ -0,0 +1,135 @@
+import io
+import tempfile
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from src import config
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 2 * 1024 * 1024
+
+EXIF_ORIENTATION = 0x0112
+# Orientações EXIF que giram a imagem em 90° (largura e altura trocam)
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def read_stream(stream, max_bytes=None):
+    """Lê o stream inteiro respeitando o limite de tamanho"""
+    max_bytes = max_bytes or config.MAX_UPLOAD_BYTES
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.write(chunk)
+        if buffer.tell() > max_bytes:
+            raise ImageTooLarge(f"Imagem excede o limite de {max_bytes // (1024 * 1024)} MB")
+    return buffer.getvalue()
+
+
+def open_stream(stream, max_bytes=None):
+    """
+    Copia o stream em blocos para um arquivo temporário (em memória até
+    SPOOL_MAX_MEMORY) e abre a imagem sem decodificá-la, para que
+    prepare_image possa decodificar já na resolução reduzida.
+    """
+    max_bytes = max_bytes or config.MAX_UPLOAD_BYTES
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    total = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            spool.close()
+            raise ImageTooLarge(f"Imagem excede o limite de {max_bytes // (1024 * 1024)} MB")
+        spool.write(chunk)
+    spool.seek(0)
+    return Image.open(spool)
+
+
+class PreparedImage:
+    """
+    Imagem pronta para inferência: um único buffer RGB (image/array) na
+    resolução decodificada, mais a escala para voltar às coordenadas da
+    imagem original (já com a orientação EXIF aplicada).
+    
+    O array só é criado no primeiro acesso; a inferência em tiles recorta
+    direto da imagem PIL e nunca precisa dele.
+    """
+    
+    __slots__ = ('image', '_array', 'original_size', 'scale', 'tiled', 'quality')
+    
+    def __init__(self, image, original_size, array=None, tiled=False):
+        self.image = image
+        self._array = array
+        self.original_size = original_size
+        self.scale = (original_size[0] / image.width, original_size[1] / image.height)
+        self.tiled = tiled
+        # Medidas da triagem de qualidade (image_quality.triage), quando feita
+        self.quality = None
+    
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = np.asarray(self.image)
+        return self._array
+
+
+def open_image(source):
+    """Abre a imagem sem decodificá-la (só lê o cabeçalho)"""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def prepare_image(source, target_size=None, max_pixels=None, tiled=False):
+    """
+    Decodifica bytes, arquivo, caminho ou PIL em RGB.
+    
+    Para JPEG usa o modo draft do decodificador (redução por 1/2, 1/4 ou 1/8
+    direto na DCT) para decodificar perto de target_size em vez da resolução
+    cheia, e aplica a orientação EXIF. Sem target_size, max_pixels limita a
+    resolução decodificada (usado na inferência em tiles).
+    """
+    if isinstance(source, PreparedImage):
+        return source
+    if isinstance(source, np.ndarray):
+        image = Image.fromarray(source if source.dtype == np.uint8 else source.astype(np.uint8))
+        return PreparedImage(image, image.size, array=None if tiled else source, tiled=tiled)
+    
+    image = open_image(source)
+    
+    original_size = image.size
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    
+    if target_size and image.format == 'JPEG':
+        image.draft('RGB', (target_size, target_size))
+    elif max_pixels and image.width * image.height > max_pixels:
+        factor = (max_pixels / (image.width * image.height)) ** 0.5
+        # thumbnail também usa o draft do JPEG antes de reamostrar
+        image.thumbnail((int(image.width * factor), int(image.height * factor)))
+    if orientation in ROTATED_ORIENTATIONS:
+        original_size = original_size[::-1]
+    if orientation != 1:
+        image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    return PreparedImage(image, original_size, tiled=tiled)
+
+
+def encode_jpeg(image_array, quality=85):
+    """Codifica a imagem anotada (array ou PIL) como JPEG"""
+    image = image_array if isinstance(image_array, Image.Image) else Image.fromarray(image_array)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
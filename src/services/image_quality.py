@@ -0,0 +1,163 @@
+"""
+Triagem de qualidade antes da inferência.
+
+Numa cópia em tons de cinza de QUALITY_SIZE a 2×QUALITY_SIZE px (reduzida
+da imagem já decodificada, em cerca de um milissegundo) são medidos a
+nitidez (variância do laplaciano), o brilho médio e um hash perceptual
+(dHash de 64 bits). No modo report (o padrão) as medidas só acompanham a
+resposta. No modo enforce, opcional, imagens borradas, escuras ou estouradas
+não vão ao modelo e voltam com o motivo, e imagens quase idênticas a uma
+anterior da mesma requisição recebem uma cópia do resultado dela em vez de
+passar de novo pelo modelo.
+
+O dHash (até QUALITY_DUPLICATE_DISTANCE bits de diferença) só seleciona os
+candidatos: fundos lisos deixam fotos diferentes com hashes próximos, então
+a duplicata é confirmada comparando miniaturas 32×32 (nenhum ponto pode
+diferir mais que QUALITY_DUPLICATE_MAX_DIFF níveis, descontado o brilho).
+Juntar duas fotos diferentes esconderia um dano; na dúvida, as duas vão ao
+modelo.
+"""
+import numpy as np
+from PIL import Image
+
+from src import config
+from src.services import metrics
+
+QUALITY_MODES = ('off', 'report', 'enforce')
+REASONS = {
+    'too_dark': 'imagem escura demais',
+    'too_bright': 'imagem clara demais',
+    'blurry': 'imagem borrada'
+}
+
+QUALITY_SKIPPED = metrics.REGISTRY.register(metrics.Counter(
+    'damage_quality_skipped_total', 'Imagens que não foram ao modelo pela triagem de qualidade, por motivo',
+    ('reason',)
+))
+
+
+class QualityCheck:
+    """Medidas de uma imagem e o motivo da recusa (None se ela serve)"""
+
+    __slots__ = ('reason', 'sharpness', 'brightness', 'dhash', 'thumbnail', 'duplicate_of')
+
+    def __init__(self, reason, sharpness, brightness, dhash, thumbnail):
+        self.reason = reason
+        self.sharpness = sharpness
+        self.brightness = brightness
+        self.dhash = dhash
+        self.thumbnail = thumbnail
+        self.duplicate_of = None
+
+    @property
+    def usable(self):
+        return self.reason is None
+
+    def to_dict(self):
+        data = {
+            'usable': self.usable,
+            'reason': self.reason,
+            'sharpness': round(self.sharpness, 1),
+            'brightness': round(self.brightness, 1),
+            'dhash': f'{self.dhash:016x}'
+        }
+        if self.duplicate_of is not None:
+            data['duplicate_of'] = self.duplicate_of
+        return data
+
+
+class ImageRejected(Exception):
+    """Imagem recusada pela triagem; quality (QualityCheck) traz o motivo e as medidas"""
+
+    def __init__(self, quality):
+        super().__init__(f"Imagem rejeitada pela triagem de qualidade: {REASONS[quality.reason]}")
+        self.quality = quality
+
+
+class Duplicate:
+    """
+    Saída da inferência de uma imagem quase idêntica à de image_index: a
+    mesma saída da original (output), já nas coordenadas desta imagem
+    """
+
+    __slots__ = ('image_index', 'output')
+
+    def __init__(self, image_index, output):
+        self.image_index = image_index
+        self.output = output
+
+
+def _dhash(gray):
+    """dHash de 64 bits: cada bit diz se o pixel é mais claro que o vizinho da esquerda"""
+    pixels = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def assess(prepared, size=None):
+    """QualityCheck de uma PreparedImage"""
+    size = size or config.QUALITY_SIZE
+    with metrics.stage('quality'):
+        img = prepared.image
+        # Amostragem sem filtro (NEAREST): custa quase nada e não suaviza as bordas
+        factor = max(img.width, img.height) // size
+        if factor > 1:
+            img = img.resize((img.width // factor, img.height // factor), Image.NEAREST)
+        gray = img.convert('L')
+        pixels = np.asarray(gray, dtype=np.float32)
+        laplacian = (
+            4 * pixels[1:-1, 1:-1]
+            - pixels[:-2, 1:-1] - pixels[2:, 1:-1] - pixels[1:-1, :-2] - pixels[1:-1, 2:]
+        )
+        sharpness = float(laplacian.var()) if laplacian.size else 0.0
+        brightness = float(pixels.mean())
+        dhash = _dhash(gray)
+        thumbnail = np.asarray(gray.resize((32, 32), Image.BILINEAR), dtype=np.float32)
+        thumbnail -= thumbnail.mean()
+
+    # Uma foto escura também tem pouco contraste: a exposição é avaliada antes da nitidez
+    reason = None
+    if brightness < config.QUALITY_MIN_BRIGHTNESS:
+        reason = 'too_dark'
+    elif brightness > config.QUALITY_MAX_BRIGHTNESS:
+        reason = 'too_bright'
+    elif sharpness < config.QUALITY_MIN_SHARPNESS:
+        reason = 'blurry'
+    return QualityCheck(reason, sharpness, brightness, dhash, thumbnail)
+
+
+def triage(prepared, mode):
+    """
+    Mede a imagem (guardando o resultado em prepared.quality) e, no modo
+    enforce, levanta ImageRejected se ela não serve para a análise.
+    """
+    if mode == 'off':
+        return None
+    quality = assess(prepared)
+    prepared.quality = quality
+    if mode == 'enforce' and not quality.usable:
+        QUALITY_SKIPPED.inc(1, quality.reason)
+        raise ImageRejected(quality)
+    return quality
+
+
+class DuplicateFinder:
+    """Imagens quase idênticas entre as de uma mesma requisição, na ordem da entrada"""
+
+    def __init__(self, max_distance=None, max_diff=None):
+        self.max_distance = config.QUALITY_DUPLICATE_DISTANCE if max_distance is None else max_distance
+        self.max_diff = config.QUALITY_DUPLICATE_MAX_DIFF if max_diff is None else max_diff
+        self._seen = []
+
+    def match(self, image_index, quality):
+        """Índice da primeira imagem parecida já vista, ou None (e a imagem passa a ser referência)"""
+        if self.max_distance < 0:
+            return None
+        for seen_index, seen in self._seen:
+            if (
+                (quality.dhash ^ seen.dhash).bit_count() <= self.max_distance
+                and np.abs(quality.thumbnail - seen.thumbnail).max() <= self.max_diff
+            ):
+                return seen_index
+        self._seen.append((image_index, quality))
+        return None
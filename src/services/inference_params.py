@@ -0,0 +1,218 @@
+"""
+Parâmetros de inferência por requisição (imgsz, conf, iou, max_det) e
+perfis nomeados.
+
+Os perfis fast, standard e accurate fixam a resolução de entrada do modelo
+(e a de decodificação, na mesma proporção); campos enviados na requisição
+têm precedência sobre o perfil, desde que estejam dentro dos limites do
+servidor. O perfil auto usa INFERENCE_AUTO_PROFILE e cai para
+INFERENCE_DEGRADED_PROFILE (inclusive na resolução, mesmo com imgsz
+explícito) enquanto a fila ou o p95 recente da inferência passam dos
+limites, voltando só quando ficam abaixo de 80% deles. A resolução de um
+perfil que o backend não aceita (o TorchScript só roda em INFERENCE_IMGSZ)
+vira a aceita mais próxima.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from src import config
+from src.services import metrics
+
+PARAM_NAMES = ('imgsz', 'conf', 'iou', 'max_det')
+PROFILE_NAMES = ('fast', 'standard', 'accurate', 'auto')
+# Abaixo disso o p95 da janela não é considerado
+MIN_LOAD_SAMPLES = 20
+# Para voltar ao perfil normal a carga precisa cair abaixo desta fração dos limites
+RECOVERY_FRACTION = 0.8
+
+PROFILE_SELECTED = metrics.REGISTRY.register(metrics.Counter(
+    'damage_inference_profile_total', 'Análises por perfil de inferência usado', ('profile',)
+))
+
+
+def profiles():
+    """Valores de cada perfil fixo"""
+    base = {
+        'imgsz': config.INFERENCE_IMGSZ,
+        'conf': config.INFERENCE_CONF,
+        'iou': config.INFERENCE_IOU,
+        'max_det': config.INFERENCE_MAX_DET
+    }
+    return {
+        'fast': dict(base, imgsz=config.INFERENCE_FAST_IMGSZ),
+        'standard': base,
+        'accurate': dict(base, imgsz=config.INFERENCE_ACCURATE_IMGSZ, conf=config.INFERENCE_ACCURATE_CONF)
+    }
+
+
+def allowed_imgsz(backend):
+    """Resoluções aceitas; o TorchScript é exportado com entrada fixa"""
+    if backend == 'torchscript':
+        return (config.INFERENCE_IMGSZ,)
+    sizes = []
+    for size in config.INFERENCE_ALLOWED_IMGSZ.split(','):
+        try:
+            sizes.append(int(size))
+        except ValueError:
+            continue
+    return tuple(sorted(set(sizes) | {config.INFERENCE_IMGSZ}))
+
+
+class InferenceParams:
+    """Parâmetros resolvidos de uma análise e o perfil que os originou"""
+
+    __slots__ = ('profile', 'requested_profile', 'imgsz', 'conf', 'iou', 'max_det')
+
+    def __init__(self, profile, imgsz, conf, iou, max_det, requested_profile=None):
+        self.profile = profile
+        self.requested_profile = requested_profile or profile
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+    def model_kwargs(self):
+        """Argumentos da chamada ao modelo (e da chave do cache de resultados)"""
+        return {'imgsz': self.imgsz, 'conf': self.conf, 'iou': self.iou, 'max_det': self.max_det}
+
+    def key(self):
+        """Chave hashable, para o agendador não misturar parâmetros num lote"""
+        return (self.imgsz, self.conf, self.iou, self.max_det)
+
+    def decode_size(self):
+        """Lado menor da decodificação, proporcional ao de INFERENCE_IMGSZ (0: imagem inteira)"""
+        if config.DECODE_TARGET_SIZE <= 0:
+            return 0
+        return max(32, round(config.DECODE_TARGET_SIZE * self.imgsz / config.INFERENCE_IMGSZ))
+
+    def to_dict(self):
+        """Campos do processing_info: perfil usado (e o pedido, se diferente) e parâmetros"""
+        info = {'profile': self.profile, 'inference_params': self.model_kwargs()}
+        if self.requested_profile != self.profile:
+            info['requested_profile'] = self.requested_profile
+        return info
+
+
+def _number(name, value, cast):
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} deve ser numérico')
+    if isinstance(number, float) and not math.isfinite(number):
+        raise ValueError(f'{name} deve ser numérico')
+    return number
+
+
+def validate_overrides(overrides, backend):
+    """Converte e valida os parâmetros enviados; ValueError fora dos limites"""
+    values = {}
+    for name in PARAM_NAMES:
+        value = overrides.get(name)
+        if value is None or value == '':
+            continue
+        values[name] = _number(name, value, int if name in ('imgsz', 'max_det') else float)
+
+    sizes = allowed_imgsz(backend)
+    if 'imgsz' in values and values['imgsz'] not in sizes:
+        raise ValueError(f'imgsz deve ser um de: {", ".join(str(size) for size in sizes)}')
+    if 'conf' in values and not config.INFERENCE_MIN_CONF <= values['conf'] <= 1:
+        raise ValueError(f'conf deve estar entre {config.INFERENCE_MIN_CONF} e 1')
+    if 'iou' in values and not 0 < values['iou'] <= 1:
+        raise ValueError('iou deve estar entre 0 e 1')
+    if 'max_det' in values and not 1 <= values['max_det'] <= config.INFERENCE_MAX_DET:
+        raise ValueError(f'max_det deve estar entre 1 e {config.INFERENCE_MAX_DET}')
+    return values
+
+
+class LoadMonitor:
+    """
+    Latências recentes das chamadas ao modelo (janela de window segundos) e
+    estado de degradação do perfil auto, com histerese.
+    """
+
+    def __init__(self, window=30.0, max_samples=2048):
+        self.window = window
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.degraded = False
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds))
+
+    def p95(self):
+        """p95 da janela em ms, ou None com poucas amostras"""
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            values = sorted(seconds for _, seconds in self._samples)
+        if len(values) < MIN_LOAD_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(len(values) * 0.95))] * 1000
+
+    def overloaded(self, queue_depth, max_queue, p95_ms):
+        """Atualiza e devolve o estado de degradação (limites <= 0 desativam o critério)"""
+        p95 = self.p95()
+        fraction = RECOVERY_FRACTION if self.degraded else 1.0
+        over_queue = max_queue > 0 and queue_depth >= max_queue * fraction
+        over_latency = p95_ms > 0 and p95 is not None and p95 >= p95_ms * fraction
+        self.degraded = over_queue or over_latency
+        return self.degraded
+
+    def stats(self):
+        p95 = self.p95()
+        with self._lock:
+            samples = len(self._samples)
+        return {
+            'degraded': self.degraded,
+            'recent_p95_ms': None if p95 is None else round(p95, 3),
+            'samples': samples,
+            'window_seconds': self.window
+        }
+
+
+load_monitor = LoadMonitor(window=config.INFERENCE_AUTO_WINDOW_SECONDS)
+
+
+def _nearest(imgsz, sizes):
+    """Resolução de sizes mais próxima de imgsz (a menor, no empate)"""
+    return min(sizes, key=lambda size: (abs(size - imgsz), size))
+
+
+def validate(profile=None, overrides=None, backend=None):
+    """Perfil e parâmetros validados, sem escolher o perfil de auto"""
+    requested = profile or config.INFERENCE_PROFILE
+    if requested not in PROFILE_NAMES:
+        raise ValueError(f'profile deve ser um de: {", ".join(PROFILE_NAMES)}')
+    return requested, validate_overrides(overrides or {}, backend or config.INFERENCE_BACKEND)
+
+
+def resolve(profile=None, overrides=None, backend=None, queue_depth=0):
+    """
+    InferenceParams do perfil pedido (padrão INFERENCE_PROFILE) com os
+    parâmetros enviados por cima; ValueError se o perfil ou os valores são
+    inválidos. A resolução do perfil é ajustada às que o backend aceita.
+    """
+    requested, values = validate(profile, overrides, backend)
+
+    used = requested
+    if requested == 'auto':
+        overloaded = load_monitor.overloaded(
+            queue_depth, config.INFERENCE_AUTO_MAX_QUEUE, config.INFERENCE_AUTO_P95_MS
+        )
+        used = config.INFERENCE_DEGRADED_PROFILE if overloaded else config.INFERENCE_AUTO_PROFILE
+        if overloaded:
+            # Sob carga a resolução do perfil degradado vale mesmo com imgsz explícito
+            values.pop('imgsz', None)
+    available = profiles()
+    if used not in available:
+        used = 'standard'
+    settings = dict(available[used], **values)
+    sizes = allowed_imgsz(backend or config.INFERENCE_BACKEND)
+    if settings['imgsz'] not in sizes:
+        settings['imgsz'] = _nearest(settings['imgsz'], sizes)
+    PROFILE_SELECTED.inc(1, used)
+    return InferenceParams(used, requested_profile=requested, **settings)
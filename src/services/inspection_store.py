@@ -0,0 +1,441 @@
+"""
+Histórico de inspeções (tabelas Inspection, InspectionDamage e
+DamageDailyStats, e InspectionImage nos lotes).
+
+As rotas só enfileiram o resultado já pronto, sem bloquear: o relatório
+completo, a forma colunar das detecções e as linhas de cada dano são
+montados por uma thread de gravação, que junta até batch_size registros
+(ou o que chegou em flush_interval segundos) num único insert em lote, com
+a atualização dos totais diários na mesma transação. Com a fila cheia o
+registro é descartado e contado em damage_inspections_dropped_total, em vez
+de segurar a resposta.
+
+Um lote é gravado imagem a imagem (InspectionRecording): cada imagem vira
+uma linha de InspectionImage assim que termina, e a requisição só guarda os
+totais, de modo que a memória não cresce com o tamanho do lote.
+"""
+import atexit
+import json
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_
+
+from src.models.inspection import DamageDailyStats, Inspection, InspectionDamage, InspectionImage
+from src.models.user import db
+from src.services import metrics, serialization
+
+PLATE_PLACEHOLDER = 'Não informado'
+URGENCY_ORDER = ('Baixa', 'Média', 'Alta')
+
+INSPECTIONS_WRITTEN = metrics.REGISTRY.register(metrics.Counter(
+    'damage_inspections_written_total', 'Inspeções gravadas no histórico'
+))
+INSPECTIONS_DROPPED = metrics.REGISTRY.register(metrics.Counter(
+    'damage_inspections_dropped_total', 'Inspeções descartadas, por motivo', ('reason',)
+))
+INSPECTION_QUEUE = metrics.REGISTRY.register(metrics.Gauge(
+    'damage_inspection_writer_queue', 'Inspeções esperando gravação'
+))
+
+
+def normalize_plate(plate):
+    """Placa em maiúsculas só com letras e dígitos; None quando não informada"""
+    if not plate or plate == PLATE_PLACEHOLDER:
+        return None
+    normalized = ''.join(ch for ch in str(plate).upper() if ch.isascii() and ch.isalnum())
+    return normalized[:20] or None
+
+
+class InspectionRecording:
+    """
+    Inspeção de um lote gravada à medida que cada imagem termina (ver
+    InspectionWriter.open). Guarda só os totais; as imagens vão direto para
+    a fila de gravação.
+    """
+
+    def __init__(self, writer, source, vehicle_info, profile):
+        self.writer = writer
+        self.inspection_id = uuid.uuid4().hex
+        self.timestamp = time.time()
+        self.source = source
+        self.vehicle_info = vehicle_info
+        self.profile = profile
+        self.images = 0
+        self.total_damages = 0
+        self.total_cost = 0.0
+        self.severity_count = {}
+        self.damage_types = set()
+        self.urgency = URGENCY_ORDER[0]
+        self._opened = False
+        self._dropped = False
+
+    def add(self, image_index, damage_analysis, detections, summary):
+        """Enfileira uma imagem analisada com sucesso; os danos são renumerados no lote"""
+        if self._dropped:
+            return
+        if not self._opened:
+            self._opened = True
+            if not self.writer.enqueue(('open', self.inspection_id, self.timestamp, self.source,
+                                        self.vehicle_info, self.profile)):
+                self._dropped = True
+                return
+        damages = [
+            dict(damage, damage_id=f"DMG_{self.total_damages + n + 1:03d}", image_index=image_index)
+            for n, damage in enumerate(damage_analysis)
+        ]
+        detections = [dict(detection, image_index=image_index) for detection in detections]
+        if not self.writer.enqueue(('image', self.inspection_id, self.timestamp, self.vehicle_info,
+                                    image_index, damages, detections)):
+            return
+        self.images += 1
+        self.total_damages += summary['total_damages']
+        self.total_cost += summary['total_cost']
+        for severity, count in summary['severity_count'].items():
+            self.severity_count[severity] = self.severity_count.get(severity, 0) + count
+        self.damage_types.update(summary['damage_types'])
+        self.urgency = max(self.urgency, summary['urgency'], key=URGENCY_ORDER.index)
+
+    def close(self):
+        """Enfileira os totais do lote; id da inspeção, ou None se nada foi gravado"""
+        if not self._opened or self._dropped:
+            return None
+        self._dropped = True
+        summary = {
+            'total_damages': self.total_damages,
+            'total_cost': round(self.total_cost, 2),
+            'urgency': self.urgency,
+            'severity_count': self.severity_count,
+            'damage_types': sorted(self.damage_types)
+        }
+        if not self.writer.enqueue(('close', self.inspection_id, self.timestamp, self.vehicle_info,
+                                    self.images, summary)):
+            return None
+        return self.inspection_id
+
+
+class InspectionWriter:
+    """Grava inspeções em lote a partir de uma fila, numa thread própria"""
+
+    def __init__(self, app, report_builder, fingerprint, batch_size=200, flush_interval=1.0, max_queue=10000):
+        self.app = app
+        self.report_builder = report_builder
+        self.fingerprint = fingerprint
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='inspection-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def record(self, source, vehicle_info, damage_analysis, detections, profile=None):
+        """
+        Enfileira a inspeção de uma única análise (/detect ou vídeo) e
+        devolve o id que ela terá, ou None se foi descartada.
+        """
+        inspection_id = uuid.uuid4().hex
+        if not self.enqueue(('inspection', inspection_id, time.time(), source, vehicle_info,
+                             damage_analysis, detections, profile)):
+            return None
+        return inspection_id
+
+    def open(self, source, vehicle_info, profile=None):
+        """InspectionRecording de um lote, gravado imagem a imagem"""
+        return InspectionRecording(self, source, vehicle_info, profile)
+
+    def enqueue(self, record):
+        if self._stopped:
+            return False
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            INSPECTIONS_DROPPED.inc(1, 'queue_full')
+            return False
+        return True
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """Espera a gravação de tudo o que foi enfileirado até agora"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=10.0):
+        """Grava o que está na fila e encerra a thread"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first):
+        records, waiters, stop = [], [], False
+        item = first
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is None:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                records.append(item)
+            if stop or waiters or len(records) >= self.batch_size:
+                break
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return records, waiters, stop
+
+    def _run(self):
+        while True:
+            records, waiters, stop = self._collect(self._queue.get())
+            if records:
+                # Uma inspeção conta quando fica completa: a única de /detect ou o fechamento de um lote
+                finished = sum(1 for record in records if record[0] in ('inspection', 'close'))
+                try:
+                    with metrics.stage('inspection_write'):
+                        self._write(records)
+                    INSPECTIONS_WRITTEN.inc(finished)
+                except Exception as e:
+                    INSPECTIONS_DROPPED.inc(len(records), 'write_error')
+                    print(f"Erro ao gravar {len(records)} registro(s) no histórico: {e}")
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _report(self, inspection_id, timestamp, damages, vehicle_info, summary=None):
+        report = self.report_builder(damages, vehicle_info, summary)
+        report['inspection_info']['timestamp'] = datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+        report['inspection_info']['inspection_id'] = inspection_id
+        return report
+
+    def _damage_rows(self, inspection_id, plate, created_at, damages):
+        return [
+            {
+                'inspection_id': inspection_id,
+                'plate': plate,
+                'created_at': created_at,
+                'day': created_at.date(),
+                'damage_class': damage['class'],
+                'severity': damage.get('severity'),
+                'confidence': damage.get('confidence'),
+                'estimated_cost': damage['estimated_cost']
+            }
+            for damage in damages
+        ]
+
+    def _rows(self, record, model_version, model_sha256):
+        """
+        Linhas de um registro da fila: (inspeção nova, atualização da
+        inspeção, imagem, danos), com None onde não se aplica
+        """
+        kind, inspection_id, timestamp = record[:3]
+        created_at = datetime.fromtimestamp(timestamp, timezone.utc)
+
+        if kind == 'image':
+            vehicle_info, image_index, damages, detections = record[3:]
+            plate = normalize_plate((vehicle_info or {}).get('plate'))
+            image = {
+                'inspection_id': inspection_id,
+                'image_index': image_index,
+                'damages': json.dumps(damages, ensure_ascii=False),
+                'detections': json.dumps(detections, ensure_ascii=False)
+            }
+            return None, None, image, self._damage_rows(inspection_id, plate, created_at, damages)
+
+        if kind == 'close':
+            vehicle_info, images, summary = record[3:]
+            # Os danos ficam nas linhas de InspectionImage, lidas na consulta
+            report = self._report(inspection_id, timestamp, [], vehicle_info, summary)
+            update = {
+                'id': inspection_id,
+                'images': images,
+                'total_damages': summary['total_damages'],
+                'total_cost': summary['total_cost'],
+                'urgency': summary['urgency'],
+                'report': json.dumps(report, ensure_ascii=False)
+            }
+            return None, update, None, []
+
+        source, vehicle_info = record[3:5]
+        plate = normalize_plate((vehicle_info or {}).get('plate'))
+        inspection = {
+            'id': inspection_id,
+            'plate': plate,
+            'created_at': created_at,
+            'source': source,
+            'images': 0,
+            'total_damages': 0,
+            'total_cost': 0,
+            'urgency': None,
+            'profile': record[-1],
+            'model_version': model_version,
+            'model_sha256': model_sha256,
+            'report': None,
+            'detections': None
+        }
+        if kind == 'open':
+            return inspection, None, None, []
+
+        damages, detections = record[5:7]
+        report = self._report(inspection_id, timestamp, damages, vehicle_info)
+        inspection.update(
+            images=1,
+            total_damages=len(damages),
+            total_cost=round(sum(damage['estimated_cost'] for damage in damages), 2),
+            urgency=report['damage_analysis']['repair_urgency'],
+            report=json.dumps(report, ensure_ascii=False),
+            detections=json.dumps(serialization.columnar(detections), ensure_ascii=False)
+        )
+        return inspection, None, None, self._damage_rows(inspection_id, plate, created_at, damages)
+
+    def _write(self, records):
+        model_version, model_sha256 = self.fingerprint()
+        inspections, updates, images, damage_rows = [], [], [], []
+        for record in records:
+            inspection, update, image, damages = self._rows(record, model_version, model_sha256)
+            if inspection is not None:
+                inspections.append(inspection)
+            if update is not None:
+                updates.append(update)
+            if image is not None:
+                images.append(image)
+            damage_rows.extend(damages)
+
+        rollup = {}
+        for row in damage_rows:
+            key = (row['day'], row['damage_class'])
+            damages, cost = rollup.get(key, (0, 0.0))
+            rollup[key] = (damages + 1, cost + row['estimated_cost'])
+
+        with self.app.app_context():
+            try:
+                # A inspeção de um lote é aberta antes das imagens e fechada depois delas
+                if inspections:
+                    db.session.execute(db.insert(Inspection), inspections)
+                if images:
+                    db.session.execute(db.insert(InspectionImage), images)
+                if damage_rows:
+                    db.session.execute(db.insert(InspectionDamage), damage_rows)
+                for update in updates:
+                    db.session.execute(
+                        db.update(Inspection).where(Inspection.id == update.pop('id')).values(**update)
+                    )
+                _add_daily_stats(rollup)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+
+def _add_daily_stats(rollup):
+    """Soma os danos do lote em DamageDailyStats (upsert quando o banco suporta)"""
+    if not rollup:
+        return
+    rows = [
+        {'day': day, 'damage_class': damage_class, 'damages': damages, 'total_cost': round(cost, 2)}
+        for (day, damage_class), (damages, cost) in rollup.items()
+    ]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(DamageDailyStats)
+        statement = statement.on_conflict_do_update(
+            index_elements=['day', 'damage_class'],
+            set_={
+                'damages': DamageDailyStats.damages + statement.excluded.damages,
+                'total_cost': DamageDailyStats.total_cost + statement.excluded.total_cost
+            }
+        )
+        db.session.execute(statement, rows)
+        return
+
+    for row in rows:
+        updated = db.session.execute(
+            db.update(DamageDailyStats)
+            .where(DamageDailyStats.day == row['day'], DamageDailyStats.damage_class == row['damage_class'])
+            .values(
+                damages=DamageDailyStats.damages + row['damages'],
+                total_cost=DamageDailyStats.total_cost + row['total_cost']
+            )
+        )
+        if not updated.rowcount:
+            db.session.add(DamageDailyStats(**row))
+
+
+# Iniciado por start() depois que o banco existe; sem ele nada é gravado
+writer = None
+INSPECTION_QUEUE.set_function(lambda: writer.queue_depth() if writer is not None else 0)
+
+
+def start(app, report_builder, fingerprint, batch_size=200, flush_interval=1.0, max_queue=10000):
+    global writer
+    if writer is None:
+        writer = InspectionWriter(app, report_builder, fingerprint, batch_size, flush_interval, max_queue)
+    return writer
+
+
+def record(source, vehicle_info, damage_analysis, detections, profile=None):
+    """Enfileira a inspeção no histórico (se ativo); id da inspeção ou None"""
+    if writer is None:
+        return None
+    return writer.record(source, vehicle_info, damage_analysis, detections, profile)
+
+
+def open_recording(source, vehicle_info, profile=None):
+    """InspectionRecording de um lote, ou None se o histórico está desligado"""
+    if writer is None:
+        return None
+    return writer.open(source, vehicle_info, profile)
+
+
+def page_cursor(inspection):
+    """Cursor da página seguinte: instante e id da última inspeção da página"""
+    return f'{inspection.created_at.isoformat()}~{inspection.id}'
+
+
+def parse_cursor(value):
+    """
+    (created_at, id) de um cursor de page_cursor; um instante ISO 8601
+    sozinho também é aceito, com id None. ValueError se for inválido.
+    """
+    moment, _, inspection_id = value.partition('~')
+    created_at = datetime.fromisoformat(moment)
+    if created_at.tzinfo is not None:
+        # created_at é gravado em UTC, sem fuso
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at, inspection_id or None
+
+
+def page(plate=None, before=None, limit=50):
+    """
+    Até limit inspeções, das mais recentes para as mais antigas, depois do
+    cursor before (de parse_cursor). A ordem é (created_at, id): inspeções
+    gravadas no mesmo instante, comuns num lote, não somem entre as páginas.
+    """
+    # Índices (plate, created_at) e created_at: nenhuma consulta lê a tabela inteira
+    query = Inspection.query
+    if plate:
+        query = query.filter(Inspection.plate == plate)
+    if before is not None:
+        created_at, inspection_id = before
+        if inspection_id is None:
+            query = query.filter(Inspection.created_at < created_at)
+        else:
+            query = query.filter(or_(
+                Inspection.created_at < created_at,
+                and_(Inspection.created_at == created_at, Inspection.id < inspection_id)
+            ))
+    return query.order_by(Inspection.created_at.desc(), Inspection.id.desc()).limit(limit).all()
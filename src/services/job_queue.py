@@ -0,0 +1,149 @@
+import json
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from src import config
+from src.models.job import Job
+from src.models.user import db
+
+
+class JobQueue:
+    """
+    Executa jobs assíncronos gravados na tabela Job em um pool de threads.
+
+    A requisição só grava o job e chama submit(); o processamento, a
+    gravação do resultado e o webhook de conclusão acontecem aqui.
+
+    Com vários workers do gunicorn (ou réplicas) lendo o mesmo banco, cada
+    job é tomado por um único processo: a passagem de queued para running é
+    um UPDATE condicional que grava o dono e um prazo (lease). Enquanto o
+    job roda, o dono renova o prazo; um job running só volta a ser executado
+    por outro processo quando o prazo vence (o dono morreu).
+    """
+
+    def __init__(self, app, handlers, workers=2, lease_seconds=60):
+        self.app = app
+        self.handlers = handlers
+        self.lease = timedelta(seconds=max(1, lease_seconds))
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job-worker')
+        # Jobs já entregues ao pool, para a retomada periódica não enfileirá-los de novo
+        self._submitted = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_leases, name='job-lease', daemon=True)
+        self._heartbeat.start()
+
+    def submit(self, job_id):
+        with self._lock:
+            if job_id in self._submitted:
+                return
+            self._submitted.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def resume_pending(self):
+        """
+        Reenfileira jobs que ficaram pendentes (por exemplo, após um
+        reinício): os queued e os running cujo prazo venceu. Outro processo
+        pode enfileirar o mesmo job; só um consegue tomá-lo.
+        """
+        now = datetime.now(timezone.utc)
+        with self.app.app_context():
+            pending = (
+                Job.query.filter(db.or_(
+                    Job.status == 'queued',
+                    db.and_(Job.status == 'running', db.or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now))
+                ))
+                .order_by(Job.created_at)
+                .with_entities(Job.id)
+                .all()
+            )
+        for (job_id,) in pending:
+            self.submit(job_id)
+        return len(pending)
+
+    def _claim(self, job_id):
+        """Toma o job para este processo; False se outro já o tomou ou ele terminou"""
+        now = datetime.now(timezone.utc)
+        claimed = db.session.execute(
+            db.update(Job)
+            .where(
+                Job.id == job_id,
+                db.or_(
+                    Job.status == 'queued',
+                    db.and_(Job.status == 'running', db.or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now))
+                )
+            )
+            .values(status='running', owner=self.owner, lease_expires_at=now + self.lease, started_at=now)
+        )
+        db.session.commit()
+        return claimed.rowcount == 1
+
+    def _run(self, job_id):
+        try:
+            self._execute(job_id)
+        finally:
+            with self._lock:
+                self._submitted.discard(job_id)
+
+    def _execute(self, job_id):
+        with self.app.app_context():
+            if not self._claim(job_id):
+                return
+            job = db.session.get(Job, job_id)
+
+            try:
+                result = self.handlers[job.kind](json.loads(job.payload))
+                values = {'result': json.dumps(result, ensure_ascii=False), 'status': 'done'}
+            except Exception as e:
+                values = {'error': f'Erro ao processar job: {str(e)}', 'status': 'failed'}
+
+            # As imagens de entrada não são mais necessárias; se o prazo venceu
+            # e outro processo tomou o job, o resultado dele é que vale
+            finished = db.session.execute(
+                db.update(Job)
+                .where(Job.id == job_id, Job.owner == self.owner, Job.status == 'running')
+                .values(payload=None, finished_at=datetime.now(timezone.utc), lease_expires_at=None, **values)
+            )
+            db.session.commit()
+            if finished.rowcount != 1:
+                self.app.logger.warning('Job %s foi tomado por outro processo; resultado descartado', job_id)
+                return
+
+            db.session.refresh(job)
+            if job.webhook_url:
+                self._notify(job)
+
+    def _renew_leases(self):
+        """Renova o prazo dos jobs deste processo e retoma os de processos que morreram"""
+        interval = self.lease.total_seconds() / 3
+        while not self._stopped.wait(interval):
+            try:
+                with self.app.app_context():
+                    db.session.execute(
+                        db.update(Job)
+                        .where(Job.owner == self.owner, Job.status == 'running')
+                        .values(lease_expires_at=datetime.now(timezone.utc) + self.lease)
+                    )
+                    db.session.commit()
+                self.resume_pending()
+            except Exception as e:
+                self.app.logger.warning('Erro ao renovar o prazo dos jobs: %s', e)
+
+    def _notify(self, job):
+        try:
+            requests.post(
+                job.webhook_url, json=job.to_dict(), timeout=config.JOB_WEBHOOK_TIMEOUT, allow_redirects=False
+            )
+        except Exception as e:
+            self.app.logger.warning('Erro ao chamar webhook do job %s: %s', job.id, e)
+
+    def shutdown(self):
+        self._stopped.set()
+        self._executor.shutdown(wait=False)
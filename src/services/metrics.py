@@ -0,0 +1,243 @@
+"""
+Métricas do serviço no formato texto do Prometheus.
+
+Cada thread grava numa cópia própria dos valores (criada na primeira
+observação, único momento em que há lock), e a coleta em /metrics soma as
+cópias de todas as threads. Assim o caminho quente nunca disputa locks.
+Quando uma thread termina, a cópia dela é somada a uma base comum e
+descartada, então threads de vida curta não acumulam cópias.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Owner:
+    """Guardado no thread-local: é coletado quando a thread termina"""
+
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+def _add(total, value):
+    """Soma valores de cópias: números ou listas (contagens de histograma)"""
+    if isinstance(value, list):
+        if total is None:
+            return list(value)
+        for i, item in enumerate(value):
+            total[i] += item
+        return total
+    return (total or 0) + value
+
+
+class _Shards:
+    """Um dicionário (labels -> valor) por thread viva, mais a soma das que terminaram"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        owner = getattr(self._local, 'owner', None)
+        if owner is None:
+            owner = _Owner({})
+            with self._lock:
+                self._shards.append(owner.shard)
+            weakref.finalize(owner, self._retire, owner.shard)
+            self._local.owner = owner
+        return owner.shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards = [other for other in self._shards if other is not shard]
+            for labels, value in shard.items():
+                self._base[labels] = _add(self._base.get(labels), value)
+
+    def snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+            base = [(labels, _add(None, value)) for labels, value in self._base.items()]
+        return [base] + [list(shard.items()) for shard in shards]
+
+    def count(self):
+        """Cópias de threads vivas"""
+        with self._lock:
+            return len(self._shards)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+
+    def inc(self, amount=1, *labels):
+        shard = self._shards.get()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self):
+        totals = {}
+        for items in self._shards.snapshot():
+            for labels, value in items:
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render(self):
+        for labels, value in sorted(self.collect().items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    """Gauge por soma de incrementos/decrementos ou calculado por uma função na coleta"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        super().__init__(name, help_text, labelnames)
+        self._function = function
+
+    def dec(self, amount=1, *labels):
+        self.inc(-amount, *labels)
+
+    def set_function(self, function):
+        """function retorna um número ou um dicionário {labels: valor}"""
+        self._function = function
+
+    def collect(self):
+        if self._function is None:
+            return super().collect()
+        try:
+            value = self._function()
+        except Exception:
+            return {}
+        return value if isinstance(value, dict) else {(): value}
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _Shards()
+
+    def observe(self, value, *labels):
+        shard = self._shards.get()
+        counts = shard.get(labels)
+        if counts is None:
+            # Contagem por faixa (a última é +Inf) seguida da soma
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def collect(self):
+        totals = {}
+        for items in self._shards.snapshot():
+            for labels, counts in items:
+                merged = totals.setdefault(labels, [0] * len(counts))
+                for i, value in enumerate(list(counts)):
+                    merged[i] += value
+        return totals
+
+    def render(self):
+        for labels, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, ("le", le))} {cumulative}'
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {_format_value(counts[-1])}'
+            yield f'{self.name}_count{label_text} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'damage_stage_seconds', 'Tempo de cada etapa do processamento de uma requisição', ('stage',)
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'damage_request_seconds', 'Duração das requisições por endpoint', ('endpoint',)
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    'damage_requests_total', 'Requisições atendidas por endpoint e status HTTP', ('endpoint', 'status')
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'damage_requests_in_flight', 'Requisições em andamento'
+))
+INFERENCE_QUEUED = REGISTRY.register(Gauge(
+    'damage_inference_queued', 'Pedidos aguardando o modelo (agendador de micro-lotes ou processos de inferência)'
+))
+IMAGE_MEGAPIXELS = REGISTRY.register(Histogram(
+    'damage_image_megapixels', 'Resolução original das imagens recebidas',
+    buckets=(0.3, 1, 2, 4, 8, 12, 16, 24, 48)
+))
+DETECTIONS_PER_IMAGE = REGISTRY.register(Histogram(
+    'damage_detections_per_image', 'Danos detectados por imagem',
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50)
+))
+MODEL_INFO = REGISTRY.register(Gauge(
+    'damage_model_info', 'Modelo carregado (sempre 1)', ('model', 'backend', 'precision')
+))
+
+
+def stage(name):
+    """Mede um trecho do processamento: with stage('decode'): ..."""
+    return STAGE_SECONDS.time(name)
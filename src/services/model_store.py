@@ -0,0 +1,167 @@
+"""
+Cache verificado do arquivo de pesos do modelo.
+
+O download vai para um arquivo temporário no mesmo diretório, é conferido
+pelo sha256 e só então renomeado (os.replace) para o caminho final, tudo
+sob um lock de arquivo para que vários processos subindo ao mesmo tempo
+não disputem um arquivo pela metade. O hash calculado fica num arquivo ao
+lado (<modelo>.sha256) e só é refeito quando tamanho ou mtime mudam.
+
+Sem MODEL_SHA256 não há hash para conferir: qualquer arquivo não vazio é
+aceito (um modelo trocado de propósito só tem o hash recalculado), e um
+arquivo vazio é apagado e baixado de novo. Um arquivo que não carrega pode
+ser baixado de novo com refetch_model.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class ModelArtifactError(Exception):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path):
+    """Lock exclusivo entre processos (sem efeito onde não há fcntl)"""
+    with open(path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _atomic_write_text(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _recorded(path):
+    """Conteúdo do <modelo>.sha256, ou None se ele não existe ou é inválido"""
+    try:
+        with open(path + '.sha256') as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(recorded, dict) or not {'sha256', 'size', 'mtime_ns'} <= recorded.keys():
+        return None
+    return recorded
+
+
+def cached_sha256(path):
+    """sha256 do arquivo, reaproveitando o valor salvo se o arquivo não mudou"""
+    stat = os.stat(path)
+    recorded = _recorded(path)
+    if recorded and recorded['size'] == stat.st_size and recorded['mtime_ns'] == stat.st_mtime_ns:
+        return recorded['sha256']
+
+    digest = file_sha256(path)
+    _atomic_write_text(path + '.sha256', json.dumps({
+        'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns
+    }))
+    return digest
+
+
+def _download(path, url, expected_sha256, timeout):
+    print(f"Baixando modelo de {url}...")
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.download-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with requests.get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if expected_sha256 and digest.hexdigest() != expected_sha256:
+            raise ModelArtifactError(
+                f"sha256 do download não confere (esperado {expected_sha256}, obtido {digest.hexdigest()})"
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    cached_sha256(path)
+    print("Modelo baixado com sucesso!")
+    return digest.hexdigest()
+
+
+def _discard(path):
+    for stale in (path, path + '.sha256'):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+def ensure_model(path, url, expected_sha256=None, offline=False, timeout=60):
+    """
+    Garante que path contém o modelo esperado e retorna o seu sha256.
+
+    Em modo offline nunca baixa: o arquivo precisa existir (e conferir com
+    expected_sha256, quando informado, ou não estar vazio).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with file_lock(path + '.lock'):
+        if os.path.exists(path) and not expected_sha256:
+            if os.path.getsize(path) > 0:
+                return cached_sha256(path)
+            print(f"Modelo em {path} vazio; descartando")
+            if offline:
+                raise ModelArtifactError(f"Modelo em {path} está vazio (modo offline)")
+            _discard(path)
+        elif os.path.exists(path):
+            digest = cached_sha256(path)
+            if digest == expected_sha256:
+                return digest
+            print(f"Modelo em {path} com sha256 inesperado ({digest}); descartando")
+            if offline:
+                raise ModelArtifactError(f"Modelo em {path} não confere com MODEL_SHA256 (modo offline)")
+        elif offline:
+            raise ModelArtifactError(f"Modelo não encontrado em {path} (modo offline)")
+
+        return _download(path, url, expected_sha256, timeout)
+
+
+def refetch_model(path, url, timeout=60):
+    """Apaga o arquivo (que não carregou) e o baixa de novo; retorna o sha256"""
+    with file_lock(path + '.lock'):
+        print(f"Modelo em {path} não carregou; baixando de novo")
+        _discard(path)
+        return _download(path, url, None, timeout)
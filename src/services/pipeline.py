@@ -0,0 +1,124 @@
+"""
+Pipeline em etapas para lotes de imagens: decodificação → inferência →
+finalização (anotação e codificação).
+
+A decodificação e a finalização rodam em pools de threads pequenos (o PIL
+libera o GIL nos codecs) enquanto a thread que chamou roda o modelo, de
+modo que, enquanto o grupo i está no modelo, o grupo i+1 é decodificado e o
+grupo i-1 é codificado. Os itens em andamento são limitados por
+max_in_flight, os resultados saem na ordem da entrada e um item que falha
+vira a exceção correspondente sem travar os demais.
+
+Os pools são criados no primeiro uso de cada processo (nunca herdados pelo
+fork) e compartilhados por todas as chamadas: uma requisição não paga a
+criação de threads, e o total de threads do processo não cresce com o
+número de lotes simultâneos.
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+
+def _call(fn, *args):
+    """Executa fn devolvendo a exceção em vez de levantá-la"""
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+
+class _InlineExecutor:
+    """Executor sem threads, para etapas com 0 workers"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _executor(workers, name):
+    """Pool compartilhado deste processo com esse nome e tamanho"""
+    if workers <= 0:
+        return _InlineExecutor()
+    with _pools_lock:
+        pid, pool = _pools.get((name, workers), (None, None))
+        if pid != os.getpid():
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+            _pools[(name, workers)] = (os.getpid(), pool)
+    return pool
+
+
+def run_pipeline(items, decode, infer, finish, chunk_size, decode_workers=2, finish_workers=2,
+                 max_in_flight=0):
+    """
+    Gera, na ordem de items, o resultado de finish para cada item.
+
+    - decode(item) roda no pool de decodificação
+    - infer(lista de decodificados) roda na thread atual, em grupos de até
+      chunk_size, e devolve um resultado (ou exceção) por item
+    - finish(índice, decodificado, inferido) roda no pool de finalização
+
+    Exceções de decode viram o "decodificado" do item e são repassadas a
+    finish sem passar pelo modelo; exceções de infer como um todo valem para
+    o grupo inteiro. max_in_flight (0: três grupos) limita os itens entre a
+    leitura e a entrega do resultado.
+    """
+    chunk_size = max(1, chunk_size)
+    max_in_flight = max(max_in_flight or 3 * chunk_size, chunk_size)
+    items = enumerate(items)
+    decoding = deque()
+    finishing = deque()
+    exhausted = False
+
+    decoders = _executor(decode_workers, 'pipeline-decode')
+    finishers = _executor(finish_workers, 'pipeline-finish')
+
+    def fill():
+        nonlocal exhausted
+        while not exhausted and len(decoding) + len(finishing) < max_in_flight:
+            try:
+                index, item = next(items)
+            except StopIteration:
+                exhausted = True
+                return
+            decoding.append((index, decoders.submit(_call, decode, item)))
+
+    try:
+        fill()
+        chunk_number = 0
+        while decoding:
+            chunk = []
+            while decoding and len(chunk) < chunk_size:
+                index, future = decoding.popleft()
+                chunk.append((index, future.result()))
+            # O próximo grupo decodifica enquanto este está no modelo
+            fill()
+
+            valid = [decoded for _, decoded in chunk if not isinstance(decoded, Exception)]
+            try:
+                inferred = iter(infer(valid) if valid else [])
+            except Exception as e:
+                inferred = iter([e] * len(valid))
+
+            for index, decoded in chunk:
+                output = decoded if isinstance(decoded, Exception) else next(inferred)
+                finishing.append((chunk_number, index, finishers.submit(_call, finish, index, decoded, output)))
+
+            # Entrega os grupos anteriores, que foram finalizados durante esta inferência
+            while finishing and finishing[0][0] < chunk_number:
+                yield finishing.popleft()[2].result()
+            fill()
+            chunk_number += 1
+
+        while finishing:
+            yield finishing.popleft()[2].result()
+    finally:
+        # Se o consumidor parar no meio (cliente desconectou), descarta o que
+        # não começou e espera o que já está rodando; os pools continuam
+        futures = [future for _, future in decoding] + [future for _, _, future in finishing]
+        wait([future for future in futures if not future.cancel()])
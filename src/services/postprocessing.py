@@ -0,0 +1,196 @@
+import numpy as np
+
+SEVERITY_LEVELS = ('Leve', 'Moderado', 'Severo')
+DEFAULT_COST_RANGE = (100, 500)
+
+
+class Detections:
+    """
+    Detecções de uma imagem em arrays paralelos (caixas xyxy, confiança e
+    id da classe), vindos do modelo numa única transferência.
+    """
+
+    __slots__ = ('xyxy', 'conf', 'cls')
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.int64).reshape(-1)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty((0, 4)), np.empty(0), np.empty(0))
+
+    @classmethod
+    def from_result(cls, result):
+        """Extrai as caixas de um resultado da ultralytics de uma só vez"""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty()
+        return cls(boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy())
+
+    def __len__(self):
+        return len(self.conf)
+
+    def scaled(self, scale_x, scale_y):
+        if scale_x == 1.0 and scale_y == 1.0:
+            return self
+        factors = np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+        return Detections(self.xyxy * factors, self.conf, self.cls)
+
+    def select(self, mask):
+        return Detections(self.xyxy[mask], self.conf[mask], self.cls[mask])
+
+    def translated(self, dx, dy):
+        """Desloca as caixas (ex.: de coordenadas do tile para as da imagem)"""
+        if not dx and not dy:
+            return self
+        offset = np.array([dx, dy, dx, dy], dtype=np.float32)
+        return Detections(self.xyxy + offset, self.conf, self.cls)
+
+    @classmethod
+    def concatenate(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls.empty()
+        return cls(
+            np.concatenate([part.xyxy for part in parts]),
+            np.concatenate([part.conf for part in parts]),
+            np.concatenate([part.cls for part in parts])
+        )
+
+    def to_payload(self):
+        """Forma serializável em JSON (usada pelo cache em disco)"""
+        return {'xyxy': self.xyxy.tolist(), 'conf': self.conf.tolist(), 'cls': self.cls.tolist()}
+
+    @classmethod
+    def from_payload(cls, payload):
+        return cls(payload['xyxy'], payload['conf'], payload['cls'])
+
+
+class ClassTable:
+    """
+    Tabelas de consulta indexadas pelo id da classe do modelo, montadas uma
+    vez a partir do damage_config, para calcular severidade, custo e
+    urgência de todas as detecções com NumPy.
+    """
+
+    def __init__(self, names, damage_config):
+        self.damage_config = damage_config
+        self.names = []
+        self.ids = {}
+        for class_id in sorted(names):
+            self._add(names[class_id], class_id)
+        self._build()
+
+    def _add(self, class_name, class_id=None):
+        class_id = len(self.names) if class_id is None else class_id
+        while len(self.names) <= class_id:
+            self.names.append(None)
+        self.names[class_id] = class_name
+        self.ids[class_name] = class_id
+        return class_id
+
+    def _build(self):
+        config = self.damage_config
+        names = [name or '' for name in self.names]
+        self.display = np.array([
+            config['class_names'].get(name, name.replace('_', ' ').title()) for name in names
+        ], dtype=object)
+        self.location = np.array([config['location_map'].get(name, 'N/A') for name in names], dtype=object)
+        severity = [config['severity_map'].get(name, 'Indefinido') for name in names]
+        self.severity = np.array(severity, dtype=object)
+        self.severity_index = np.array([
+            SEVERITY_LEVELS.index(level) if level in SEVERITY_LEVELS else -1 for level in severity
+        ], dtype=np.int64)
+        costs = np.array([config['cost_estimates'].get(name, DEFAULT_COST_RANGE) for name in names],
+                         dtype=np.float64).reshape(-1, 2)
+        self.cost_min = costs[:, 0]
+        self.cost_span = costs[:, 1] - costs[:, 0]
+
+    def class_id(self, class_name):
+        """Id da classe pelo nome (classes desconhecidas ganham um id novo)"""
+        if class_name not in self.ids:
+            self._add(class_name)
+            self._build()
+        return self.ids[class_name]
+
+    def from_dicts(self, detections):
+        """Converte detecções no formato da API ({'class', 'confidence', 'bbox'}) em arrays"""
+        if not detections:
+            return Detections.empty()
+        return Detections(
+            [detection['bbox'] for detection in detections],
+            [detection['confidence'] for detection in detections],
+            [self.class_id(detection['class']) for detection in detections]
+        )
+
+    def to_dicts(self, detections):
+        names = self.names
+        return [
+            {'class': names[class_id], 'confidence': confidence, 'bbox': bbox}
+            for class_id, confidence, bbox in zip(
+                detections.cls.tolist(), detections.conf.tolist(), detections.xyxy.tolist()
+            )
+        ]
+
+    def estimated_costs(self, detections):
+        costs = self.cost_min[detections.cls] + self.cost_span[detections.cls] * detections.conf
+        return np.round(costs, 2)
+
+    def analyze(self, detections):
+        """
+        Calcula, numa única passada vetorizada, a lista de danos e o resumo
+        (custo total, contagem por severidade, tipos e urgência).
+        """
+        if len(detections) == 0:
+            return [], {
+                'total_damages': 0,
+                'total_cost': 0,
+                'urgency': 'Baixa',
+                'severity_count': {level: 0 for level in SEVERITY_LEVELS},
+                'damage_types': []
+            }
+
+        cls = detections.cls
+        costs = self.estimated_costs(detections)
+
+        severity_index = self.severity_index[cls]
+        counts = np.bincount(severity_index[severity_index >= 0], minlength=len(SEVERITY_LEVELS))
+        severity_count = dict(zip(SEVERITY_LEVELS, counts.tolist()))
+
+        if severity_count['Severo'] > 0:
+            urgency = 'Alta'
+        elif severity_count['Moderado'] > 0:
+            urgency = 'Média'
+        else:
+            urgency = 'Baixa'
+
+        summary = {
+            'total_damages': len(detections),
+            'total_cost': round(float(costs.sum()), 2),
+            'urgency': urgency,
+            'severity_count': severity_count,
+            'damage_types': sorted(set(self.display[np.unique(cls)].tolist()))
+        }
+
+        names = self.names
+        damage_analysis = [
+            {
+                'damage_id': f"DMG_{i+1:03d}",
+                'class': names[class_id],
+                'class_display': display,
+                'confidence': confidence,
+                'severity': severity,
+                'location': location,
+                'estimated_cost': cost,
+                'bbox': bbox
+            }
+            for i, (class_id, display, confidence, severity, location, cost, bbox) in enumerate(zip(
+                cls.tolist(), self.display[cls].tolist(), detections.conf.tolist(),
+                self.severity[cls].tolist(), self.location[cls].tolist(), costs.tolist(),
+                detections.xyxy.tolist()
+            ))
+        ]
+
+        return damage_analysis, summary
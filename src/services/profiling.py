@@ -0,0 +1,253 @@
+"""
+Profiling opcional de uma única requisição.
+
+Só existe quando PROFILING_TOKEN está configurado: o decorador profiled
+devolve a própria view quando não há token, e sem o cabeçalho X-Profile
+(ou ?profile_token=) com o token certo a requisição segue sem nenhum profiler.
+Uma requisição aceita roda sob cProfile e tracemalloc (e o profiler do
+torch, se instalado); o resumo vai na resposta e o profile completo fica
+em disco, baixável pelo ID.
+
+Os profilers só veem a thread da requisição. Quando parte do trabalho roda
+em outras threads ou processos (agendador de lotes, processos de inferência,
+pipeline de lotes), o resumo diz quais em unprofiled_threads, com
+inference_threads_not_profiled verdadeiro.
+"""
+import cProfile
+import functools
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+from flask import current_app, g, has_request_context, make_response, request
+
+from src import config
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_ARG = 'profile_token'
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 10
+TOP_TORCH_OPS = 15
+
+# tracemalloc é global ao processo: uma requisição perfilada por vez
+_profile_lock = threading.Lock()
+
+
+def is_authorized(token):
+    return bool(config.PROFILING_TOKEN) and bool(token) and hmac.compare_digest(
+        token.encode(), config.PROFILING_TOKEN.encode()
+    )
+
+
+def _requested_token():
+    return request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_ARG)
+
+
+def note_unprofiled(component):
+    """Registra, na requisição atual, trabalho feito fora da thread dela"""
+    if not has_request_context():
+        return
+    components = g.setdefault('unprofiled_threads', [])
+    if component not in components:
+        components.append(component)
+
+
+def _unprofiled_threads():
+    components = []
+    if config.INFERENCE_WORKERS > 0:
+        components.append('worker_pool')
+    elif config.INFERENCE_BATCH_WINDOW_MS > 0:
+        components.append('scheduler')
+    return components + [component for component in g.get('unprofiled_threads', []) if component not in components]
+
+
+def _profile_dir():
+    os.makedirs(config.PROFILING_DIR, exist_ok=True)
+    return config.PROFILING_DIR
+
+
+def profile_path(profile_id, extension):
+    if not profile_id.isalnum():
+        return None
+    return os.path.join(_profile_dir(), f'{profile_id}.{extension}')
+
+
+def _prune():
+    """Mantém apenas os PROFILING_MAX_STORED profiles mais recentes"""
+    directory = _profile_dir()
+    stored = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in stored[:max(0, len(stored) - config.PROFILING_MAX_STORED)]:
+        profile_id = entry.name[:-len('.json')]
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(os.path.join(directory, f'{profile_id}.{extension}'))
+            except OSError:
+                pass
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{os.path.basename(filename)}:{line}({name})',
+            'calls': ncalls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3)
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _top_allocations(snapshot):
+    return [
+        {
+            'location': f'{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}',
+            'size_kb': round(stat.size / 1024, 1),
+            'count': stat.count
+        }
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+    ]
+
+
+def _torch_profiler():
+    try:
+        from torch.profiler import ProfilerActivity, profile
+    except ImportError:
+        return None
+    return profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+
+
+def _torch_ops(torch_profile):
+    if torch_profile is None:
+        return None
+    events = sorted(torch_profile.key_averages(), key=lambda event: event.cpu_time_total, reverse=True)
+    return [
+        {
+            'op': event.key,
+            'calls': event.count,
+            'cpu_time_total_ms': round(event.cpu_time_total / 1000, 3),
+            'self_cpu_time_total_ms': round(event.self_cpu_time_total / 1000, 3)
+        }
+        for event in events[:TOP_TORCH_OPS]
+    ]
+
+
+def _run_profiled(view, args, kwargs):
+    profile_id = uuid.uuid4().hex
+    profiler = cProfile.Profile()
+    torch_profile = _torch_profiler()
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        if torch_profile is not None:
+            torch_profile.__enter__()
+        profiler.enable()
+        try:
+            response = view(*args, **kwargs)
+        finally:
+            profiler.disable()
+            if torch_profile is not None:
+                torch_profile.__exit__(None, None, None)
+        wall_ms = (time.perf_counter() - started) * 1000
+        cpu_ms = (time.process_time() - cpu_started) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+    unprofiled = _unprofiled_threads()
+    summary = {
+        'profile_id': profile_id,
+        'endpoint': request.endpoint,
+        'wall_time_ms': round(wall_ms, 3),
+        # tempo de CPU do processo inteiro, não só desta thread
+        'process_cpu_time_ms': round(cpu_ms, 3),
+        'peak_allocated_mb': round((peak - baseline) / (1024 * 1024), 3),
+        'top_functions': _top_functions(profiler),
+        'top_allocations': _top_allocations(snapshot),
+        'torch_ops': _torch_ops(torch_profile),
+        # Modelo, decodificação ou codificação fora desta thread não aparecem acima
+        'inference_threads_not_profiled': bool(unprofiled),
+        'unprofiled_threads': unprofiled
+    }
+
+    profiler.dump_stats(profile_path(profile_id, 'prof'))
+    with open(profile_path(profile_id, 'json'), 'w') as f:
+        json.dump(summary, f)
+    _prune()
+    return response, summary
+
+
+def _attach_summary(response, summary):
+    response = make_response(response)
+    response.headers['X-Profile-Id'] = summary['profile_id']
+    if response.is_json and not response.is_streamed:
+        payload = response.get_json()
+        if isinstance(payload, dict):
+            payload['profiling'] = summary
+            response.set_data(current_app.json.dumps(payload))
+    return response
+
+
+def profiled(view):
+    """
+    Perfila a view quando a requisição traz o token de profiling.
+
+    PROFILING_SAMPLE_RATE define a fração das requisições com token que é
+    de fato perfilada; as demais seguem normalmente.
+    """
+    if not config.PROFILING_TOKEN:
+        return view
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _requested_token()
+        if token is None:
+            return view(*args, **kwargs)
+        if not is_authorized(token) or random.random() >= config.PROFILING_SAMPLE_RATE:
+            return view(*args, **kwargs)
+        if not _profile_lock.acquire(blocking=False):
+            response = make_response(view(*args, **kwargs))
+            response.headers['X-Profile-Status'] = 'busy'
+            return response
+        try:
+            response, summary = _run_profiled(view, args, kwargs)
+        finally:
+            _profile_lock.release()
+        return _attach_summary(response, summary)
+
+    return wrapper
+
+
+def load_summary(profile_id):
+    path = profile_path(profile_id, 'json')
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def stats_text(profile_id, limit=60):
+    """Profile completo em texto (ordenado por tempo acumulado)"""
+    buffer = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id, 'prof'), stream=buffer)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return buffer.getvalue()
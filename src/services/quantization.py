@@ -0,0 +1,230 @@
+"""
+Variantes quantizadas do modelo e comparação com o FP32.
+
+INT8 no onnxruntime usa quantização estática calibrada com as imagens de
+QUANT_CALIBRATION_DIR (ou dinâmica, se a pasta não for informada); no
+OpenVINO a calibração é feita pela própria exportação da ultralytics.
+
+Comparação de variantes (cada uma roda em um processo separado para que
+latência e memória não se misturem):
+
+    python -m src.services.quantization --variant onnxruntime:int8 \\
+        --variant openvino:int8 pasta/de/imagens
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from src.services.backends import match_detections
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_images(image_dir):
+    return [
+        os.path.join(image_dir, name) for name in sorted(os.listdir(image_dir))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def calibration_dataset_yaml(calibration_dir, names):
+    """Gera o YAML de dataset que a exportação INT8 da ultralytics exige"""
+    if not calibration_dir or not os.path.isdir(calibration_dir):
+        raise ValueError("QUANT_CALIBRATION_DIR deve apontar para uma pasta de imagens de calibração")
+
+    import yaml
+
+    dataset = {
+        'path': os.path.abspath(calibration_dir),
+        'train': '.',
+        'val': '.',
+        'names': dict(names),
+    }
+    fd, path = tempfile.mkstemp(suffix='.yaml', prefix='calibration_')
+    with os.fdopen(fd, 'w') as f:
+        yaml.safe_dump(dataset, f, allow_unicode=True)
+    return path
+
+
+def _letterbox(path, imgsz):
+    """Mesmo pré-processamento da ultralytics: redimensiona, preenche com cinza, NCHW/255"""
+    img = Image.open(path).convert('RGB')
+    scale = imgsz / max(img.size)
+    resized = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))))
+    canvas = Image.new('RGB', (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(resized, ((imgsz - resized.width) // 2, (imgsz - resized.height) // 2))
+    array = np.asarray(canvas, dtype=np.float32) / 255.0
+    return array.transpose(2, 0, 1)[np.newaxis]
+
+
+def quantize_onnx(fp32_path, int8_path, calibration_dir=None, imgsz=640):
+    """Quantiza um ONNX FP32 para INT8 (estática se houver imagens de calibração)"""
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    )
+
+    if not calibration_dir:
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+        return int8_path
+
+    image_paths = list_images(calibration_dir)
+    if not image_paths:
+        raise ValueError(f"Nenhuma imagem de calibração em {calibration_dir}")
+
+    input_name = InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class _CalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(image_paths)
+
+        def get_next(self):
+            path = next(self._paths, None)
+            return None if path is None else {input_name: _letterbox(path, imgsz)}
+
+    quantize_static(
+        fp32_path, int8_path, _CalibrationReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8
+    )
+    return int8_path
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_variant(backend, precision, image_paths):
+    """Carrega uma variante e mede detecções, latência e memória (roda em processo próprio)"""
+    from src.services.yolo_service import YOLODamageService
+
+    rss_start = _rss_mb()
+    started = time.perf_counter()
+    service = YOLODamageService(backend=backend, precision=precision)
+    # O warm-up do serviço não entra no tempo de carga
+    load_seconds = time.perf_counter() - started - service.startup.get('warmup_seconds', 0)
+    if service.model is None:
+        raise Exception(f"Modelo não carregado ({backend}/{precision})")
+    rss_loaded = _rss_mb()
+
+    arrays = [service.prepare_image(path).array for path in image_paths]
+    service._predict(arrays[:1])  # aquecimento
+
+    detections = []
+    latencies = []
+    for img_array in arrays:
+        started = time.perf_counter()
+        detections.append(service.class_table.to_dicts(service._predict([img_array])[0]))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'backend': backend,
+        'precision': precision,
+        'detections': detections,
+        'load_seconds': round(load_seconds, 3),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 2),
+            'p50': round(statistics.median(latencies), 2),
+            'max': round(max(latencies), 2),
+        },
+        'rss_mb': {
+            'model': round(rss_loaded - rss_start, 1) if rss_start is not None else None,
+            'loaded': round(rss_loaded, 1) if rss_loaded is not None else None,
+            'peak': round(_peak_rss_mb(), 1),
+        },
+    }
+
+
+def run_variant(backend, precision, image_paths):
+    import multiprocessing
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_run_variant, (backend, precision, image_paths))
+
+
+def accuracy_against_reference(reference, candidate, iou_threshold=0.5):
+    """Precisão/recall por classe e IoU médio das caixas casadas, tomando o FP32 como verdade"""
+    per_class = {}
+    ious = []
+
+    def counts(class_name):
+        return per_class.setdefault(class_name, {'tp': 0, 'fp': 0, 'fn': 0})
+
+    for ref_detections, cand_detections in zip(reference, candidate):
+        pairs, missing, extra = match_detections(ref_detections, cand_detections, iou_threshold)
+        for ref, _, iou in pairs:
+            counts(ref['class'])['tp'] += 1
+            ious.append(iou)
+        for ref in missing:
+            counts(ref['class'])['fn'] += 1
+        for cand in extra:
+            counts(cand['class'])['fp'] += 1
+
+    for class_counts in per_class.values():
+        tp, fp, fn = class_counts['tp'], class_counts['fp'], class_counts['fn']
+        class_counts['precision'] = round(tp / (tp + fp), 4) if tp + fp else 1.0
+        class_counts['recall'] = round(tp / (tp + fn), 4) if tp + fn else 1.0
+
+    return {
+        'per_class': per_class,
+        'mean_iou': round(statistics.mean(ious), 4) if ious else None,
+    }
+
+
+def compare_variants(image_paths, variants, iou_threshold=0.5):
+    """Roda o FP32 (PyTorch) e cada variante, e monta o relatório lado a lado"""
+    reference = run_variant('torch', 'fp32', image_paths)
+    report = [{key: value for key, value in reference.items() if key != 'detections'}]
+
+    for backend, precision in variants:
+        result = run_variant(backend, precision, image_paths)
+        entry = {key: value for key, value in result.items() if key != 'detections'}
+        entry['accuracy'] = accuracy_against_reference(
+            reference['detections'], result['detections'], iou_threshold
+        )
+        entry['speedup'] = round(reference['latency_ms']['mean'] / result['latency_ms']['mean'], 2)
+        report.append(entry)
+
+    return report
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Compara variantes quantizadas com o modelo FP32')
+    parser.add_argument('--variant', action='append', required=True,
+                        help='backend:precisão, por exemplo onnxruntime:int8')
+    parser.add_argument('--iou', type=float, default=0.5)
+    parser.add_argument('image_dir')
+    args = parser.parse_args(argv)
+
+    variants = [
+        tuple(variant.split(':', 1)) if ':' in variant else (variant, 'fp32')
+        for variant in args.variant
+    ]
+    report = compare_variants(list_images(args.image_dir), variants, args.iou)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.services.postprocessing import Detections
+
+
+class ResultCache:
+    """
+    Cache de detecções (Detections) endereçado pelo conteúdo da imagem decodificada.
+
+    A chave combina o hash dos pixels com a versão do modelo e os parâmetros
+    de inferência. Guarda apenas as detecções brutas (nunca imagens), em um
+    LRU com TTL na memória e, opcionalmente, em um SQLite que sobrevive a
+    reinícios.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=3600, disk_path=None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._disk = None
+        self._writes = 0
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path):
+        directory = os.path.dirname(disk_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+        self._disk.execute('PRAGMA journal_mode=WAL')
+        self._disk.execute(
+            'CREATE TABLE IF NOT EXISTS detection_cache ('
+            'key TEXT PRIMARY KEY, detections TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+        self._disk.execute(
+            'CREATE INDEX IF NOT EXISTS ix_detection_cache_created_at ON detection_cache (created_at)'
+        )
+        self._disk.commit()
+
+    @staticmethod
+    def make_key(img_array, model_version, params=None):
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f'{img_array.shape}|{img_array.dtype}|{model_version}|'.encode())
+        digest.update(json.dumps(params or {}, sort_keys=True).encode())
+        digest.update(memoryview(img_array if img_array.flags.c_contiguous else img_array.copy()).cast('B'))
+        return digest.hexdigest()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, detections = entry
+                if not self._expired(created_at, now):
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return detections
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    'SELECT detections, created_at FROM detection_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    detections = Detections.from_payload(json.loads(row[0]))
+                    self._remember(key, row[1], detections)
+                    self._stats['disk_hits'] += 1
+                    return detections
+
+            self._stats['misses'] += 1
+            return None
+
+    def _remember(self, key, created_at, detections):
+        self._entries[key] = (created_at, detections)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def set(self, key, detections):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, detections)
+            if self._disk is not None:
+                self._disk.execute(
+                    'INSERT OR REPLACE INTO detection_cache (key, detections, created_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(detections.to_payload()), now)
+                )
+                self._writes += 1
+                if self.ttl_seconds > 0 and self._writes % 100 == 0:
+                    self._disk.execute(
+                        'DELETE FROM detection_cache WHERE created_at < ?', (now - self.ttl_seconds,)
+                    )
+                self._disk.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['disk_enabled'] = self._disk is not None
+        return stats
@@ -0,0 +1,108 @@
+"""
+Projeção e serialização das respostas de detecção.
+
+fields escolhe as seções da resposta; view=compact devolve por padrão só
+detecções, resumo e processing_info, com as listas de detecções e danos em
+forma de colunas (arrays paralelos, caixas em pixels inteiros). O
+OrjsonProvider troca o json da stdlib pelo orjson quando ele está instalado,
+mantendo a mesma representação dos floats (a menor que volta ao mesmo valor).
+"""
+from flask.json.provider import DefaultJSONProvider
+
+VIEWS = ('full', 'compact')
+
+# Seções que fields pode escolher; as demais chaves (success, error, imagem
+# anotada, image_index...) sempre vão na resposta
+SECTIONS = (
+    'detections', 'damage_analysis', 'summary', 'full_report', 'processing_info',
+    'consolidated_report', 'video_info', 'cache_hit', 'tiling'
+)
+COMPACT_SECTIONS = ('detections', 'summary', 'processing_info', 'consolidated_report', 'video_info')
+COLUMNAR_LISTS = ('detections', 'damage_analysis', 'damages')
+
+
+def parse_fields(fields, view):
+    """
+    Valida fields (lista separada por vírgulas) e view.
+
+    Retorna (seções ou None para todas, columnar); ValueError se inválidos.
+    """
+    view = view or 'full'
+    if view not in VIEWS:
+        raise ValueError(f'view deve ser um de: {", ".join(VIEWS)}')
+    if fields:
+        sections = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in sections if field not in SECTIONS]
+        if unknown:
+            raise ValueError(f'fields desconhecidos: {", ".join(unknown)} (use {", ".join(SECTIONS)})')
+    else:
+        sections = COMPACT_SECTIONS if view == 'compact' else None
+    return (None if sections is None else frozenset(sections)), view == 'compact'
+
+
+def columnar(rows):
+    """Lista de dicionários em arrays paralelos; bbox em pixels inteiros"""
+    if not rows:
+        return {}
+    columns = {key: [row.get(key) for row in rows] for key in rows[0]}
+    if 'bbox' in columns:
+        columns['bbox'] = [[int(round(coord)) for coord in bbox] for bbox in columns['bbox']]
+    return columns
+
+
+def project(payload, sections=None, compact=False):
+    """Aplica a projeção à resposta (e a cada item de results, nos lotes)"""
+    if not isinstance(payload, dict) or (sections is None and not compact):
+        return payload
+
+    projected = {}
+    for key, value in payload.items():
+        if sections is not None and key in SECTIONS and key not in sections:
+            continue
+        if key == 'results' and isinstance(value, list):
+            value = [project(item, sections, compact) for item in value]
+        elif compact and key in COLUMNAR_LISTS and isinstance(value, list):
+            value = columnar(value)
+        elif compact and key == 'full_report' and isinstance(value, dict):
+            value = dict(value, damages=columnar(value.get('damages') or []))
+        projected[key] = value
+    return projected
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Provider JSON do Flask com orjson: mesmas chaves ordenadas e mesmo
+    tratamento de datas, UUIDs e dataclasses do provider padrão (via
+    default). A saída é UTF-8 em vez de escapes \\uXXXX.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        import orjson
+
+        self._orjson = orjson
+        self._options = (
+            orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+
+    def dumps(self, obj, **kwargs):
+        options = self._options
+        if kwargs.get('indent'):
+            options |= self._orjson.OPT_INDENT_2
+        try:
+            return self._orjson.dumps(obj, default=self.default, option=options).decode('utf-8')
+        except TypeError:
+            # Inteiros fora de 64 bits e afins: volta para a stdlib
+            return super().dumps(obj, **kwargs)
+
+
+def install_json_provider(app, encoder):
+    """Usa o orjson conforme JSON_ENCODER (auto só quando está instalado)"""
+    if encoder == 'stdlib':
+        return
+    try:
+        app.json = OrjsonProvider(app)
+    except ImportError:
+        if encoder == 'orjson':
+            print("JSON_ENCODER=orjson, mas o orjson não está instalado; usando a stdlib")
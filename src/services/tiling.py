@@ -0,0 +1,140 @@
+"""
+Inferência em tiles para fotos de alta resolução.
+
+A imagem é recortada em tiles de tile_size px com sobreposição, que passam
+pelo modelo em lotes de no máximo max_in_flight recortes (os únicos buffers
+extras em memória, além da imagem decodificada). As caixas de cada tile
+voltam para as coordenadas da imagem e as duplicadas nas áreas de
+sobreposição são juntadas por classe.
+"""
+import numpy as np
+from PIL import Image
+
+from src.services.postprocessing import Detections
+
+TILING_MODES = ('off', 'on', 'auto')
+MERGE_METHODS = ('nmm', 'nms', 'wbf')
+MATCH_METRICS = ('ios', 'iou')
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Caixas (x1, y1, x2, y2) dos tiles cobrindo a imagem; o último tile de
+    cada eixo é alinhado à borda em vez de sair da imagem.
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def box_overlap(box, boxes, metric):
+    """Sobreposição de uma caixa com várias (iou ou ios)"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if metric == 'ios':
+        denominator = np.minimum(area, areas)
+    else:
+        denominator = area + areas - intersection
+    return intersection / np.maximum(denominator, 1e-6)
+
+
+def merge_detections(detections, method='nmm', metric='ios', threshold=0.5):
+    """
+    Junta as caixas da mesma classe que se sobrepõem acima de threshold,
+    em ordem de confiança:
+    - nms: mantém só a de maior confiança
+    - nmm: uma caixa com a união do grupo (danos cortados na borda do tile)
+    - wbf: média das caixas ponderada pela confiança
+    Em nmm e wbf o grupo fica com a maior confiança.
+    """
+    if len(detections) < 2:
+        return detections
+
+    boxes, confs, classes = [], [], []
+    for class_id in np.unique(detections.cls):
+        group = detections.select(detections.cls == class_id)
+        order = np.argsort(-group.conf)
+        xyxy = group.xyxy[order]
+        conf = group.conf[order]
+        remaining = np.ones(len(conf), dtype=bool)
+
+        for i in range(len(conf)):
+            if not remaining[i]:
+                continue
+            candidates = np.flatnonzero(remaining)
+            matched = candidates[box_overlap(xyxy[i], xyxy[candidates], metric) >= threshold]
+            matched = np.union1d(matched, [i])
+            remaining[matched] = False
+
+            if method == 'nms':
+                box = xyxy[i]
+            elif method == 'wbf':
+                weights = conf[matched]
+                box = (xyxy[matched] * weights[:, None]).sum(axis=0) / weights.sum()
+            else:
+                box = np.concatenate([xyxy[matched, :2].min(axis=0), xyxy[matched, 2:].max(axis=0)])
+            boxes.append(box)
+            confs.append(conf[i])
+            classes.append(class_id)
+
+    return Detections(np.array(boxes), np.array(confs), np.array(classes))
+
+
+def predict_tiled(infer, image, tile_size, overlap=0.2, max_in_flight=8, full_frame=True,
+                  method='nmm', metric='ios', threshold=0.5):
+    """
+    Detecções da imagem PIL inteira, em coordenadas da própria imagem.
+
+    infer recebe uma lista de arrays e devolve, para cada um, as Detections
+    ou a exceção gerada (como YOLODamageService._infer).
+
+    Retorna (detecções, informações dos tiles).
+    """
+    grid = tile_grid(image.width, image.height, tile_size, overlap)
+    max_in_flight = max(1, max_in_flight)
+    parts = []
+
+    for start in range(0, len(grid), max_in_flight):
+        boxes = grid[start:start + max_in_flight]
+        crops = [np.asarray(image.crop(box)) for box in boxes]
+        for box, detections in zip(boxes, infer(crops)):
+            if isinstance(detections, Exception):
+                raise detections
+            parts.append(detections.translated(box[0], box[1]))
+        del crops
+
+    use_full_frame = full_frame and len(grid) > 1
+    if use_full_frame:
+        factor = tile_size / max(image.width, image.height)
+        size = (max(1, round(image.width * factor)), max(1, round(image.height * factor)))
+        reduced = image.resize(size, Image.BILINEAR)
+        detections = infer([np.asarray(reduced)])[0]
+        if isinstance(detections, Exception):
+            raise detections
+        parts.append(detections.scaled(image.width / size[0], image.height / size[1]))
+
+    merged = merge_detections(Detections.concatenate(parts), method, metric, threshold)
+    return merged, {
+        'tiles': len(grid),
+        'tile_size': tile_size,
+        'overlap': overlap,
+        'full_frame': use_full_frame,
+        'merge': method,
+        'raw_detections': sum(len(part) for part in parts)
+    }
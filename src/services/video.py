@@ -0,0 +1,275 @@
+"""
+Análise de vídeos de vistoria (volta ao redor do veículo).
+
+O vídeo é lido quadro a quadro (sem carregar o arquivo inteiro em memória)
+e amostrado a sample_fps; um quadro amostrado só vira keyframe quando difere
+o bastante do último keyframe (diferença média de uma miniatura em tons de
+cinza), de modo que o custo acompanha a mudança de cena e não a duração.
+Os keyframes passam pelo modelo em lotes, e um rastreador por IoU associa as
+detecções entre keyframes para que cada dano físico seja contado uma vez.
+
+Numa volta ao redor do veículo a câmera anda bastante entre dois keyframes,
+e o mesmo dano muda de lugar no quadro. O deslocamento global entre keyframes
+é estimado por correlação de fase das mesmas miniaturas usadas para escolhê-los,
+e as caixas dos rastros são movidas por ele antes do IoU.
+
+Usa o OpenCV (opencv-python, dependência da ultralytics) para decodificar.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from src.services.image_io import CHUNK_SIZE, ImageTooLarge
+from src.services.postprocessing import Detections
+from src.services.tiling import box_overlap
+
+FINGERPRINT_SIZE = 32
+
+
+def save_upload(stream, max_bytes):
+    """Copia o upload em blocos para um arquivo temporário (o OpenCV lê de um caminho)"""
+    handle, path = tempfile.mkstemp(prefix='damage-video-')
+    total = 0
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_bytes:
+                    raise ImageTooLarge(f"Vídeo excede o limite de {max_bytes // (1024 * 1024)} MB")
+                f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _fingerprint(cv2, frame):
+    small = cv2.resize(frame, (FINGERPRINT_SIZE, FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+
+def estimate_shift(previous, current):
+    """
+    Deslocamento (dx, dy) do conteúdo de previous para current, em frações
+    da largura e da altura, por correlação de fase com refinamento subpixel
+    """
+    window = np.outer(np.hanning(FINGERPRINT_SIZE), np.hanning(FINGERPRINT_SIZE)).astype(np.float32)
+    spectrum = (
+        np.fft.fft2((current - current.mean()) * window)
+        * np.conj(np.fft.fft2((previous - previous.mean()) * window))
+    )
+    spectrum /= np.abs(spectrum) + 1e-9
+    correlation = np.fft.ifft2(spectrum).real
+    peak_y, peak_x = np.unravel_index(int(np.argmax(correlation)), correlation.shape)
+
+    def refine(before, at, after, peak):
+        denominator = before - 2 * at + after
+        offset = 0.5 * (before - after) / denominator if denominator < 0 else 0.0
+        shift = peak + offset
+        # Picos além da metade da miniatura são deslocamentos negativos
+        return shift - FINGERPRINT_SIZE if shift > FINGERPRINT_SIZE / 2 else shift
+
+    n = FINGERPRINT_SIZE
+    dx = refine(correlation[peak_y, (peak_x - 1) % n], correlation[peak_y, peak_x],
+                correlation[peak_y, (peak_x + 1) % n], peak_x)
+    dy = refine(correlation[(peak_y - 1) % n, peak_x], correlation[peak_y, peak_x],
+                correlation[(peak_y + 1) % n, peak_x], peak_y)
+    return dx / n, dy / n
+
+
+def sample_keyframes(path, stats, sample_fps=2.0, min_change=0.03, max_keyframes=120, target_size=640):
+    """
+    Gera (índice do quadro, segundos, array RGB, escala, deslocamento) para
+    cada keyframe; o deslocamento (dx, dy), em pixels do quadro original, é
+    o movimento estimado da cena desde o keyframe anterior.
+
+    Os quadros fora da amostragem só são avançados (grab), sem conversão de
+    cor; os keyframes são reduzidos para o lado menor em target_size. stats
+    é preenchido com a contagem de quadros lidos, amostrados e descartados.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Não foi possível abrir o vídeo")
+
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / sample_fps)) if sample_fps > 0 else 1
+        stats.update(
+            fps=round(fps, 3),
+            width=int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            frames=0, sampled_frames=0, similar_frames=0, keyframes=0
+        )
+        previous = None
+        index = 0
+
+        while stats['keyframes'] < max_keyframes:
+            if index % step:
+                if not capture.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            index += 1
+            stats['sampled_frames'] += 1
+
+            fingerprint = _fingerprint(cv2, frame)
+            if previous is not None and np.abs(fingerprint - previous).mean() / 255 < min_change:
+                stats['similar_frames'] += 1
+                continue
+            height, width = frame.shape[:2]
+            shift = (0.0, 0.0)
+            if previous is not None:
+                dx, dy = estimate_shift(previous, fingerprint)
+                shift = (dx * width, dy * height)
+            previous = fingerprint
+            stats['keyframes'] += 1
+
+            factor = target_size / min(width, height) if target_size else 1.0
+            if factor < 1.0:
+                frame = cv2.resize(frame, (round(width * factor), round(height * factor)),
+                                   interpolation=cv2.INTER_AREA)
+            else:
+                factor = 1.0
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            yield index - 1, (index - 1) / fps, rgb, 1.0 / factor, shift
+
+        stats['frames'] = index
+        stats['duration_seconds'] = round(
+            (capture.get(cv2.CAP_PROP_FRAME_COUNT) or index) / fps, 3
+        )
+    finally:
+        capture.release()
+
+
+class DamageTracker:
+    """
+    Associa detecções de keyframes consecutivos: cada detecção continua o
+    rastro da mesma classe com maior IoU (acima de iou_threshold) com a sua
+    última caixa, movida pelo deslocamento da cena desde então. Um rastro
+    sem detecção por mais de max_age keyframes é encerrado, e só rastros
+    vistos em min_hits keyframes viram danos (com 1, qualquer detecção conta).
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=3, min_hits=1):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.active = []
+        self.finished = []
+        self.keyframes = 0
+
+    def update(self, detections, frame_index, timestamp, shift=(0.0, 0.0)):
+        """
+        detections e shift (movimento da cena desde o keyframe anterior) em
+        coordenadas do quadro original
+        """
+        self.keyframes += 1
+        if shift != (0.0, 0.0):
+            offset = np.array([shift[0], shift[1], shift[0], shift[1]], dtype=np.float32)
+            for track in self.active:
+                track['box'] = track['box'] + offset
+        matched = set()
+        for i in np.argsort(-detections.conf):
+            box = detections.xyxy[i]
+            class_id = int(detections.cls[i])
+            conf = float(detections.conf[i])
+
+            candidates = [
+                track for track in self.active
+                if track['cls'] == class_id and id(track) not in matched
+            ]
+            track = None
+            if candidates:
+                overlaps = box_overlap(box, np.array([candidate['box'] for candidate in candidates]), 'iou')
+                best = int(np.argmax(overlaps))
+                if overlaps[best] >= self.iou_threshold:
+                    track = candidates[best]
+
+            if track is None:
+                track = {'cls': class_id, 'hits': 0, 'misses': 0, 'conf': -1.0,
+                         'first_frame': frame_index, 'first_timestamp': timestamp}
+                self.active.append(track)
+            matched.add(id(track))
+            track['box'] = box
+            track['hits'] += 1
+            track['misses'] = 0
+            track['last_frame'] = frame_index
+            if conf > track['conf']:
+                # A melhor vista do dano é a que vai para o relatório
+                track.update(conf=conf, best_box=box, best_frame=frame_index, best_timestamp=timestamp)
+
+        still_active = []
+        for track in self.active:
+            if id(track) not in matched:
+                track['misses'] += 1
+            if track['misses'] > self.max_age:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        self.active = still_active
+
+    def tracks(self):
+        """Rastros confirmados; com poucos keyframes, min_hits não passa do total"""
+        min_hits = min(self.min_hits, self.keyframes)
+        return [track for track in self.finished + self.active if track['hits'] >= min_hits]
+
+
+def track_video(infer, path, batch_size, tracker, sample_fps=2.0, min_change=0.03,
+                max_keyframes=120, target_size=640):
+    """
+    Roda o modelo nos keyframes do vídeo, em lotes de batch_size (os únicos
+    quadros em memória), alimentando o rastreador em ordem.
+
+    infer recebe uma lista de arrays e devolve Detections ou a exceção de
+    cada um (como YOLODamageService._infer). Retorna as informações do vídeo.
+    """
+    stats = {}
+    raw_detections = 0
+    failed = 0
+    batch = []
+    # Movimento de keyframes que falharam, somado ao do próximo
+    pending = (0.0, 0.0)
+
+    def flush():
+        nonlocal raw_detections, failed, pending
+        for (frame_index, timestamp, _, scale, shift), detections in zip(batch, infer([item[2] for item in batch])):
+            shift = (pending[0] + shift[0], pending[1] + shift[1])
+            if isinstance(detections, Exception):
+                failed += 1
+                pending = shift
+                continue
+            pending = (0.0, 0.0)
+            raw_detections += len(detections)
+            tracker.update(detections.scaled(scale, scale), frame_index, timestamp, shift)
+        batch.clear()
+
+    for keyframe in sample_keyframes(path, stats, sample_fps, min_change, max_keyframes, target_size):
+        batch.append(keyframe)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    stats['failed_keyframes'] = failed
+    stats['raw_detections'] = raw_detections
+    return stats
+
+
+def tracks_to_detections(tracks):
+    """Uma detecção por dano rastreado, com a caixa da melhor vista"""
+    if not tracks:
+        return Detections.empty()
+    return Detections(
+        [track['best_box'] for track in tracks],
+        [track['conf'] for track in tracks],
+        [track['cls'] for track in tracks]
+    )
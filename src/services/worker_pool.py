@@ -0,0 +1,265 @@
+"""
+Pool de processos de inferência.
+
+Cada worker carrega o próprio modelo, com um número fixo de threads do
+torch, e recebe as imagens já decodificadas por memória compartilhada
+(multiprocessing.shared_memory): o processo web copia os pixels uma vez
+para o segmento e envia apenas o nome, formato e offset de cada imagem.
+De volta vêm só os arrays de detecções, que são pequenos.
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.services.postprocessing import Detections
+
+WORKER_NAME_PREFIX = 'inference-worker-'
+
+
+def is_inference_worker():
+    """
+    Indica se o processo atual é um worker do pool.
+
+    Com spawn, o filho reimporta o módulo principal (src/main.py) antes de
+    rodar o worker; o nome do processo já está definido nesse momento e
+    permite que o app não carregue o modelo nem inicie a fila de jobs ali.
+    """
+    return multiprocessing.current_process().name.startswith(WORKER_NAME_PREFIX)
+
+
+def _worker_main(worker_id, model_path, backend, precision, calibration_dir, threads,
+                 requests_queue, results_queue):
+    """Laço principal de um worker: carrega o modelo e atende pedidos até receber None"""
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from src.services.backends import load_backend
+
+    try:
+        model = load_backend(model_path, backend, precision, calibration_dir=calibration_dir)
+    except Exception as e:
+        results_queue.put(('failed', worker_id, str(e)))
+        return
+    results_queue.put(('ready', worker_id, dict(model.names)))
+
+    while True:
+        message = requests_queue.get()
+        if message is None:
+            return
+
+        request_id, shm_name, layout, model_kwargs = message
+        shm = None
+        try:
+            # Com spawn, o worker usa o mesmo resource_tracker do processo web, que
+            # continua sendo o único a remover o segmento (unlink)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            arrays = [
+                np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+                for shape, dtype, offset in layout
+            ]
+            results = model(arrays if len(arrays) > 1 else arrays[0], **model_kwargs)
+            payload = []
+            for result in results:
+                detections = Detections.from_result(result)
+                payload.append((detections.xyxy, detections.conf, detections.cls))
+            del arrays, results
+            results_queue.put(('result', request_id, payload))
+        except Exception as e:
+            results_queue.put(('error', request_id, str(e)))
+        finally:
+            if shm is not None:
+                shm.close()
+
+
+class _Worker:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.requests = None
+        self.inflight = 0
+        self.processed = 0
+        self.restarts = 0
+        self.started_at = None
+
+
+class InferenceWorkerPool:
+    """
+    N processos donos do modelo, com reinício automático em caso de queda.
+
+    submit() escolhe o worker com menos pedidos em andamento e devolve um
+    Future com a lista de Detections (uma por imagem); model_kwargs vão na
+    chamada ao modelo (imgsz, conf, iou, max_det).
+    """
+
+    def __init__(self, model_path, backend, precision, workers=2, threads_per_worker=1,
+                 calibration_dir=None, startup_timeout=300):
+        self._context = multiprocessing.get_context('spawn')
+        self._args = (model_path, backend, precision, calibration_dir, max(1, threads_per_worker))
+        self._results = self._context.Queue()
+        self._workers = [_Worker(i) for i in range(max(1, workers))]
+        self._inflight = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.names = None
+        self.threads_per_worker = max(1, threads_per_worker)
+
+        for worker in self._workers:
+            self._start(worker)
+        self._wait_ready(startup_timeout)
+
+        threading.Thread(target=self._collect, name='inference-pool-results', daemon=True).start()
+        threading.Thread(target=self._monitor, name='inference-pool-monitor', daemon=True).start()
+
+    def _start(self, worker):
+        worker.requests = self._context.Queue()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.worker_id,) + self._args + (worker.requests, self._results),
+            name=f'{WORKER_NAME_PREFIX}{worker.worker_id}',
+            daemon=True
+        )
+        worker.process.start()
+        worker.started_at = time.time()
+
+    def _wait_ready(self, timeout):
+        pending = {worker.worker_id for worker in self._workers}
+        deadline = time.monotonic() + timeout
+        while pending:
+            try:
+                kind, worker_id, data = self._results.get(timeout=1)
+            except queue.Empty:
+                dead = [w.worker_id for w in self._workers if w.worker_id in pending and not w.process.is_alive()]
+                if dead or time.monotonic() > deadline:
+                    self.close()
+                    raise Exception(f"Workers de inferência não ficaram prontos (encerrados: {dead})")
+                continue
+            if kind == 'failed':
+                self.close()
+                raise Exception(f"Worker {worker_id} falhou ao carregar o modelo: {data}")
+            if kind == 'ready':
+                self.names = data
+                pending.discard(worker_id)
+
+    def submit(self, img_arrays, model_kwargs=None):
+        future = Future()
+        arrays = [np.ascontiguousarray(img_array) for img_array in img_arrays]
+        total = sum(array.nbytes for array in arrays)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, total))
+
+        layout = []
+        offset = 0
+        for array in arrays:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=offset)[...] = array
+            layout.append((array.shape, array.dtype.str, offset))
+            offset += array.nbytes
+
+        with self._lock:
+            request_id = next(self._ids)
+            # Menor fila; no empate, alterna entre os workers
+            offset = request_id % len(self._workers)
+            worker = min(self._workers[offset:] + self._workers[:offset], key=lambda w: w.inflight)
+            worker.inflight += 1
+            self._inflight[request_id] = (worker, future, shm)
+            worker.requests.put((request_id, shm.name, layout, model_kwargs or {}))
+        return future
+
+    def predict(self, img_arrays, model_kwargs=None):
+        return self.submit(img_arrays, model_kwargs).result()
+
+    def _finish(self, request_id):
+        with self._lock:
+            entry = self._inflight.pop(request_id, None)
+            if entry is None:
+                return None
+            worker, future, shm = entry
+            worker.inflight -= 1
+            worker.processed += 1
+        shm.close()
+        shm.unlink()
+        return future
+
+    def _collect(self):
+        while not self._closed:
+            try:
+                kind, request_id, data = self._results.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+
+            if kind == 'failed':
+                print(f"Worker de inferência {request_id} falhou ao recarregar o modelo: {data}")
+            if kind in ('ready', 'failed'):
+                continue
+            future = self._finish(request_id)
+            if future is None:
+                continue
+            if kind == 'result':
+                future.set_result([Detections(xyxy, conf, cls) for xyxy, conf, cls in data])
+            else:
+                future.set_exception(Exception(data))
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(1)
+            for worker in self._workers:
+                if self._closed or worker.process.is_alive():
+                    continue
+
+                print(f"Worker de inferência {worker.worker_id} caiu (exit {worker.process.exitcode}); reiniciando")
+                with self._lock:
+                    lost = [rid for rid, (owner, _, _) in self._inflight.items() if owner is worker]
+                for request_id in lost:
+                    future = self._finish(request_id)
+                    if future is not None:
+                        future.set_exception(Exception("Worker de inferência caiu durante o processamento"))
+                worker.restarts += 1
+                self._start(worker)
+
+    def queue_depth(self):
+        return len(self._inflight)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': [
+                    {
+                        'worker_id': worker.worker_id,
+                        'pid': worker.process.pid,
+                        'alive': worker.process.is_alive(),
+                        'queue_depth': worker.inflight,
+                        'processed': worker.processed,
+                        'restarts': worker.restarts,
+                        'uptime_seconds': round(time.time() - worker.started_at, 1)
+                    }
+                    for worker in self._workers
+                ],
+                'threads_per_worker': self.threads_per_worker,
+                'inflight': len(self._inflight)
+            }
+
+    def close(self):
+        self._closed = True
+        for worker in self._workers:
+            try:
+                worker.requests.put(None)
+            except Exception:
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
@@ -1,19 +1,45 @@
 import os
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-import requests
+import io
+import time
 from datetime import datetime
 import json
 
+from src import config
+from src.services.backends import load_backend
+from src.services.batching import InferenceScheduler
+from src.services import admission, inference_params, metrics
+from src.services.image_io import PreparedImage, open_image, prepare_image
+from src.services.model_store import ensure_model, refetch_model
+from src.services.postprocessing import ClassTable, Detections
+from src.services.result_cache import ResultCache
+from src.services.tiling import predict_tiled
+from src.services.video import DamageTracker, track_video, tracks_to_detections
+from src.services.worker_pool import InferenceWorkerPool, is_inference_worker
+
 os.environ['OPENCV_HEADLESS'] = '1'
 os.environ['DISPLAY'] = ''
 os.environ['QT_QPA_PLATFORM'] = 'offscreen'
 
 class YOLODamageService:
     
-    def __init__(self):
+    def __init__(self, backend=None, precision=None, model=None):
+        """
+        model: modelo já carregado (ex.: o modelo sintético dos benchmarks);
+        dispensa o arquivo de pesos e o pool de processos
+        """
         self.model = None
-        self.model_path = "car_damage_best.pt"
+        self.model_path = config.MODEL_PATH
+        self.backend = backend or config.INFERENCE_BACKEND
+        self.precision = precision or config.MODEL_PRECISION
+        self.max_inference_batch_size = max(1, config.MAX_INFERENCE_BATCH_SIZE)
+        self.scheduler = None
+        self.worker_pool = None
+        self.result_cache = None
+        self.class_table = None
+        self.model_sha256 = None
+        self.startup = {'state': 'loading'}
         self.damage_config = {
             'severity_map': {
                 'shattered_glass': 'Severo',
@@ -56,48 +82,186 @@ class YOLODamageService:
                 'crack': (128, 0, 128)
             }
         }
-        self._load_model()
+        if model is not None:
+            self.model = model
+            self.class_table = ClassTable(model.names, self.damage_config)
+            self.startup.update(state='loaded', load_seconds=0.0)
+            self.start()
+        elif not is_inference_worker():
+            self._load_model()
+            if not config.MODEL_PRELOAD:
+                self.start()
     
-    def _download_model(self):
-        if os.path.exists(self.model_path):
-            return True
-            
-        model_url = "https://github.com/Vamap91/YOLOProject/releases/download/v2.0.0/car_damage_best.pt"
-        
+    def _load_model(self):
+        """Garante o arquivo de pesos e carrega o modelo no processo atual"""
+        started = time.perf_counter()
         try:
-            print("Baixando modelo YOLO...")
-            response = requests.get(model_url, stream=True, timeout=60)
-            response.raise_for_status()
+            self.model_sha256 = ensure_model(
+                self.model_path, config.MODEL_URL, config.MODEL_SHA256,
+                offline=config.MODEL_OFFLINE, timeout=config.MODEL_DOWNLOAD_TIMEOUT
+            )
+            self.startup['artifact_seconds'] = round(time.perf_counter() - started, 3)
             
-            with open(self.model_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            # Com o pool de processos, os pesos são carregados pelos workers em start()
+            if config.INFERENCE_WORKERS <= 0:
+                self.model = self._load_weights()
+                # Tabelas de severidade/custo/localização por id de classe
+                self.class_table = ClassTable(self.model.names, self.damage_config)
+                print(f"Modelo YOLO carregado com sucesso! (backend: {self.backend}, {self.precision})")
             
-            print("Modelo baixado com sucesso!")
-            return True
+            self.startup['load_seconds'] = round(time.perf_counter() - started, 3)
+            self.startup['state'] = 'loaded'
             
         except Exception as e:
-            print(f"Erro ao baixar o modelo: {e}")
-            return False
+            print(f"Erro ao carregar o modelo: {e}")
+            self.model = None
+            self.startup.update(state='failed', error=str(e))
     
-    def _load_model(self):
+    def _load_weights(self):
+        """
+        Carrega o modelo no backend configurado. Sem MODEL_SHA256 o arquivo
+        só foi conferido por não estar vazio: se ele não carrega, é baixado
+        de novo uma vez.
+        """
         try:
-            if not self._download_model():
-                raise Exception("Falha ao baixar o modelo")
-            
-            from ultralytics import YOLO
-            self.model = YOLO(self.model_path)
-            print("Modelo YOLO carregado com sucesso!")
-            
+            return load_backend(
+                self.model_path, self.backend, self.precision,
+                calibration_dir=config.QUANT_CALIBRATION_DIR
+            )
         except Exception as e:
-            print(f"Erro ao carregar o modelo: {e}")
-            self.model = None
+            if config.MODEL_SHA256 or config.MODEL_OFFLINE:
+                raise
+            print(f"Erro ao carregar o modelo ({e})")
+            self.model_sha256 = refetch_model(self.model_path, config.MODEL_URL, config.MODEL_DOWNLOAD_TIMEOUT)
+        return load_backend(
+            self.model_path, self.backend, self.precision,
+            calibration_dir=config.QUANT_CALIBRATION_DIR
+        )
+    
+    def start(self):
+        """
+        Inicia o que não sobrevive a um fork (processos de inferência, thread
+        do agendador, conexão do cache em disco) e aquece o modelo.
+        
+        Com MODEL_PRELOAD, é chamado em cada worker do gunicorn após o fork;
+        chamadas repetidas não têm efeito.
+        """
+        if self.startup['state'] != 'loaded':
+            return
+        self.startup['state'] = 'starting'
+        
+        if config.INFERENCE_WORKERS > 0 and self.model is None:
+            started = time.perf_counter()
+            try:
+                # O pool expõe names como o modelo; a inferência passa por _predict
+                self.worker_pool = InferenceWorkerPool(
+                    self.model_path, self.backend, self.precision,
+                    workers=config.INFERENCE_WORKERS,
+                    threads_per_worker=config.INFERENCE_WORKER_THREADS
+                    or max(1, (os.cpu_count() or 1) // config.INFERENCE_WORKERS),
+                    calibration_dir=config.QUANT_CALIBRATION_DIR
+                )
+                self.model = self.worker_pool
+                self.class_table = ClassTable(self.model.names, self.damage_config)
+                print(f"Modelo YOLO carregado com sucesso! (backend: {self.backend}, {self.precision}, "
+                      f"{config.INFERENCE_WORKERS} processos)")
+            except Exception as e:
+                print(f"Erro ao carregar o modelo: {e}")
+                self.worker_pool = None
+                self.startup.update(state='failed', error=str(e))
+                return
+            self.startup['load_seconds'] += round(time.perf_counter() - started, 3)
+        
+        # Com o pool de processos, cada worker já tem a própria fila
+        if self.worker_pool is None and config.INFERENCE_BATCH_WINDOW_MS > 0:
+            self.scheduler = InferenceScheduler(
+                self._predict,
+                max_batch_size=self.max_inference_batch_size,
+                window_ms=config.INFERENCE_BATCH_WINDOW_MS
+            )
+        
+        if config.RESULT_CACHE_ENABLED:
+            self.result_cache = ResultCache(
+                max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.RESULT_CACHE_TTL_SECONDS,
+                disk_path=config.RESULT_CACHE_DISK_PATH
+            )
+        
+        metrics.INFERENCE_QUEUED.set_function(self.queue_depth)
+        metrics.MODEL_INFO.set_function(
+            lambda: {(os.path.basename(self.model_path), self.backend, self.precision): 1}
+        )
+        
+        self.warm_up()
+    
+    def queue_depth(self):
+        """Pedidos aguardando o modelo no agendador ou nos processos de inferência"""
+        if self.scheduler is not None:
+            return self.scheduler.queue_depth()
+        if self.worker_pool is not None:
+            return self.worker_pool.queue_depth()
+        return 0
+    
+    @staticmethod
+    def _warmup_shapes():
+        shapes = []
+        for shape in config.WARMUP_SHAPES.split(','):
+            try:
+                width, height = (int(side) for side in shape.lower().split('x'))
+                shapes.append((width, height))
+            except ValueError:
+                print(f"Forma de warm-up inválida ignorada: {shape!r}")
+        return shapes
+    
+    def warm_up(self):
+        """
+        Roda WARMUP_RUNS inferências em cada forma de WARMUP_SHAPES, com uma
+        imagem e com um lote cheio, para que a inicialização preguiçosa do
+        backend não caia na primeira requisição real.
+        """
+        self.startup['state'] = 'warming'
+        started = time.perf_counter()
+        # Com o pool, o lote cheio se espalha por todos os workers
+        batch_images = self.max_inference_batch_size * (config.INFERENCE_WORKERS if self.worker_pool else 1)
+        inferences = 0
+        try:
+            for _ in range(max(0, config.WARMUP_RUNS)):
+                for width, height in self._warmup_shapes():
+                    frame = np.zeros((height, width, 3), dtype=np.uint8)
+                    for count in (1, batch_images):
+                        call_started = time.perf_counter()
+                        self._predict([frame] * count)
+                        if inferences == 0:
+                            self.startup['first_inference_seconds'] = round(time.perf_counter() - call_started, 3)
+                        inferences += 1
+        except Exception as e:
+            print(f"Erro no warm-up do modelo: {e}")
+            self.startup.update(state='failed', error=f"warm-up: {e}")
+            return
+        
+        self.startup['warmup_seconds'] = round(time.perf_counter() - started, 3)
+        self.startup['warmup_inferences'] = inferences
+        self.startup['state'] = 'ready'
+        print(f"Modelo pronto ({inferences} inferências de warm-up em {self.startup['warmup_seconds']}s)")
+    
+    @property
+    def ready(self):
+        return self.startup['state'] == 'ready'
+    
+    def resolve_params(self, profile=None, overrides=None):
+        """
+        Parâmetros de inferência do perfil pedido (auto considera a fila do
+        modelo e a de admissão); ValueError se inválidos.
+        """
+        return inference_params.resolve(
+            profile, overrides, self.backend,
+            queue_depth=self.queue_depth() + admission.controller.waiting
+        )
     
     def _draw_annotations_pil(self, image_array, detections):
-        """Desenha anotações usando PIL ao invés do OpenCV"""
+        """Desenha anotações usando PIL ao invés do OpenCV (na própria imagem PIL recebida)"""
         if isinstance(image_array, np.ndarray):
-            img = Image.fromarray(image_array.astype('uint8'))
+            img = Image.fromarray(image_array if image_array.dtype == np.uint8 else image_array.astype('uint8'))
         else:
             img = image_array
         
@@ -128,71 +292,394 @@ class YOLODamageService:
             else:
                 draw.text((x1, y1-15), label, fill=color)
         
-        return np.array(img)
+        return img
+    
+    def prepare_image(self, image_data, tiling=None, params=None):
+        """
+        Decodifica a imagem já reduzida para perto do tamanho de entrada do
+        modelo (o do perfil em params) ou, com tiling (on/auto, padrão
+        TILING_MODE), na resolução cheia limitada a TILING_MAX_MEGAPIXELS
+        para a inferência em tiles
+        """
+        if isinstance(image_data, PreparedImage):
+            return image_data
+        with metrics.stage('decode'):
+            mode = tiling or config.TILING_MODE
+            if mode != 'off' and not isinstance(image_data, np.ndarray):
+                # Só o cabeçalho, para decidir pelo tamanho antes de decodificar
+                image_data = open_image(image_data)
+            if self._use_tiling(image_data, mode):
+                prepared = prepare_image(
+                    image_data, max_pixels=int(config.TILING_MAX_MEGAPIXELS * 1e6), tiled=True
+                )
+            else:
+                target_size = params.decode_size() if params is not None else config.DECODE_TARGET_SIZE
+                prepared = prepare_image(image_data, target_size)
+        metrics.IMAGE_MEGAPIXELS.observe(prepared.original_size[0] * prepared.original_size[1] / 1e6)
+        return prepared
+    
+    @staticmethod
+    def _use_tiling(source, mode):
+        if mode == 'off':
+            return False
+        if mode == 'on':
+            return True
+        if isinstance(source, np.ndarray):
+            width, height = source.shape[1], source.shape[0]
+        else:
+            width, height = source.size
+        return width * height / 1e6 >= config.TILING_AUTO_MIN_MEGAPIXELS
+    
+    def _detect_tiled(self, prepared, params=None):
+        """
+        Detecções de uma imagem em tiles, passando pelo agendador ou pelo pool
+        como as demais. Não usa o cache de resultados: a chave exigiria o hash
+        da imagem em resolução cheia.
+        
+        Retorna (detecções, informações dos tiles).
+        """
+        return predict_tiled(
+            lambda img_arrays: self._infer(img_arrays, params), prepared.image, config.TILE_SIZE,
+            overlap=config.TILE_OVERLAP,
+            max_in_flight=config.TILE_MAX_IN_FLIGHT,
+            full_frame=config.TILE_FULL_FRAME,
+            method=config.TILE_MERGE,
+            metric=config.TILE_MATCH_METRIC,
+            threshold=config.TILE_MATCH_THRESHOLD
+        )
+    
+    def _extract_detections(self, result):
+        return Detections.from_result(result)
+    
+    def _predict(self, img_arrays, params=None):
+        """
+        Executa o modelo em lotes de até max_inference_batch_size imagens
+        (sem params, com os valores padrão do modelo)
+        """
+        model_kwargs = params.model_kwargs() if params is not None else {}
+        if self.worker_pool is not None:
+            with metrics.stage('inference'):
+                return [
+                    detections
+                    for future in self._submit_chunks(img_arrays, model_kwargs)
+                    for detections in future.result()
+                ]
+        
+        detections = []
+        for start in range(0, len(img_arrays), self.max_inference_batch_size):
+            chunk = img_arrays[start:start + self.max_inference_batch_size]
+            with metrics.stage('inference'):
+                results = self.model(chunk if len(chunk) > 1 else chunk[0], **model_kwargs)
+            self._observe_model_speed(results, len(chunk))
+            detections.extend(self._extract_detections(result) for result in results)
+        return detections
+    
+    @staticmethod
+    def _observe_model_speed(results, batch_size):
+        """Registra pré-processamento, inferência e NMS medidos pela ultralytics (ms por imagem)"""
+        speed = getattr(results[0], 'speed', None) if len(results) else None
+        if not speed:
+            return
+        for key, stage in (('preprocess', 'model_preprocess'), ('inference', 'model_forward'),
+                           ('postprocess', 'model_nms')):
+            if speed.get(key) is not None:
+                metrics.STAGE_SECONDS.observe(speed[key] * batch_size / 1000, stage)
     
-    def process_image(self, image_data):
+    def _submit_chunks(self, img_arrays, model_kwargs=None):
+        """Envia os lotes ao pool de processos de uma vez, para rodarem em paralelo"""
+        return [
+            self.worker_pool.submit(img_arrays[start:start + self.max_inference_batch_size], model_kwargs)
+            for start in range(0, len(img_arrays), self.max_inference_batch_size)
+        ]
+    
+    def _build_result(self, prepared, detections, annotate=True):
+        annotated_img = None
+        if annotate:
+            # Desenha sobre o mesmo buffer decodificado usado na inferência
+            try:
+                with metrics.stage('annotate'):
+                    annotated_img = self._draw_annotations_pil(
+                        prepared.image, self.class_table.to_dicts(detections)
+                    )
+            except Exception as e:
+                print(f"Error generating annotated image: {e}")
+                annotated_img = prepared.image
+        
+        metrics.DETECTIONS_PER_IMAGE.observe(len(detections))
+        
+        # Os dicionários da resposta só são montados aqui, já nas coordenadas originais
+        with metrics.stage('analysis'):
+            detections = detections.scaled(*prepared.scale)
+            damage_analysis, summary = self.class_table.analyze(detections)
+            detection_dicts = self.class_table.to_dicts(detections)
+        
+        return {
+            'detections': detection_dicts,
+            'damage_analysis': damage_analysis,
+            'annotated_image': annotated_img,
+            'summary': summary
+        }
+    
+    def _infer(self, img_arrays, params=None):
+        """
+        Retorna as detecções de cada imagem, ou a exceção que ela gerou.
+        
+        Com o agendador ativo, as imagens entram na fila de micro-lotes
+        compartilhada com as demais requisições; com o pool de processos,
+        os lotes são distribuídos entre os workers.
+        
+        Se o prazo da requisição (X-Deadline-Ms) já venceu, ou vence na fila
+        do agendador, levanta DeadlineExceeded em vez de inferir.
+        
+        O tempo de cada chamada (fila incluída) alimenta o p95 do perfil auto.
+        """
+        deadline = admission.current_deadline()
+        admission.check_deadline(deadline)
+        started = time.perf_counter()
+        outputs = self._infer_outputs(img_arrays, params, deadline)
+        # Por lote do modelo, para não confundir lotes grandes com sobrecarga
+        chunks = -(-len(img_arrays) // self.max_inference_batch_size)
+        inference_params.load_monitor.observe((time.perf_counter() - started) / max(1, chunks))
+        return outputs
+    
+    def _infer_outputs(self, img_arrays, params, deadline):
+        if self.scheduler is not None:
+            futures = [self.scheduler.submit(img_array, deadline, params) for img_array in img_arrays]
+            outputs = [future.exception() or future.result() for future in futures]
+            for output in outputs:
+                if isinstance(output, admission.DeadlineExceeded):
+                    raise output
+            return outputs
+        
+        if self.worker_pool is not None:
+            # Todos os lotes de uma vez, em paralelo; só em caso de falha refaz em série
+            try:
+                return self._predict(img_arrays, params)
+            except Exception:
+                pass
+        
+        outputs = []
+        for start in range(0, len(img_arrays), self.max_inference_batch_size):
+            chunk = img_arrays[start:start + self.max_inference_batch_size]
+            try:
+                outputs.extend(self._predict(chunk, params))
+            except Exception:
+                # Refaz imagem a imagem para isolar a que causou a falha
+                for img_array in chunk:
+                    try:
+                        outputs.append(self._predict([img_array], params)[0])
+                    except Exception as e:
+                        outputs.append(e)
+        return outputs
+    
+    @property
+    def model_version(self):
+        """Identifica o modelo carregado (arquivo, backend e precisão)"""
+        try:
+            stat = os.stat(self.model_path)
+            fingerprint = f"{int(stat.st_mtime)}:{stat.st_size}"
+        except OSError:
+            fingerprint = 'desconhecido'
+        return f"{os.path.basename(self.model_path)}:{fingerprint}:{self.backend}:{self.precision}"
+    
+    def _detect(self, img_arrays, params=None):
+        """
+        Como _infer, mas consultando antes o cache de resultados (a chave
+        inclui os parâmetros de inferência).
+        
+        Retorna (detecções ou exceção, cache_hit) para cada imagem.
+        """
+        if self.result_cache is None:
+            return [(detections, False) for detections in self._infer(img_arrays, params)]
+        
+        model_version = self.model_version
+        model_kwargs = params.model_kwargs() if params is not None else None
+        keys = [ResultCache.make_key(img_array, model_version, model_kwargs) for img_array in img_arrays]
+        outputs = [self.result_cache.get(key) for key in keys]
+        misses = [i for i, cached in enumerate(outputs) if cached is None]
+        hits = set(range(len(img_arrays))) - set(misses)
+        
+        if misses:
+            for i, detections in zip(misses, self._infer([img_arrays[i] for i in misses], params)):
+                if not isinstance(detections, Exception):
+                    self.result_cache.set(keys[i], detections)
+                outputs[i] = detections
+        
+        return [(detections, i in hits) for i, detections in enumerate(outputs)]
+    
+    def process_image(self, image_data, annotate=True, tiling=None, params=None):
         if self.model is None:
             raise Exception("Modelo não carregado")
         
-        if isinstance(image_data, Image.Image):
-            img_array = np.array(image_data)
+        params = params or self.resolve_params()
+        prepared = self.prepare_image(image_data, tiling, params)
+        tiling_info = None
+        if prepared.tiled:
+            detections, tiling_info = self._detect_tiled(prepared, params)
+            cache_hit = False
         else:
-            img_array = image_data
+            detections, cache_hit = self._detect([prepared.array], params)[0]
+        if isinstance(detections, Exception):
+            raise detections
+        result = self._build_result(prepared, detections, annotate)
+        result['cache_hit'] = cache_hit
+        if tiling_info is not None:
+            result['tiling'] = tiling_info
+        return result
+    
+    def process_images(self, images, annotate=True, tiling=None, params=None):
+        """
+        Processa várias imagens com uma única chamada (em lotes) ao modelo.
         
-        results = self.model(img_array)
+        Retorna uma lista na mesma ordem da entrada; imagens que falham
+        viram {'error': ...} sem afetar as demais.
+        """
+        if self.model is None:
+            raise Exception("Modelo não carregado")
         
-        detections = []
-        if len(results[0].boxes) > 0:
-            for box in results[0].boxes:
-                class_id = int(box.cls)
-                class_name = self.model.names[class_id]
-                detection = {
-                    'class': class_name,
-                    'confidence': float(box.conf),
-                    'bbox': box.xyxy[0].cpu().numpy().tolist()
-                }
-                detections.append(detection)
+        params = params or self.resolve_params()
+        outputs = [None] * len(images)
+        prepared_images = []
+        indexes = []
+        for i, image_data in enumerate(images):
+            try:
+                prepared_images.append(self.prepare_image(image_data, tiling, params))
+                indexes.append(i)
+            except Exception as e:
+                outputs[i] = {'error': str(e)}
         
-        try:
-            annotated_img = self._draw_annotations_pil(img_array, detections)
-        except Exception as e:
-            print(f"Error generating annotated image: {e}")
-            annotated_img = img_array
+        for i, prepared, detected in zip(indexes, prepared_images, self.detect_prepared(prepared_images, params)):
+            if isinstance(detected, Exception):
+                outputs[i] = {'error': str(detected)}
+                continue
+            try:
+                outputs[i] = self.finish_result(prepared, detected, annotate)
+            except Exception as e:
+                outputs[i] = {'error': str(e)}
         
-        damage_analysis = self._create_damage_analysis(detections)
+        return outputs
+    
+    def detect_prepared(self, prepared_images, params=None):
+        """
+        Detecções de imagens já decodificadas: as inteiras numa única
+        inferência em lote, as em tiles uma a uma.
+        
+        Retorna, para cada imagem, (detecções, cache_hit, informações dos
+        tiles ou None) ou a exceção que ela gerou.
+        """
+        whole = [i for i, prepared in enumerate(prepared_images) if not prepared.tiled]
+        detected = dict(zip(whole, self._detect([prepared_images[i].array for i in whole], params)))
+        
+        outputs = []
+        for i, prepared in enumerate(prepared_images):
+            if not prepared.tiled:
+                detections, cache_hit = detected[i]
+                outputs.append(detections if isinstance(detections, Exception) else (detections, cache_hit, None))
+                continue
+            try:
+                detections, tiling_info = self._detect_tiled(prepared, params)
+                outputs.append((detections, False, tiling_info))
+            except admission.DeadlineExceeded:
+                raise
+            except Exception as e:
+                outputs.append(e)
+        return outputs
+    
+    def finish_result(self, prepared, detected, annotate=True):
+        """Resultado de uma imagem (anotação e análise) a partir da saída de detect_prepared"""
+        detections, cache_hit, tiling_info = detected
+        result = self._build_result(prepared, detections, annotate)
+        result['cache_hit'] = cache_hit
+        if tiling_info is not None:
+            result['tiling'] = tiling_info
+        return result
+    
+    def process_video(self, path, sample_fps=None, params=None):
+        """
+        Analisa um vídeo de vistoria salvo em path.
+        
+        Só os keyframes passam pelo modelo, e cada dano rastreado entre eles
+        entra uma única vez na análise e no custo total, com a caixa e o
+        instante da melhor vista.
+        """
+        if self.model is None:
+            raise Exception("Modelo não carregado")
+        
+        params = params or self.resolve_params()
+        tracker = DamageTracker(
+            iou_threshold=config.VIDEO_TRACK_IOU,
+            max_age=config.VIDEO_TRACK_MAX_AGE,
+            min_hits=config.VIDEO_TRACK_MIN_HITS
+        )
+        batch_size = self.max_inference_batch_size * max(1, config.INFERENCE_WORKERS if self.worker_pool else 1)
+        video_info = track_video(
+            lambda img_arrays: self._infer(img_arrays, params), path, batch_size, tracker,
+            sample_fps=sample_fps or config.VIDEO_SAMPLE_FPS,
+            min_change=config.VIDEO_MIN_CHANGE,
+            max_keyframes=config.VIDEO_MAX_KEYFRAMES,
+            target_size=params.decode_size()
+        )
+        tracks = tracker.tracks()
+        video_info['tracked_damages'] = len(tracks)
+        
+        with metrics.stage('analysis'):
+            detections = tracks_to_detections(tracks)
+            damage_analysis, summary = self.class_table.analyze(detections)
+            detection_dicts = self.class_table.to_dicts(detections)
+        
+        for damage, detection, track in zip(damage_analysis, detection_dicts, tracks):
+            seen = {
+                'frame_index': track['best_frame'],
+                'timestamp': round(track['best_timestamp'], 3),
+                'first_seen': round(track['first_timestamp'], 3),
+                'frames_seen': track['hits']
+            }
+            damage.update(seen)
+            detection.update(seen)
         
         return {
-            'detections': detections,
+            'detections': detection_dicts,
             'damage_analysis': damage_analysis,
-            'annotated_image': annotated_img,
-            'summary': self._create_summary(damage_analysis)
+            'summary': summary,
+            'video_info': video_info
         }
     
-    def _create_damage_analysis(self, detections):
-        damage_report = []
+    def render_annotated(self, source_bytes, detections, size, width=None,
+                         image_format='JPEG', quality=85, layer='image'):
+        """
+        Renderiza sob demanda a imagem anotada (ou só a camada de anotações,
+        em PNG transparente) a partir das detecções guardadas.
+        """
+        if layer == 'overlay':
+            img = Image.new('RGBA', tuple(size), (0, 0, 0, 0))
+            image_format = 'PNG'
+        else:
+            # Miniaturas decodificam o JPEG já reduzido
+            img = prepare_image(source_bytes, width).image
         
-        for i, detection in enumerate(detections):
-            class_name = detection['class']
-            severity = self.damage_config['severity_map'].get(class_name, 'Indefinido')
-            location = self.damage_config['location_map'].get(class_name, 'N/A')
-            cost_range = self.damage_config['cost_estimates'].get(class_name, (100, 500))
-            
-            confidence = detection['confidence']
-            min_cost, max_cost = cost_range
-            estimated_cost = min_cost + (max_cost - min_cost) * confidence
-            
-            damage_report.append({
-                'damage_id': f"DMG_{i+1:03d}",
-                'class': class_name,
-                'class_display': self.damage_config['class_names'].get(class_name, class_name.replace('_', ' ').title()),
-                'confidence': confidence,
-                'severity': severity,
-                'location': location,
-                'estimated_cost': round(estimated_cost, 2),
-                'bbox': detection['bbox']
-            })
-        
-        return damage_report
+        scale = img.width / size[0]
+        if width and width < img.width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.BILINEAR)
+            scale = width / size[0]
+        
+        scaled = [
+            dict(detection, bbox=[coord * scale for coord in detection['bbox']])
+            for detection in detections
+        ]
+        img = self._draw_annotations_pil(img, scaled)
+        
+        buffer = io.BytesIO()
+        if image_format == 'PNG':
+            img.save(buffer, format='PNG')
+        else:
+            img.save(buffer, format=image_format, quality=quality)
+        return buffer.getvalue()
+    
+    def _create_damage_analysis(self, detections):
+        """Análise de danos a partir de detecções no formato da API"""
+        class_table = self.class_table or ClassTable({}, self.damage_config)
+        damage_analysis, _ = class_table.analyze(class_table.from_dicts(detections))
+        return damage_analysis
     
     def _create_summary(self, damage_analysis):
         if not damage_analysis:
@@ -232,8 +719,9 @@ class YOLODamageService:
             'damage_types': sorted(damage_types)
         }
     
-    def create_full_report(self, damage_analysis, vehicle_info=None):
-        summary = self._create_summary(damage_analysis)
+    def create_full_report(self, damage_analysis, vehicle_info=None, summary=None):
+        if summary is None:
+            summary = self._create_summary(damage_analysis)
         
         report = {
             "inspection_info": {
@@ -0,0 +1,43 @@
+import pytest
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from src.services import admission
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(admission, 'API_KEYS', admission.parse_api_keys(' chave-a, chave-b ,'))
+    app = Flask(__name__)
+
+    @app.route('/')
+    def key():
+        return admission.client_key()
+
+    return app
+
+
+def test_configured_api_key_is_the_client_key(app):
+    with app.test_request_context(headers={'X-API-Key': 'chave-a'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert admission.client_key() == 'key:chave-a'
+
+
+def test_unknown_api_key_falls_back_to_ip(app):
+    with app.test_request_context(headers={'X-API-Key': 'inventada'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert admission.client_key() == 'ip:10.0.0.1'
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(app):
+    client = app.test_client()
+    response = client.get('/', headers={'X-Forwarded-For': '1.2.3.4'}, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.get_data(as_text=True) == 'ip:10.0.0.1'
+
+
+def test_trusted_proxy_hop_reads_only_the_address_it_appended(app):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+    client = app.test_client()
+    # O cliente escreveu 1.2.3.4; o proxy acrescentou o IP real, 5.6.7.8
+    response = client.get(
+        '/', headers={'X-Forwarded-For': '1.2.3.4, 5.6.7.8'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}
+    )
+    assert response.get_data(as_text=True) == 'ip:5.6.7.8'
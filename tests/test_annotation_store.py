@@ -0,0 +1,58 @@
+from src.services import annotation_store
+from src.services.annotation_store import AnnotationStore
+
+DETECTIONS = [{'class': 'dent', 'confidence': 0.5, 'bbox': [1.0, 2.0, 3.0, 4.0]}]
+
+
+def test_memory_only_entries_stay_in_process():
+    store = AnnotationStore()
+    annotation_id = store.put(DETECTIONS, b'jpeg', (640, 480))
+
+    assert store.get(annotation_id)['detections'] == DETECTIONS
+    assert AnnotationStore().get(annotation_id) is None
+
+
+def test_disk_tier_is_shared_between_stores(tmp_path):
+    path = str(tmp_path / 'annotations.db')
+    annotation_id = AnnotationStore(disk_path=path).put(DETECTIONS, b'jpeg', (640, 480))
+
+    entry = AnnotationStore(disk_path=path).get(annotation_id)
+    assert entry['detections'] == DETECTIONS
+    assert entry['source'] == b'jpeg'
+    assert entry['size'] == (640, 480)
+
+
+def test_expired_entries_are_not_returned(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(annotation_store.time, 'time', lambda: now[0])
+    path = str(tmp_path / 'annotations.db')
+    store = AnnotationStore(ttl_seconds=60, disk_path=path)
+    annotation_id = store.put(DETECTIONS, b'jpeg', (640, 480))
+
+    now[0] += 61
+    assert store.get(annotation_id) is None
+    assert AnnotationStore(ttl_seconds=60, disk_path=path).get(annotation_id) is None
+
+
+def test_memory_is_bounded_by_upload_bytes():
+    store = AnnotationStore(max_entries=100, max_bytes=250)
+    ids = [store.put(DETECTIONS, bytes(100), (640, 480)) for _ in range(5)]
+
+    assert store.memory_bytes() == 200
+    assert [store.get(annotation_id) is not None for annotation_id in ids] == [False, False, False, True, True]
+
+
+def test_upload_larger_than_budget_stays_on_disk_only(tmp_path):
+    store = AnnotationStore(max_bytes=50, disk_path=str(tmp_path / 'annotations.db'))
+    small = store.put(DETECTIONS, bytes(10), (640, 480))
+    large = store.put(DETECTIONS, bytes(100), (640, 480))
+
+    assert store.memory_bytes() == 10
+    assert store.get(large)['source'] == bytes(100)
+    assert store.memory_bytes() == 10
+    assert store.get(small) is not None
+
+    # Sem disco, a mais recente fica na memória mesmo acima do orçamento
+    memory_only = AnnotationStore(max_bytes=50)
+    annotation_id = memory_only.put(DETECTIONS, bytes(100), (640, 480))
+    assert memory_only.get(annotation_id) is not None
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('ultralytics')
+
+from benchmarks.stub_model import StubModel
+from src.services.backends import compare_detections, match_detections
+from src.services.postprocessing import Detections
+from src.services.yolo_service import YOLODamageService
+
+REFERENCE = [
+    {'class': 'dent', 'confidence': 0.9, 'bbox': [10, 10, 50, 50]},
+    {'class': 'scratch', 'confidence': 0.8, 'bbox': [100, 100, 200, 150]},
+    {'class': 'dent', 'confidence': 0.4, 'bbox': [300, 300, 340, 360]},
+]
+
+
+def test_match_detections_pairs_by_class_and_iou():
+    candidate = [
+        {'class': 'scratch', 'confidence': 0.78, 'bbox': [101, 100, 201, 151]},
+        {'class': 'dent', 'confidence': 0.91, 'bbox': [10, 11, 50, 51]},
+        # Mesma caixa, outra classe: não casa
+        {'class': 'crack', 'confidence': 0.5, 'bbox': [300, 300, 340, 360]},
+    ]
+    pairs, missing, extra = match_detections(REFERENCE, candidate, iou_threshold=0.5)
+
+    assert [(ref['class'], cand['class']) for ref, cand, _ in pairs] == [('dent', 'dent'), ('scratch', 'scratch')]
+    assert all(iou > 0.9 for _, _, iou in pairs)
+    assert missing == [REFERENCE[2]]
+    assert extra == [candidate[2]]
+
+
+def test_match_detections_is_greedy_by_confidence():
+    candidate = [
+        {'class': 'dent', 'confidence': 0.5, 'bbox': [10, 10, 50, 50]},
+        {'class': 'dent', 'confidence': 0.6, 'bbox': [12, 12, 52, 52]},
+    ]
+    reference = [
+        {'class': 'dent', 'confidence': 0.9, 'bbox': [10, 10, 50, 50]},
+        {'class': 'dent', 'confidence': 0.3, 'bbox': [11, 11, 51, 51]},
+    ]
+    pairs, missing, extra = match_detections(reference, candidate, iou_threshold=0.5)
+
+    # A referência mais confiante fica com a caixa idêntica; a outra, com a que sobrou
+    assert pairs[0][1] is candidate[0] and pairs[0][2] == pytest.approx(1.0)
+    assert pairs[1][1] is candidate[1]
+    assert not missing and not extra
+
+
+def test_compare_detections_identical():
+    report = compare_detections(REFERENCE, [dict(detection) for detection in REFERENCE])
+    assert report == {
+        'matched': 3, 'missing': 0, 'extra': 0, 'min_iou': 1.0, 'max_conf_delta': 0.0, 'ok': True
+    }
+
+
+def test_compare_detections_confidence_tolerance():
+    candidate = [dict(detection) for detection in REFERENCE]
+    candidate[1] = dict(candidate[1], confidence=0.7)
+    report = compare_detections(REFERENCE, candidate, conf_tolerance=0.05)
+    assert report['matched'] == 3
+    assert report['max_conf_delta'] == pytest.approx(0.1)
+    assert not report['ok']
+    assert compare_detections(REFERENCE, candidate, conf_tolerance=0.2)['ok']
+
+
+def test_compare_detections_missing_and_extra():
+    candidate = REFERENCE[:2] + [{'class': 'dent', 'confidence': 0.4, 'bbox': [0, 400, 40, 460]}]
+    report = compare_detections(REFERENCE, candidate)
+    assert (report['matched'], report['missing'], report['extra']) == (2, 1, 1)
+    assert not report['ok']
+
+
+def test_parity_with_stub_model():
+    """O pós-processamento do serviço devolve as mesmas caixas que o modelo"""
+    model = StubModel(detections_per_image=6)
+    service = YOLODamageService(model=model)
+    images = [np.zeros((480, 640, 3), dtype=np.uint8), np.zeros((600, 800, 3), dtype=np.uint8)]
+
+    predicted = service._predict(images)
+    for image, detections in zip(images, predicted):
+        expected = Detections.from_result(model(image)[0])
+        report = compare_detections(
+            service.class_table.to_dicts(expected), service.class_table.to_dicts(detections),
+            iou_threshold=0.99, conf_tolerance=1e-6
+        )
+        assert report['ok'], report
+        assert report['matched'] == len(expected) > 0
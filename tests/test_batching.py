@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from src.services.admission import DeadlineExceeded
+from src.services.batching import InferenceScheduler
+
+
+class Params:
+    def __init__(self, imgsz):
+        self.imgsz = imgsz
+
+    def key(self):
+        return (self.imgsz,)
+
+
+class Recorder:
+    """predict_fn que registra os lotes e devolve (imagem, imgsz) para cada item"""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def __call__(self, images, params):
+        with self.lock:
+            self.calls.append((list(images), params.imgsz if params is not None else None))
+        if self.fail_on is not None and self.fail_on in images:
+            raise ValueError('imagem inválida')
+        return [(image, params.imgsz if params is not None else None) for image in images]
+
+
+@pytest.fixture
+def scheduler_factory():
+    schedulers = []
+
+    def make(predict_fn, **kwargs):
+        scheduler = InferenceScheduler(predict_fn, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def test_groups_concurrent_items_in_one_batch(scheduler_factory):
+    recorder = Recorder()
+    scheduler = scheduler_factory(recorder, max_batch_size=4, window_ms=200)
+    futures = [scheduler.submit(image) for image in ('a', 'b', 'c')]
+
+    assert [future.result(timeout=5) for future in futures] == [('a', None), ('b', None), ('c', None)]
+    assert recorder.calls == [(['a', 'b', 'c'], None)]
+
+
+def test_batch_size_limit(scheduler_factory):
+    recorder = Recorder()
+    scheduler = scheduler_factory(recorder, max_batch_size=2, window_ms=200)
+    futures = [scheduler.submit(image) for image in ('a', 'b', 'c')]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert [images for images, _ in recorder.calls] == [['a', 'b'], ['c']]
+
+
+def test_params_are_not_mixed(scheduler_factory):
+    recorder = Recorder()
+    scheduler = scheduler_factory(recorder, max_batch_size=8, window_ms=200)
+    futures = [
+        scheduler.submit('a', params=Params(640)),
+        scheduler.submit('b', params=Params(960)),
+        scheduler.submit('c', params=Params(640)),
+    ]
+
+    assert [future.result(timeout=5) for future in futures] == [('a', 640), ('b', 960), ('c', 640)]
+    assert sorted(recorder.calls) == [(['a', 'c'], 640), (['b'], 960)]
+
+
+def test_expired_deadline_skips_inference(scheduler_factory):
+    recorder = Recorder()
+    scheduler = scheduler_factory(recorder, max_batch_size=4, window_ms=100)
+    expired = scheduler.submit('a', deadline=time.monotonic() - 1)
+    alive = scheduler.submit('b', deadline=time.monotonic() + 60)
+
+    with pytest.raises(DeadlineExceeded):
+        expired.result(timeout=5)
+    assert alive.result(timeout=5) == ('b', None)
+    assert all('a' not in images for images, _ in recorder.calls)
+
+
+def test_failure_is_isolated_to_one_item(scheduler_factory):
+    recorder = Recorder(fail_on='bad')
+    scheduler = scheduler_factory(recorder, max_batch_size=4, window_ms=200)
+    futures = [scheduler.submit(image) for image in ('a', 'bad', 'c')]
+
+    assert futures[0].result(timeout=5) == ('a', None)
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == ('c', None)
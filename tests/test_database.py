@@ -0,0 +1,50 @@
+import os
+
+import pytest
+from flask import Flask
+
+from src.models.user import User, db, dispose_connections
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def test_dispose_leaves_no_connection_to_inherit(app):
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 1
+    dispose_connections(app)
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='sem fork')
+def test_forked_worker_opens_its_own_connection(app):
+    with app.app_context():
+        db.session.add(User(username='mestre', email='mestre@example.com'))
+        db.session.commit()
+        inherited = db.engine.pool.checkedin()
+    assert inherited == 1
+
+    pid = os.fork()
+    if pid == 0:
+        # Worker: descarta as conexões do mestre sem fechá-las e abre a sua
+        status = 1
+        try:
+            dispose_connections(app, close=False)
+            with app.app_context():
+                status = 0 if db.engine.pool.checkedin() == 0 and User.query.count() == 1 else 1
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    # A conexão do mestre continua utilizável
+    with app.app_context():
+        assert User.query.count() == 1
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src import config
+from src.services import image_quality
+from src.services.image_io import PreparedImage
+
+
+def _prepared(pixels):
+    image = Image.fromarray(pixels.astype(np.uint8))
+    return PreparedImage(image, image.size)
+
+
+def _textured(seed=0, offset=0):
+    rng = np.random.RandomState(seed)
+    pixels = rng.randint(40, 200, size=(48, 64, 1)).repeat(8, axis=0).repeat(8, axis=1)
+    return np.clip(pixels.repeat(3, axis=2) + offset, 0, 255)
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(config, 'QUALITY_SIZE', 256)
+    monkeypatch.setattr(config, 'QUALITY_MIN_BRIGHTNESS', 30)
+    monkeypatch.setattr(config, 'QUALITY_MAX_BRIGHTNESS', 235)
+    monkeypatch.setattr(config, 'QUALITY_MIN_SHARPNESS', 20)
+    monkeypatch.setattr(config, 'QUALITY_DUPLICATE_DISTANCE', 4)
+    monkeypatch.setattr(config, 'QUALITY_DUPLICATE_MAX_DIFF', 14)
+
+
+def test_usable_image_passes_enforce():
+    prepared = _prepared(_textured())
+    quality = image_quality.triage(prepared, 'enforce')
+
+    assert quality.usable
+    assert prepared.quality is quality
+    assert quality.to_dict()['reason'] is None
+
+
+@pytest.mark.parametrize('pixels, reason', [
+    (np.full((480, 640, 3), 10), 'too_dark'),
+    (np.full((480, 640, 3), 250), 'too_bright'),
+    (np.full((480, 640, 3), 128), 'blurry'),
+])
+def test_enforce_rejects_with_reason(pixels, reason):
+    with pytest.raises(image_quality.ImageRejected) as rejected:
+        image_quality.triage(_prepared(pixels), 'enforce')
+    assert rejected.value.quality.reason == reason
+    assert rejected.value.quality.to_dict()['usable'] is False
+
+
+def test_dark_is_reported_before_blurry():
+    # Escura e sem textura: o motivo é a exposição
+    quality = image_quality.triage(_prepared(np.full((100, 100, 3), 5)), 'report')
+    assert quality.reason == 'too_dark'
+
+
+def test_report_only_measures():
+    prepared = _prepared(np.full((480, 640, 3), 10))
+    quality = image_quality.triage(prepared, 'report')
+
+    assert quality.reason == 'too_dark'
+    assert prepared.quality is quality
+
+
+def test_off_skips_assessment():
+    prepared = _prepared(np.full((480, 640, 3), 10))
+    assert image_quality.triage(prepared, 'off') is None
+    assert prepared.quality is None
+
+
+def test_duplicate_finder():
+    finder = image_quality.DuplicateFinder()
+    original = image_quality.assess(_prepared(_textured(seed=1)))
+    # A mesma foto um pouco mais clara continua sendo duplicata
+    brighter = image_quality.assess(_prepared(_textured(seed=1, offset=6)))
+    other = image_quality.assess(_prepared(_textured(seed=2)))
+
+    assert finder.match(0, original) is None
+    assert finder.match(1, brighter) == 0
+    assert finder.match(2, other) is None
+    assert finder.match(3, image_quality.assess(_prepared(_textured(seed=2)))) == 2
+
+
+def test_duplicate_finder_disabled():
+    finder = image_quality.DuplicateFinder(max_distance=-1)
+    quality = image_quality.assess(_prepared(_textured()))
+    assert finder.match(0, quality) is None
+    assert finder.match(1, quality) is None
@@ -0,0 +1,46 @@
+import pytest
+
+from src import config
+from src.services import inference_params
+
+
+@pytest.fixture(autouse=True)
+def sizes(monkeypatch):
+    monkeypatch.setattr(config, 'INFERENCE_IMGSZ', 640)
+    monkeypatch.setattr(config, 'INFERENCE_FAST_IMGSZ', 320)
+    monkeypatch.setattr(config, 'INFERENCE_ACCURATE_IMGSZ', 960)
+    monkeypatch.setattr(config, 'INFERENCE_ALLOWED_IMGSZ', '320,480,640,960')
+    monkeypatch.setattr(config, 'INFERENCE_AUTO_PROFILE', 'standard')
+    monkeypatch.setattr(config, 'INFERENCE_DEGRADED_PROFILE', 'fast')
+    monkeypatch.setattr(config, 'INFERENCE_AUTO_MAX_QUEUE', 4)
+    monkeypatch.setattr(config, 'INFERENCE_AUTO_P95_MS', 0)
+    monkeypatch.setattr(inference_params, 'load_monitor', inference_params.LoadMonitor())
+
+
+@pytest.mark.parametrize('profile, imgsz', [('fast', 320), ('standard', 640), ('accurate', 960)])
+def test_profiles_keep_their_resolution_on_dynamic_backends(profile, imgsz):
+    assert inference_params.resolve(profile, backend='torch').imgsz == imgsz
+
+
+@pytest.mark.parametrize('profile', ['fast', 'standard', 'accurate'])
+def test_torchscript_profiles_use_the_exported_resolution(profile):
+    params = inference_params.resolve(profile, backend='torchscript')
+    assert params.imgsz == 640
+    assert params.profile == profile
+
+
+def test_torchscript_auto_degraded_keeps_the_exported_resolution():
+    params = inference_params.resolve('auto', backend='torchscript', queue_depth=10)
+    assert params.profile == 'fast'
+    assert params.imgsz == 640
+
+
+def test_torchscript_rejects_explicit_imgsz():
+    with pytest.raises(ValueError):
+        inference_params.resolve('standard', {'imgsz': 320}, backend='torchscript')
+
+
+def test_profile_outside_allowed_sizes_uses_nearest(monkeypatch):
+    monkeypatch.setattr(config, 'INFERENCE_ALLOWED_IMGSZ', '480,640')
+    assert inference_params.resolve('fast', backend='torch').imgsz == 480
+    assert inference_params.resolve('accurate', backend='torch').imgsz == 640
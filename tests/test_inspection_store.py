@@ -0,0 +1,68 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+
+from src.models.inspection import Inspection
+from src.models.user import db
+from src.services import inspection_store
+from src.services.inspection_store import InspectionWriter
+
+
+def _report(damages, vehicle_info, summary=None):
+    return {'inspection_info': {}, 'damage_analysis': {'repair_urgency': 'Baixa'}, 'damages': damages}
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def writer(app):
+    writer = InspectionWriter(app, _report, lambda: ('v1', None), flush_interval=0.0)
+    yield writer
+    writer.stop()
+
+
+def test_report_timestamp_is_utc(app, writer):
+    inspection_id = writer.record('detect', {'plate': 'ABC1D23'}, {}, [])
+    assert writer.flush(5)
+    with app.app_context():
+        inspection = db.session.get(Inspection, inspection_id)
+        timestamp = datetime.fromisoformat(json.loads(inspection.report)['inspection_info']['timestamp'])
+    assert timestamp.utcoffset().total_seconds() == 0
+    assert timestamp.replace(tzinfo=None) == inspection.created_at.replace(tzinfo=None)
+
+
+def test_pages_do_not_skip_inspections_written_together(app):
+    moment = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    with app.app_context():
+        db.session.add_all([
+            Inspection(id=f'{index:032x}', plate='ABC1D23', created_at=moment, source='batch')
+            for index in range(5)
+        ])
+        db.session.add(Inspection(id='f' * 32, plate='ABC1D23', created_at=datetime(2024, 4, 1), source='detect'))
+        db.session.commit()
+
+        seen, before = [], None
+        while True:
+            inspections = inspection_store.page('ABC1D23', before, limit=2)
+            seen.extend(inspection.id for inspection in inspections)
+            if len(inspections) < 2:
+                break
+            before = inspection_store.parse_cursor(inspection_store.page_cursor(inspections[-1]))
+
+    assert seen == [f'{index:032x}' for index in reversed(range(5))] + ['f' * 32]
+
+
+def test_parse_cursor_accepts_a_plain_instant():
+    assert inspection_store.parse_cursor('2024-05-01T09:00:00-03:00') == (datetime(2024, 5, 1, 12, 0), None)
+    with pytest.raises(ValueError):
+        inspection_store.parse_cursor('ontem')
@@ -0,0 +1,45 @@
+import gc
+import threading
+
+import pytest
+
+from src.services import metrics
+
+
+def _run_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+
+
+def test_finished_threads_fold_into_totals():
+    counter = metrics.Counter('test_total', 'teste', ('kind',))
+    histogram = metrics.Histogram('test_seconds', 'teste', buckets=(0.1, 1))
+
+    def work():
+        counter.inc(2, 'a')
+        histogram.observe(0.05)
+        histogram.observe(5)
+
+    _run_threads(work, 50)
+
+    # As cópias das threads que terminaram não ficam para trás
+    assert counter._shards.count() == 0
+    assert histogram._shards.count() == 0
+    assert counter.collect() == {('a',): 100}
+    counts = histogram.collect()[()]
+    assert counts[:3] == [50, 0, 50]
+    assert counts[3] == pytest.approx(50 * 5.05)
+
+
+def test_live_thread_and_finished_threads_are_summed():
+    counter = metrics.Counter('test_live_total', 'teste')
+    counter.inc(1)
+    _run_threads(lambda: counter.inc(1), 3)
+
+    assert counter._shards.count() == 1
+    assert counter.collect() == {(): 4}
+    assert 'test_live_total 4' in '\n'.join(counter.render())
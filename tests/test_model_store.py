@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from src.services import model_store
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    calls = []
+
+    def fake_download(path, url, expected_sha256, timeout):
+        calls.append(path)
+        with open(path, 'wb') as f:
+            f.write(b'pesos do modelo')
+        return model_store.cached_sha256(path)
+
+    monkeypatch.setattr(model_store, '_download', fake_download)
+    return calls
+
+
+def test_existing_model_is_reused(tmp_path, downloads):
+    path = str(tmp_path / 'model.pt')
+    first = model_store.ensure_model(path, 'http://modelo')
+    assert model_store.ensure_model(path, 'http://modelo') == first
+    assert downloads == [path]
+
+
+def test_empty_model_is_downloaded_again(tmp_path, downloads):
+    path = str(tmp_path / 'model.pt')
+    open(path, 'wb').close()
+    model_store.ensure_model(path, 'http://modelo')
+    assert downloads == [path]
+    assert os.path.getsize(path) > 0
+
+
+def test_replaced_model_is_kept_and_hashed_again(tmp_path, downloads):
+    path = str(tmp_path / 'model.pt')
+    first = model_store.ensure_model(path, 'http://modelo')
+    with open(path, 'wb') as f:
+        f.write(b'outro modelo, maior que o primeiro')
+
+    digest = model_store.ensure_model(path, 'http://modelo')
+    assert digest != first
+    assert digest == model_store.file_sha256(path)
+    assert downloads == [path]
+    assert model_store.cached_sha256(path) == digest
+
+
+def test_refetch_replaces_model_that_does_not_load(tmp_path, downloads):
+    path = str(tmp_path / 'model.pt')
+    with open(path, 'wb') as f:
+        f.write(b'corrompido')
+    model_store.ensure_model(path, 'http://modelo')
+    assert downloads == []
+
+    digest = model_store.refetch_model(path, 'http://modelo')
+    assert downloads == [path]
+    assert digest == model_store.file_sha256(path)
+
+
+def test_offline_rejects_empty_model(tmp_path, downloads):
+    path = str(tmp_path / 'model.pt')
+    open(path, 'wb').close()
+    with pytest.raises(model_store.ModelArtifactError):
+        model_store.ensure_model(path, 'http://modelo', offline=True)
+    assert downloads == []
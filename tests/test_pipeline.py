@@ -0,0 +1,45 @@
+import threading
+import time
+
+from src.services.pipeline import run_pipeline
+
+
+def _double(decoded):
+    return [value * 2 for value in decoded]
+
+
+def test_results_keep_input_order_and_isolate_failures():
+    def decode(item):
+        if item == 3:
+            raise ValueError('imagem inválida')
+        return item
+
+    outputs = list(run_pipeline(range(6), decode, _double, lambda index, decoded, inferred: inferred, chunk_size=2))
+
+    assert outputs[:3] == [0, 2, 4]
+    assert isinstance(outputs[3], ValueError)
+    assert outputs[4:] == [8, 10]
+
+
+def test_pools_are_reused_between_calls():
+    list(run_pipeline(range(4), lambda item: item, _double, lambda *args: args[2], chunk_size=2))
+    threads = threading.active_count()
+    for _ in range(20):
+        list(run_pipeline(range(4), lambda item: item, _double, lambda *args: args[2], chunk_size=2))
+    assert threading.active_count() == threads
+
+
+def test_stopping_early_discards_pending_items():
+    decoded = []
+
+    def slow_decode(item):
+        decoded.append(item)
+        time.sleep(0.02)
+        return item
+
+    outputs = run_pipeline(range(50), slow_decode, _double, lambda *args: args[2], chunk_size=2, max_in_flight=6)
+    assert next(outputs) == 0
+    outputs.close()
+    started = len(decoded)
+    time.sleep(0.1)
+    assert len(decoded) == started < 50
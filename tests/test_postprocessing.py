@@ -0,0 +1,81 @@
+import pytest
+
+from src.services.postprocessing import ClassTable, Detections
+
+DAMAGE_CONFIG = {
+    'class_names': {'dent': 'Amassado', 'scratch': 'Risco'},
+    'location_map': {'dent': 'Lataria', 'scratch': 'Pintura'},
+    'severity_map': {'dent': 'Moderado', 'scratch': 'Leve', 'shattered_glass': 'Severo'},
+    'cost_estimates': {'dent': (200, 800), 'scratch': (100, 300), 'shattered_glass': (500, 1500)},
+}
+NAMES = {0: 'dent', 1: 'scratch', 2: 'shattered_glass', 3: 'rust'}
+
+
+@pytest.fixture
+def table():
+    return ClassTable(NAMES, DAMAGE_CONFIG)
+
+
+def test_analyze_empty(table):
+    damages, summary = table.analyze(Detections.empty())
+    assert damages == []
+    assert summary == {
+        'total_damages': 0,
+        'total_cost': 0,
+        'urgency': 'Baixa',
+        'severity_count': {'Leve': 0, 'Moderado': 0, 'Severo': 0},
+        'damage_types': []
+    }
+
+
+def test_analyze_costs_severity_and_urgency(table):
+    detections = Detections(
+        [[0, 0, 10, 10], [20, 20, 40, 40], [50, 50, 60, 70]],
+        [0.5, 0.25, 1.0],
+        [0, 1, 1]
+    )
+    damages, summary = table.analyze(detections)
+
+    # Custo: mínimo + (máximo - mínimo) * confiança
+    assert [damage['estimated_cost'] for damage in damages] == [500.0, 150.0, 300.0]
+    assert [damage['damage_id'] for damage in damages] == ['DMG_001', 'DMG_002', 'DMG_003']
+    assert damages[0]['class'] == 'dent'
+    assert damages[0]['class_display'] == 'Amassado'
+    assert damages[0]['location'] == 'Lataria'
+    assert damages[0]['severity'] == 'Moderado'
+    assert damages[2]['bbox'] == [50, 50, 60, 70]
+    assert summary == {
+        'total_damages': 3,
+        'total_cost': 950.0,
+        'urgency': 'Média',
+        'severity_count': {'Leve': 2, 'Moderado': 1, 'Severo': 0},
+        'damage_types': ['Amassado', 'Risco']
+    }
+
+
+def test_analyze_severe_damage_is_urgent(table):
+    _, summary = table.analyze(Detections([[0, 0, 1, 1]], [0.9], [2]))
+    assert summary['urgency'] == 'Alta'
+    assert summary['severity_count']['Severo'] == 1
+
+
+def test_analyze_unknown_class_uses_defaults(table):
+    damages, summary = table.analyze(Detections([[0, 0, 1, 1]], [0.5], [3]))
+    assert damages[0]['class_display'] == 'Rust'
+    assert damages[0]['location'] == 'N/A'
+    assert damages[0]['severity'] == 'Indefinido'
+    # Faixa padrão (100, 500)
+    assert damages[0]['estimated_cost'] == 300.0
+    assert summary['urgency'] == 'Baixa'
+    assert summary['severity_count'] == {'Leve': 0, 'Moderado': 0, 'Severo': 0}
+
+
+def test_dicts_round_trip(table):
+    detections = Detections([[1, 2, 3, 4], [5, 6, 7, 8]], [0.5, 0.75], [1, 0])
+    dicts = table.to_dicts(detections)
+    assert [detection['class'] for detection in dicts] == ['scratch', 'dent']
+
+    restored = table.from_dicts(dicts)
+    assert restored.cls.tolist() == [1, 0]
+    assert restored.xyxy.tolist() == detections.xyxy.tolist()
+    assert restored.conf.tolist() == detections.conf.tolist()
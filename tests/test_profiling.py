@@ -0,0 +1,22 @@
+from flask import Flask
+
+from src import config
+from src.services import profiling
+
+
+def test_unprofiled_threads_reports_scheduler_and_pipeline(monkeypatch):
+    monkeypatch.setattr(config, 'INFERENCE_WORKERS', 0)
+    monkeypatch.setattr(config, 'INFERENCE_BATCH_WINDOW_MS', 5.0)
+    with Flask(__name__).test_request_context():
+        profiling.note_unprofiled('batch_pipeline')
+        profiling.note_unprofiled('batch_pipeline')
+        assert profiling._unprofiled_threads() == ['scheduler', 'batch_pipeline']
+
+
+def test_unprofiled_threads_empty_when_everything_runs_inline(monkeypatch):
+    monkeypatch.setattr(config, 'INFERENCE_WORKERS', 0)
+    monkeypatch.setattr(config, 'INFERENCE_BATCH_WINDOW_MS', 0)
+    with Flask(__name__).test_request_context():
+        assert profiling._unprofiled_threads() == []
+    # Fora de uma requisição não há onde registrar
+    profiling.note_unprofiled('batch_pipeline')
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from src.services import result_cache
+from src.services.postprocessing import Detections
+from src.services.result_cache import ResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def _detections(conf=0.5):
+    return Detections([[1, 2, 3, 4]], [conf], [0])
+
+
+def test_make_key_depends_on_pixels_model_and_params():
+    image = np.zeros((4, 6, 3), dtype=np.uint8)
+    key = ResultCache.make_key(image, 'v1', {'imgsz': 640, 'conf': 0.25})
+
+    assert key == ResultCache.make_key(image.copy(), 'v1', {'conf': 0.25, 'imgsz': 640})
+    assert key != ResultCache.make_key(image, 'v2', {'imgsz': 640, 'conf': 0.25})
+    assert key != ResultCache.make_key(image, 'v1', {'imgsz': 640, 'conf': 0.5})
+    changed = image.copy()
+    changed[0, 0, 0] = 1
+    assert key != ResultCache.make_key(changed, 'v1', {'imgsz': 640, 'conf': 0.25})
+    # Mesmos bytes com outra forma não colidem
+    assert key != ResultCache.make_key(image.reshape(6, 4, 3), 'v1', {'imgsz': 640, 'conf': 0.25})
+
+
+def test_make_key_of_non_contiguous_view_matches_copy():
+    image = np.arange(8 * 8 * 3, dtype=np.uint8).reshape(8, 8, 3)
+    view = image[::2, ::2]
+    assert not view.flags.c_contiguous
+    assert ResultCache.make_key(view, 'v1') == ResultCache.make_key(np.ascontiguousarray(view), 'v1')
+
+
+def test_get_respects_ttl(clock):
+    cache = ResultCache(max_entries=4, ttl_seconds=60)
+    cache.set('a', _detections())
+
+    clock[0] += 59
+    assert cache.get('a') is not None
+    clock[0] += 2
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2, ttl_seconds=0)
+    cache.set('a', _detections())
+    cache.set('b', _detections())
+    cache.get('a')
+    cache.set('c', _detections())
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    ResultCache(ttl_seconds=60, disk_path=path).set('a', _detections(0.75))
+
+    cache = ResultCache(ttl_seconds=60, disk_path=path)
+    detections = cache.get('a')
+    assert detections.conf.tolist() == [0.75]
+    assert cache.stats()['disk_hits'] == 1
+
+    clock[0] += 61
+    assert ResultCache(ttl_seconds=60, disk_path=path).get('a') is None
@@ -0,0 +1,68 @@
+import numpy as np
+
+from src.services.postprocessing import Detections
+from src.services.tiling import merge_detections, tile_grid
+
+
+def _sorted(detections):
+    order = np.lexsort((detections.xyxy[:, 0], detections.cls))
+    return detections.xyxy[order], detections.conf[order], detections.cls[order]
+
+
+def test_tile_grid_covers_image_and_aligns_last_tile():
+    grid = tile_grid(1000, 600, 512, 0.2)
+    assert grid[0] == (0, 0, 512, 512)
+    assert max(box[2] for box in grid) == 1000
+    assert max(box[3] for box in grid) == 600
+    assert all(box[2] - box[0] == 512 and box[3] - box[1] == 512 for box in grid)
+    assert tile_grid(300, 200, 512, 0.2) == [(0, 0, 300, 200)]
+
+
+def test_merge_nmm_joins_box_split_by_tile_border():
+    detections = Detections(
+        [[100, 100, 200, 150], [190, 100, 260, 150], [400, 400, 450, 450]],
+        [0.8, 0.6, 0.9],
+        [0, 0, 0]
+    )
+    xyxy, conf, cls = _sorted(merge_detections(detections, 'nmm', 'ios', threshold=0.1))
+
+    np.testing.assert_allclose(xyxy, [[100, 100, 260, 150], [400, 400, 450, 450]])
+    np.testing.assert_allclose(conf, [0.8, 0.9])
+
+
+def test_merge_nms_keeps_most_confident():
+    detections = Detections([[0, 0, 100, 100], [5, 5, 100, 100]], [0.5, 0.7], [1, 1])
+    merged = merge_detections(detections, 'nms', 'iou', threshold=0.5)
+
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.xyxy, [[5, 5, 100, 100]])
+    np.testing.assert_allclose(merged.conf, [0.7])
+
+
+def test_merge_wbf_weights_by_confidence():
+    detections = Detections([[0, 0, 100, 100], [10, 10, 110, 110]], [0.75, 0.25], [2, 2])
+    merged = merge_detections(detections, 'wbf', 'iou', threshold=0.5)
+
+    np.testing.assert_allclose(merged.xyxy, [[2.5, 2.5, 102.5, 102.5]])
+    np.testing.assert_allclose(merged.conf, [0.75])
+
+
+def test_merge_ios_matches_small_box_inside_large_one():
+    detections = Detections([[0, 0, 200, 200], [50, 50, 80, 80]], [0.9, 0.6], [0, 0])
+
+    assert len(merge_detections(detections, 'nmm', 'ios', threshold=0.5)) == 1
+    # Pelo IoU a caixa pequena quase não se sobrepõe à grande
+    assert len(merge_detections(detections, 'nmm', 'iou', threshold=0.5)) == 2
+
+
+def test_merge_keeps_classes_apart():
+    detections = Detections([[0, 0, 100, 100], [0, 0, 100, 100]], [0.9, 0.8], [0, 1])
+    xyxy, conf, cls = _sorted(merge_detections(detections, 'nmm', 'iou', threshold=0.5))
+
+    assert cls.tolist() == [0, 1]
+    np.testing.assert_allclose(conf, [0.9, 0.8])
+
+
+def test_merge_single_detection_is_unchanged():
+    detections = Detections([[1, 2, 3, 4]], [0.5], [0])
+    assert merge_detections(detections) is detections
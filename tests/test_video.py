@@ -0,0 +1,49 @@
+import numpy as np
+
+from src.services.postprocessing import Detections
+from src.services.video import FINGERPRINT_SIZE, DamageTracker, estimate_shift
+
+
+def _scene(offset_x, offset_y):
+    """Miniatura de uma cena lisa vista com a câmera deslocada"""
+    rng = np.random.default_rng(0)
+    scene = rng.uniform(0, 255, (FINGERPRINT_SIZE * 3, FINGERPRINT_SIZE * 3)).astype(np.float32)
+    top, left = FINGERPRINT_SIZE - offset_y, FINGERPRINT_SIZE - offset_x
+    return scene[top:top + FINGERPRINT_SIZE, left:left + FINGERPRINT_SIZE]
+
+
+def test_estimate_shift_follows_scene_motion():
+    dx, dy = estimate_shift(_scene(0, 0), _scene(5, -3))
+    assert abs(dx - 5 / FINGERPRINT_SIZE) < 0.02
+    assert abs(dy + 3 / FINGERPRINT_SIZE) < 0.02
+
+    dx, dy = estimate_shift(_scene(0, 0), _scene(0, 0))
+    assert abs(dx) < 0.01 and abs(dy) < 0.01
+
+
+def test_tracker_keeps_damage_across_camera_pan():
+    tracker = DamageTracker(iou_threshold=0.3, max_age=3)
+    tracker.update(Detections([[400, 100, 460, 140]], [0.7], [1]), 0, 0.0)
+    # A câmera andou: o dano aparece 300 px à esquerda, sem sobreposição com a caixa anterior
+    tracker.update(Detections([[100, 102, 160, 142]], [0.9], [1]), 15, 0.5, shift=(-298.0, 1.0))
+
+    tracks = tracker.tracks()
+    assert len(tracks) == 1
+    assert tracks[0]['hits'] == 2
+    assert tracks[0]['best_frame'] == 15
+
+
+def test_tracker_without_shift_splits_panned_damage():
+    tracker = DamageTracker(iou_threshold=0.3, max_age=3)
+    tracker.update(Detections([[400, 100, 460, 140]], [0.7], [1]), 0, 0.0)
+    tracker.update(Detections([[100, 102, 160, 142]], [0.9], [1]), 15, 0.5)
+    assert len(tracker.tracks()) == 2
+
+
+def test_tracker_min_hits_one_keeps_single_sighting():
+    tracker = DamageTracker()
+    tracker.update(Detections([[0, 0, 10, 10]], [0.5], [0]), 0, 0.0)
+    for frame in range(1, 6):
+        tracker.update(Detections.empty(), frame, frame / 2)
+    assert len(tracker.tracks()) == 1
+    assert len(DamageTracker(min_hits=2).tracks()) == 0